@@ -0,0 +1,46 @@
+"""
+Memória e tempo da divisão do 3026-12 nas seis abas: posições (particionar_3026_12)
+contra as abas copiadas em DataFrames (materializar, como era o retorno antigo).
+
+Uso: python -m benchmarks.benchmark_abas_3026_12 [linhas]   (padrão: 200000)
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.dados_sinteticos import gerar_dataframe_3026
+from processar_contratos import particionar_3026_12
+
+
+def _particionar(df):
+    return particionar_3026_12(df, "bemge", True, "2025-10-01", 2)
+
+
+def _materializar(df):
+    return _particionar(df).materializar()
+
+
+def medir(funcao, df) -> tuple:
+    inicio = time.perf_counter()
+    funcao(df)
+    duracao = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    resultado = funcao(df)  # Mantido vivo para o pico incluir o resultado
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return duracao, pico
+
+
+def main() -> None:
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    df = gerar_dataframe_3026(linhas)
+    print(f"3026-12 sintético: {linhas} linhas x {df.shape[1]} colunas")
+    for nome, funcao in (("posições", _particionar), ("abas copiadas", _materializar)):
+        duracao, pico = medir(funcao, df)
+        print(f"{nome:>14}: {duracao:8.2f} s  pico {pico / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compara os backends de escrita (openpyxl x xlsxwriter constant_memory) gerando o
+relatório de 3026-12 com as mesmas abas do /processar_contratos/.
+
+Uso: python -m benchmarks.benchmark_escrita [linhas]   (padrão: 200000)
+"""
+import io
+import sys
+import time
+import tracemalloc
+
+from benchmarks.dados_sinteticos import gerar_dataframe_3026
+from escrita_excel import criar_escritor
+
+
+def _abas_3026_12(df):
+    aud = df["AUDITADO"] == "AUDI"
+    recente = df.index % 10 == 0  # ~10% das linhas nas abas de últimos 2 meses
+    return [
+        ("Todos os Contratos", df),
+        ("Bemge 3026-12-Homol.Auditados", df[aud]),
+        ("Bemge 3026-12-Homol.Não Auditado", df[~aud]),
+        ("Últimos 2 Meses - Auditados", df[recente & aud]),
+        ("Últimos 2 Meses - Não Auditados", df[recente & ~aud]),
+        ("Últimos 2 Meses - Todos os Contratos", df[recente]),
+    ]
+
+
+def _escrever(engine: str, abas) -> int:
+    output = io.BytesIO()
+    with criar_escritor(output, engine=engine) as writer:
+        for nome, df in abas:
+            writer.escrever_aba(nome, df)
+    return output.getbuffer().nbytes
+
+
+def medir(engine: str, abas) -> tuple:
+    # Tempo e memória em execuções separadas: o tracemalloc distorce o tempo
+    inicio = time.perf_counter()
+    tamanho = _escrever(engine, abas)
+    duracao = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    _escrever(engine, abas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico, tamanho
+
+
+def main() -> None:
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    abas = _abas_3026_12(gerar_dataframe_3026(linhas))
+    total = sum(len(df) for _, df in abas)
+    print(f"3026-12 sintético: {linhas} linhas, {total} linhas escritas em {len(abas)} abas")
+    for engine in ("openpyxl", "xlsxwriter"):
+        duracao, pico, tamanho = medir(engine, abas)
+        print(f"{engine:>10}: {duracao:8.2f} s  pico {pico / 2**20:8.1f} MiB  arquivo {tamanho / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Tempo e pico de memória de cada etapa do processamento, sobre planilhas 3026
+sintéticas (benchmarks/dados_sinteticos.py) de BEMGE e MINAS CAIXA.
+
+Etapas: pd.read_excel, cada filtro _apply_*, processar_3026_12_com_abas,
+filtrar_planilha_contratos (3026-11 e 3026-15), resumos e escrita do XLSX.
+
+Uso: python -m benchmarks.benchmark_etapas [linhas ...] [--json resultado.json]
+                                          [--comparar base.json] [--tolerancia 1.2]
+     (padrão: 10000 100000 500000 linhas)
+
+Com --comparar, cada etapa é comparada com o resultado salvo de uma execução
+anterior e o comando termina com código 1 se alguma ficar mais lenta (ou usar mais
+memória) que a tolerância: serve para pegar regressões antes do deploy.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_planilha_3026
+from escrita_excel import criar_escritor
+from processar_contratos import (
+    _apply_3026_12_filters,
+    _apply_audit_filter,
+    _apply_habitacional_filter,
+    _apply_minas_caixa_3026_15_filters,
+    _apply_period_filter,
+    adicionar_coluna_banco,
+    filtrar_planilha_contratos,
+    gerar_contratos_por_banco,
+    gerar_contratos_repetidos,
+    gerar_resumo_geral,
+    processar_3026_12_com_abas,
+)
+
+REFERENCIA = "2025-10-01"
+TAMANHOS_PADRAO = [10000, 100000, 500000]
+# Medições abaixo disso são ruído e ficam de fora da comparação
+TEMPO_MINIMO_COMPARACAO = 0.05
+PICO_MINIMO_COMPARACAO = 1024 * 1024
+
+
+def medir(funcao) -> tuple:
+    # Tempo e memória em execuções separadas: o tracemalloc distorce o tempo
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    resultado = funcao()  # Mantido vivo para o pico incluir o resultado
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return duracao, pico
+
+
+def _escrever_relatorio(df: pd.DataFrame) -> None:
+    fd, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        with criar_escritor(caminho, len(df)) as writer:
+            writer.escrever_aba("Dados Filtrados", df)
+            writer.escrever_aba("Resumo Geral", gerar_resumo_geral(df, 1))
+    finally:
+        os.remove(caminho)
+
+
+def _etapas(caminhos: dict) -> list:
+    """(nome da etapa, função sem argumentos) para as planilhas geradas."""
+    df_12 = pd.read_excel(caminhos["3026-12"], engine="openpyxl")
+    df_11 = pd.read_excel(caminhos["3026-11"], engine="openpyxl")
+    df_15 = pd.read_excel(caminhos["3026-15"], engine="openpyxl")
+    df_resumo = adicionar_coluna_banco(df_12, "bemge")
+
+    return [
+        ("pd.read_excel 3026-12", lambda: pd.read_excel(caminhos["3026-12"], engine="openpyxl")),
+        ("_apply_audit_filter", lambda: _apply_audit_filter(df_12, "auditado")),
+        ("_apply_period_filter", lambda: _apply_period_filter(df_12, True, REFERENCIA, 2)),
+        ("_apply_3026_12_filters", lambda: _apply_3026_12_filters(df_12)),
+        ("_apply_habitacional_filter W", lambda: _apply_habitacional_filter(df_11, REFERENCIA, 2, column_index=22)),
+        ("_apply_habitacional_filter Y", lambda: _apply_habitacional_filter(df_11, REFERENCIA, 2, column_index=24)),
+        # O filtro do 3026-15 altera as colunas de data: roda sobre uma cópia
+        ("_apply_minas_caixa_3026_15", lambda: _apply_minas_caixa_3026_15_filters(df_15.copy(), REFERENCIA, 2)),
+        ("processar_3026_12_com_abas", lambda: processar_3026_12_com_abas(
+            caminhos["3026-12"], "bemge", "todos", True, REFERENCIA, 2,
+            streaming_reader=True, column_projection=True,
+        )),
+        ("filtrar 3026-11 minas_caixa", lambda: filtrar_planilha_contratos(
+            caminhos["3026-11"], "auditado", True, REFERENCIA, 2, "x 3026-11.xlsx", "minas_caixa",
+            True, REFERENCIA, 2, streaming_reader=True, column_projection=True,
+        )),
+        ("filtrar 3026-15 minas_caixa", lambda: filtrar_planilha_contratos(
+            caminhos["3026-15"], "todos", False, None, 2, "x 3026-15.xlsx", "minas_caixa",
+            minas_caixa_3026_15_filter_enabled=True, minas_caixa_3026_15_reference_date=REFERENCIA,
+            streaming_reader=True, column_projection=True,
+        )),
+        ("gerar_resumo_geral", lambda: gerar_resumo_geral(df_resumo, 3)),
+        ("gerar_contratos_repetidos", lambda: gerar_contratos_repetidos(df_resumo)),
+        ("gerar_contratos_por_banco", lambda: gerar_contratos_por_banco(df_resumo)),
+        ("escrita XLSX", lambda: _escrever_relatorio(df_resumo)),
+    ]
+
+
+def executar(linhas: int) -> dict:
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos = {}
+        for tipo, banco in (("3026-11", "minas_caixa"), ("3026-12", "bemge"), ("3026-15", "minas_caixa")):
+            caminhos[tipo] = os.path.join(pasta, f"{banco} {tipo}.xlsx")
+            gerar_planilha_3026(caminhos[tipo], linhas, banco, tipo)
+
+        print(f"\n{linhas} linhas")
+        for nome, funcao in _etapas(caminhos):
+            duracao, pico = medir(funcao)
+            resultados[nome] = {"segundos": duracao, "pico_bytes": pico}
+            print(f"{nome:>32}: {duracao:8.2f} s  pico {pico / 2**20:8.1f} MiB")
+    return resultados
+
+
+def comparar(atual: dict, base: dict, tolerancia: float) -> list:
+    """Etapas em que o tempo ou o pico de memória passou da tolerância."""
+    regressoes = []
+    for linhas, etapas in atual.items():
+        for nome, medida in etapas.items():
+            anterior = base.get(linhas, {}).get(nome)
+            if anterior is None:
+                continue
+            for chave, minimo in (("segundos", TEMPO_MINIMO_COMPARACAO), ("pico_bytes", PICO_MINIMO_COMPARACAO)):
+                if anterior[chave] >= minimo and medida[chave] > anterior[chave] * tolerancia:
+                    razao = medida[chave] / anterior[chave]
+                    regressoes.append(f"{linhas} linhas, {nome}: {chave} {razao:.2f}x")
+    return regressoes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do processamento 3026")
+    parser.add_argument("linhas", type=int, nargs="*", default=TAMANHOS_PADRAO)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--comparar", help="resultados de uma execução anterior (--json)")
+    parser.add_argument("--tolerancia", type=float, default=1.2)
+    args = parser.parse_args()
+
+    resultados = {str(linhas): executar(linhas) for linhas in args.linhas}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print("\nRegressões:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            sys.exit(1)
+        print("\nSem regressões")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Calibração de ADMISSAO_BYTES_POR_CELULA (controle_admissao.py): pico de memória
+medido do processamento de uma planilha 3026 sintética, dividido pelas células que
+o controle de admissão estima para ela (controle_admissao.estimar_celulas).
+
+Cada caso roda num processo novo, como o servidor faz com cada arquivo: leitura e
+filtros com os modos padrão do servidor (streaming e projeção de colunas), sem
+filtro de auditado (todas as linhas sobram, o pior caso) e escrita do relatório.
+O pico é o ru_maxrss do processo menos a memória já usada antes de processar.
+As planilhas também são geradas em processos à parte: no Linux o ru_maxrss
+atravessa fork/exec, e um processo principal grande esconderia o pico medido.
+
+Uso: python -m benchmarks.calibrar_admissao [linhas ...] (padrão: 20000 100000)
+
+A sugestão impressa é o maior valor medido no maior tamanho, com a margem MARGEM,
+arredondado: em planilhas pequenas o custo fixo (bibliotecas, buffers da escrita)
+pesa mais que as células e infla a conta por célula, mas não são elas que enchem o
+orçamento de ADMISSAO_MEMORIA_MB.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import resource
+import tempfile
+
+from benchmarks.dados_sinteticos import gerar_planilha_3026
+
+TAMANHOS_PADRAO = [20000, 100000]
+CASOS = [("3026-11", "minas_caixa"), ("3026-12", "bemge"), ("3026-15", "minas_caixa")]
+# Folga sobre o maior valor medido (variação entre extrações reais e o alocador)
+MARGEM = 1.25
+
+
+def _pico_kib() -> int:
+    # No Linux, ru_maxrss vem em KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _estimar_celulas(caminho: str) -> int:
+    import controle_admissao
+    import identificacao_planilha
+
+    return controle_admissao.estimar_celulas(identificacao_planilha.identificar(caminho, os.path.basename(caminho)))
+
+
+def _processar(caminho: str, tipo: str, banco: str) -> int:
+    """Bytes de pico do processamento de um arquivo, medido no processo atual."""
+    import pandas as pd
+    from processar_contratos import filtrar_planilha_contratos, processar_3026_12_com_abas
+    from relatorios import escrever_relatorio, escrever_relatorio_3026_12
+
+    nome = os.path.basename(caminho)
+    saida = caminho + ".saida.xlsx"
+    base = _pico_kib()
+    if tipo == "3026-12":
+        resultado = processar_3026_12_com_abas(
+            caminho, banco, "todos", streaming_reader=True, column_projection=True, filename=nome
+        )
+        escrever_relatorio_3026_12(saida, [nome], [resultado], banco, banco == "minas_caixa", None, "xlsx")
+    else:
+        df = filtrar_planilha_contratos(
+            caminho, "todos", False, None, 2, nome, banco,
+            streaming_reader=True, column_projection=True, tipo_arquivo=tipo,
+        )
+        escrever_relatorio(saida, pd.DataFrame(df), 1)
+    os.remove(saida)
+    return (_pico_kib() - base) * 1024
+
+
+def _em_processo_novo(funcao, *args):
+    contexto = multiprocessing.get_context("spawn")
+    with contexto.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(funcao, args)
+
+
+def medir(caminho: str, tipo: str, banco: str) -> tuple:
+    """(células estimadas, bytes de pico); a identificação roda à parte para não entrar na base."""
+    return _em_processo_novo(_estimar_celulas, caminho), _em_processo_novo(_processar, caminho, tipo, banco)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Calibração de ADMISSAO_BYTES_POR_CELULA")
+    parser.add_argument("linhas", type=int, nargs="*", default=TAMANHOS_PADRAO)
+    args = parser.parse_args()
+
+    maior = 0.0
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.linhas:
+            print(f"\n{linhas} linhas")
+            for tipo, banco in CASOS:
+                caminho = os.path.join(pasta, f"{banco} {tipo}.xlsx")
+                _em_processo_novo(gerar_planilha_3026, caminho, linhas, banco, tipo)
+                celulas, pico = medir(caminho, tipo, banco)
+                por_celula = pico / celulas
+                if linhas == max(args.linhas):
+                    maior = max(maior, por_celula)
+                print(
+                    f"{banco + ' ' + tipo:>22}: {celulas:>10} células  pico {pico / 2**20:8.1f} MiB"
+                    f"  {por_celula:6.1f} bytes/célula"
+                )
+
+    sugestao = math.ceil(maior * MARGEM / 5) * 5
+    print(f"\nADMISSAO_BYTES_POR_CELULA sugerido: {sugestao} (maior medido {maior:.1f} x {MARGEM})")
+
+
+if __name__ == "__main__":
+    main()
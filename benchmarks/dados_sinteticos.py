@@ -0,0 +1,175 @@
+"""
+Dados sintéticos no layout das planilhas 3026 (ver ESTRUTURA_DADOS_REAL.md),
+para medir desempenho sem usar extratos reais.
+
+Também gera as planilhas XLSX de BEMGE e MINAS CAIXA (3026-11, 3026-12 e 3026-15):
+
+    python -m benchmarks.dados_sinteticos 100000 --banco minas_caixa --tipo 3026-15 --saida x.xlsx
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from escrita_excel import criar_escritor
+
+COLUNAS_3026 = [
+    "MATR.AGENTE", "AGENTE CESSIONARIO", "AGENTE CEDENTE", "CONTRATO", "HIPOTECA",
+    "NOME", "CPF", "DT.ASS.", "END.IMOVEL", "COD.MUNICIPIO", "MUNICIPIO", "OR", "IM",
+    "TX.JUR.CONTR.", "TX.JUR.EVENTO", "TX.JUR.MP 1520", "EVENTO", "DT.EVENTO", "DT.HAB.",
+    "VAF1 AGENTE", "VAF2 AGENTE", "VAF3 AGENTE", "VAF1 SIFCVS", "VAF2 SIFCVS", "DT.BASE",
+    "DT.TERM.ANALISE", "DEST.PAGAM", "DEST.COMPLEM", "SLD.VENCIDO", "SLD.VINCENDO",
+    "SLD.TOTAL", "MANIFESTACAO", "DT.MANIFESTACAO", "AUDITADO", "COD GIFUS ANALISE",
+    "DT.POS.NOVACAO", "PERC.FCVS", "DT.PROC.HAB", "JUROS 01/01/1997", "STATUS RECURSO",
+    "DATA STATUS", "ANUENCIA", "VL.PERDA JUROS", "SITUACAO ANALISE", "INDVAF3TR7",
+    "INDVAF4TR7", "DT.ULT.HOMOLOGACAO", "DT.ULT.AUDITORIA", "DT.ULT.NEGOCIACAO",
+] + [f"Val.DED{i}" for i in range(1, 21)]
+
+DESTINOS = ["0x0", "1x4", "6x4", "8x4", "2x1", "3x2", "5x4", "9x9"]
+MUNICIPIOS = ["BELO HORIZONTE", "CONTAGEM", "BETIM", "UBERLANDIA", "JUIZ DE FORA", "MONTES CLAROS"]
+EVENTOS = ["LIQUIDACAO", "TERMINO", "NOVACAO", "CESSAO"]
+SITUACOES = ["HOMOLOGADO", "NEGADO", "EM ANALISE", "PENDENTE"]
+TIPOS_ARQUIVO = ["3026-11", "3026-12", "3026-15"]
+
+# Colunas lidas por posição nos filtros: W/Y (data habitacional do 3026-11) e
+# S/W/Z/AB/AD/AK/AL (datas do 3026-15 MINAS CAIXA; AB também no BEMGE)
+COLUNAS_DATA_POR_TIPO = {
+    "3026-11": [22, 24],
+    "3026-12": [],
+    "3026-15": [18, 22, 25, 27, 29, 36, 37],
+}
+# Data habitacional do 3026-11 por banco (mesmas posições de processar_contratos.py)
+COLUNA_HABITACIONAL = {"bemge": 22, "minas_caixa": 24}
+NOMES_BANCO = {"bemge": "BEMGE", "minas_caixa": "MINAS CAIXA"}
+
+
+def _datas(rng: np.random.Generator, n: int, referencia: pd.Timestamp, com_hora: bool = True) -> pd.Series:
+    """Datas até 2 anos antes da referência, metade com hora (com_hora)."""
+    dias = rng.integers(0, 730, n)
+    horas = np.where(rng.random(n) < 0.5, rng.integers(0, 24, n), 0) if com_hora else 0
+    return pd.Series(referencia - pd.to_timedelta(dias, unit="D") - pd.to_timedelta(horas, unit="h"))
+
+
+def _datas_mistas(
+    rng: np.random.Generator, n: int, referencia: pd.Timestamp, com_hora: bool = True
+) -> pd.Series:
+    """
+    Datas nos formatos encontrados nos extratos: datetime do Excel (~70%),
+    texto dd/mm/aaaa (~15%), texto dd/mm/aaaa hh:mm:ss (~5%, só com_hora; senão
+    dd/mm/aaaa), ISO (~5%) e vazio (~5%).
+    """
+    datas = _datas(rng, n, referencia, com_hora)
+    valores = datas.astype(object)
+    sorteio = rng.random(n)
+    for inicio, fim, formato in (
+        (0.70, 0.85, "%d/%m/%Y"),
+        (0.85, 0.90, "%d/%m/%Y %H:%M:%S" if com_hora else "%d/%m/%Y"),
+        (0.90, 0.95, "%Y-%m-%d"),
+    ):
+        faixa = (sorteio >= inicio) & (sorteio < fim)
+        valores[faixa] = datas[faixa].dt.strftime(formato)
+    valores[sorteio >= 0.95] = None
+    return valores
+
+
+def gerar_dataframe_3026(
+    linhas: int,
+    banco: str = "bemge",
+    seed: int = 0,
+    referencia: str = "2025-10-01",
+    tipo: str = "3026-12"
+) -> pd.DataFrame:
+    """
+    Gera um DataFrame com as colunas das planilhas 3026 (MATR.AGENTE até Val.DED20).
+    Datas misturam datetime e texto dd/mm/aaaa, AUDITADO tem AUDI/NAUD e
+    DEST.PAGAM/DEST.COMPLEM incluem os códigos removidos no 3026-12.
+    Em 3026-11 e 3026-15 as colunas lidas por posição (COLUNAS_DATA_POR_TIPO)
+    recebem datas, conforme o banco:
+    - 3026-11: formatos mistos na coluna habitacional do banco (W no BEMGE, Y no
+      MINAS CAIXA); a outra fica com datas sem texto (W continua com datas, como
+      nos extratos, para a identificação pelo conteúdo);
+    - 3026-15: formatos mistos, com hora só no MINAS CAIXA (o filtro dele tira a hora).
+    """
+    rng = np.random.default_rng(seed)
+    ref = pd.Timestamp(referencia)
+    dados = {}
+    for coluna in COLUNAS_3026:
+        if coluna == "CONTRATO":
+            # ~5% de contratos repetidos
+            dados[coluna] = rng.integers(10**9, 10**9 + int(linhas * 0.95) + 1, linhas)
+        elif coluna == "AUDITADO":
+            dados[coluna] = rng.choice(["AUDI", "NAUD"], linhas, p=[0.6, 0.4])
+        elif coluna in ("DEST.PAGAM", "DEST.COMPLEM"):
+            dados[coluna] = rng.choice(DESTINOS, linhas)
+        elif coluna == "MUNICIPIO":
+            dados[coluna] = rng.choice(MUNICIPIOS, linhas)
+        elif coluna == "EVENTO":
+            dados[coluna] = rng.choice(EVENTOS, linhas)
+        elif coluna == "SITUACAO ANALISE":
+            dados[coluna] = rng.choice(SITUACOES, linhas)
+        elif coluna.startswith("DT.") or coluna == "DATA STATUS":
+            datas = _datas(rng, linhas, ref)
+            # 20% das datas chegam como texto no formato brasileiro
+            texto = rng.random(linhas) < 0.2
+            valores = datas.astype(object)
+            valores[texto] = datas[texto].dt.strftime("%d/%m/%Y")
+            dados[coluna] = valores
+        elif coluna == "NOME":
+            dados[coluna] = [f"MUTUARIO {i}" for i in rng.integers(0, linhas, linhas)]
+        elif coluna == "CPF":
+            dados[coluna] = [f"{i:011d}" for i in rng.integers(0, 10**11, linhas)]
+        elif coluna in ("AGENTE CESSIONARIO", "AGENTE CEDENTE", "END.IMOVEL", "MANIFESTACAO", "STATUS RECURSO", "ANUENCIA"):
+            dados[coluna] = rng.choice(["A", "B", "C", "D"], linhas)
+        else:
+            valores = np.round(rng.random(linhas) * 100000, 2)
+            valores[rng.random(linhas) < 0.1] = np.nan
+            dados[coluna] = valores
+    for posicao in COLUNAS_DATA_POR_TIPO[tipo]:
+        if tipo == "3026-11" and posicao != COLUNA_HABITACIONAL[banco]:
+            dados[COLUNAS_3026[posicao]] = _datas(rng, linhas, ref)
+        else:
+            dados[COLUNAS_3026[posicao]] = _datas_mistas(rng, linhas, ref, com_hora=banco == "minas_caixa")
+    df = pd.DataFrame(dados)
+    df["BANCO"] = banco.upper()
+    return df
+
+
+def gerar_planilha_3026(
+    output,
+    linhas: int,
+    banco: str = "bemge",
+    tipo: str = "3026-12",
+    seed: int = 0,
+    referencia: str = "2025-10-01"
+) -> None:
+    """
+    Grava em `output` (caminho ou arquivo) uma planilha 3026 sintética como as
+    enviadas ao /processar_contratos/: sem a coluna BANCO, com AUDITADO às vezes
+    em minúsculas, com espaços ou vazio, e a aba com o banco e o tipo
+    ("MINAS CAIXA 3026-11"), de onde a identificação tira o banco.
+    """
+    rng = np.random.default_rng(seed + 1)
+    df = gerar_dataframe_3026(linhas, banco, seed, referencia, tipo).drop(columns="BANCO")
+    auditado = df["AUDITADO"].astype(object)
+    sorteio = rng.random(linhas)
+    auditado[sorteio < 0.05] = " audi "
+    auditado[(sorteio >= 0.05) & (sorteio < 0.08)] = None
+    df["AUDITADO"] = auditado
+    with criar_escritor(output, linhas, engine="xlsxwriter") as writer:
+        writer.escrever_aba(f"{NOMES_BANCO[banco]} {tipo}", df)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera uma planilha 3026 sintética")
+    parser.add_argument("linhas", type=int)
+    parser.add_argument("--banco", choices=["bemge", "minas_caixa"], default="bemge")
+    parser.add_argument("--tipo", choices=TIPOS_ARQUIVO, default="3026-12")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", required=True)
+    args = parser.parse_args()
+    gerar_planilha_3026(args.saida, args.linhas, args.banco, args.tipo, args.seed)
+    print(f"{args.saida}: {args.banco} {args.tipo}, {args.linhas} linhas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Regressão da conversão de datas dos filtros (_converter_datas, com memoização por
+valor distinto e DatasConvertidas) contra a conversão antiga, que chamava
+pd.to_datetime(coluna, errors="coerce") em cada filtro.
+
+Cada valor é conferido com a data esperada, decidida valor a valor:
+- datetime do Excel: a própria data;
+- texto dd/mm/aaaa[ hh:mm[:ss]]: dia primeiro;
+- texto ISO (aaaa-mm-dd[ hh:mm:ss]): a própria data;
+- número de 1 a 2958465: número de série do Excel (dias desde 30/12/1899);
+- o resto: NaT.
+
+Onde o resultado difere da conversão antiga, a diferença tem que ser uma das
+mudanças documentadas (commit "[user-010] Convert each date column once..."):
+texto dd/mm/aaaa lido com o dia primeiro (antes: mês primeiro ou NaT, conforme o
+formato que o pandas inferia para a coluna), texto em outro formato que o
+inferido para a coluna (antes: NaT) e números de série do Excel (antes:
+nanossegundos desde 1970). Qualquer outra diferença é divergência.
+
+Também confere que colunas category, colunas Arrow (motor_arrow.datas) e os
+recortes servidos pelo DatasConvertidas dão o mesmo resultado da coluna object.
+
+Uso: python -m benchmarks.paridade_datas [linhas] (padrão: 20000)
+
+Termina com código 1 se houver divergência.
+"""
+import argparse
+import datetime
+import sys
+import warnings
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import motor_arrow
+from benchmarks.dados_sinteticos import _datas, _datas_mistas
+from processar_contratos import DatasConvertidas, _converter_datas
+
+LINHAS_PADRAO = 20000
+# Definidos aqui, não importados, para a referência não mudar junto com o código conferido
+DIA_ZERO_EXCEL = pd.Timestamp("1899-12-30")
+SERIAL_MAXIMO = 2958465  # 31/12/9999
+REFERENCIA = pd.Timestamp("2025-10-01")
+FORMATOS_TEXTO = [
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+]
+
+IGUAL = "igual à conversão antiga"
+DIA_PRIMEIRO = "texto dd/mm/aaaa com o dia primeiro"
+OUTRO_FORMATO = "texto em formato diferente do inferido para a coluna"
+SERIAL = "número de série do Excel"
+ANTIGA_FALHAVA = "coluna que a conversão antiga não convertia"
+
+
+def _vazio(valor) -> bool:
+    return valor is None or (isinstance(valor, float) and np.isnan(valor))
+
+
+def _esperada(valor) -> pd.Timestamp:
+    """Data que a conversão tem que dar para o valor, decidida só pelo valor."""
+    if _vazio(valor):
+        return pd.NaT
+    if isinstance(valor, datetime.datetime):
+        return pd.Timestamp(valor)
+    if isinstance(valor, (int, float, np.number)):
+        if 1 <= valor <= SERIAL_MAXIMO:
+            return DIA_ZERO_EXCEL + pd.to_timedelta(float(valor), unit="D")
+        return pd.NaT
+    texto = str(valor).strip()
+    for formato in FORMATOS_TEXTO:
+        try:
+            return pd.Timestamp(datetime.datetime.strptime(texto, formato))
+        except ValueError:
+            continue
+    return pd.NaT
+
+
+def _conversao_antiga(serie: pd.Series):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            return pd.to_datetime(serie, errors="coerce")
+    except (TypeError, ValueError):
+        # Os filtros antigos caíam no except e não filtravam
+        return None
+
+
+def _classificar(valor, antiga, nova) -> str:
+    if (pd.isna(antiga) and pd.isna(nova)) or antiga == nova:
+        return IGUAL
+    if isinstance(valor, (int, float, np.number)) and not isinstance(valor, bool):
+        return SERIAL
+    if isinstance(valor, str):
+        texto = valor.strip()
+        if texto[2:3] == "/" and texto[5:6] == "/":
+            return DIA_PRIMEIRO
+        if pd.isna(antiga):
+            return OUTRO_FORMATO
+    return ""
+
+
+def _casos(linhas: int) -> dict:
+    rng = np.random.default_rng(0)
+    datas = _datas(rng, linhas, REFERENCIA)
+    # Dias até 12: dd/mm e mm/dd são ambos válidos
+    ambiguas = pd.Series(
+        pd.to_datetime({"year": 2025, "month": rng.integers(1, 13, linhas), "day": rng.integers(1, 13, linhas)})
+    )
+    seriais = (datas - DIA_ZERO_EXCEL) / pd.Timedelta(days=1)
+    mistura_seriais = datas.astype(object)
+    metade = rng.random(linhas) < 0.5
+    mistura_seriais[metade] = seriais[metade].round().astype(int)
+    invalidos = ambiguas.dt.strftime("%d/%m/%Y").astype(object)
+    sorteio = rng.random(linhas)
+    invalidos[sorteio < 0.1] = "31/02/2025"
+    invalidos[(sorteio >= 0.1) & (sorteio < 0.2)] = "sem data"
+    invalidos[(sorteio >= 0.2) & (sorteio < 0.3)] = ""
+    invalidos[(sorteio >= 0.3) & (sorteio < 0.35)] = None
+    return {
+        "mistas (datetime, dd/mm, ISO, vazio)": _datas_mistas(rng, linhas, REFERENCIA),
+        "dd/mm/aaaa ambíguas": ambiguas.dt.strftime("%d/%m/%Y").astype(object),
+        "dd/mm/aaaa hh:mm": datas.dt.strftime("%d/%m/%Y %H:%M").astype(object),
+        "ISO com hora": datas.dt.strftime("%Y-%m-%d %H:%M:%S").astype(object),
+        "séries do Excel (float)": seriais.astype(object),
+        "séries do Excel e datetime": mistura_seriais,
+        "dd/mm/aaaa com inválidos": invalidos,
+        "datetime64": datas,
+    }
+
+
+def _mesmas_datas(esperado: pd.Series, obtido: pd.Series) -> bool:
+    return bool(((esperado == obtido) | (esperado.isna() & obtido.isna())).all())
+
+
+def comparar_caso(nome: str, serie: pd.Series) -> tuple:
+    """(contagem por classe de diferença, divergências)."""
+    divergencias = []
+    nova = _converter_datas(serie)
+    antiga = _conversao_antiga(serie)
+
+    esperadas = pd.Series([_esperada(valor) for valor in serie], index=serie.index, dtype="datetime64[ns]")
+    erradas = ~((nova == esperadas) | (nova.isna() & esperadas.isna()))
+    if erradas.any():
+        posicao = int(np.flatnonzero(erradas.to_numpy())[0])
+        divergencias.append(
+            f"{nome}: {int(erradas.sum())} valor(es) fora do esperado, ex.: {serie.iloc[posicao]!r} -> "
+            f"{nova.iloc[posicao]} (esperado {esperadas.iloc[posicao]})"
+        )
+
+    classes = Counter()
+    if antiga is None:
+        classes[ANTIGA_FALHAVA] = len(serie)
+    else:
+        for valor, velha, convertida in zip(serie, antiga, nova):
+            classe = _classificar(valor, velha, convertida)
+            if not classe:
+                divergencias.append(f"{nome}: {valor!r} era {velha}, agora {convertida}")
+                break
+            classes[classe] += 1
+
+    # Mesma conversão nas outras representações da coluna
+    if serie.dtype == object and serie.dropna().map(type).nunique() <= 1:
+        variantes = {
+            "category": serie.astype("category"),
+            "arrow": motor_arrow.para_arrow(serie.to_frame("coluna"))["coluna"],
+        }
+    else:
+        variantes = {"category": serie.astype("category")}
+    for variante, valores in variantes.items():
+        if not _mesmas_datas(nova, _converter_datas(valores)):
+            divergencias.append(f"{nome}: coluna {variante} converte diferente da coluna object")
+
+    # DatasConvertidas: o recorte das linhas que sobram tem que ser o da conversão direta
+    df = serie.to_frame("coluna")
+    datas = DatasConvertidas()
+    datas.obter(df, "coluna")
+    recorte = df.iloc[::3]
+    if not _mesmas_datas(_converter_datas(recorte["coluna"]), datas.obter(recorte, "coluna")):
+        divergencias.append(f"{nome}: DatasConvertidas devolve outro recorte")
+    return classes, divergencias
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Regressão da conversão de datas dos filtros")
+    parser.add_argument("linhas", type=int, nargs="?", default=LINHAS_PADRAO)
+    args = parser.parse_args()
+
+    divergencias = []
+    for nome, serie in _casos(args.linhas).items():
+        classes, encontradas = comparar_caso(nome, serie)
+        divergencias.extend(encontradas)
+        situacao = "ok" if not encontradas else f"{len(encontradas)} divergência(s)"
+        print(f"{nome:>38}: {situacao}")
+        for classe, quantidade in classes.most_common():
+            print(f"{'':>40}{quantidade:>7} {classe}")
+
+    if divergencias:
+        print("\nDivergências:")
+        for divergencia in divergencias:
+            print(f"  {divergencia}")
+        sys.exit(1)
+    print("\nConversão de datas sem divergências")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Regressão do plano de filtros (PlanoFiltros em processar_contratos.py, com as
+máscaras combinadas e uma única cópia no final) contra a sequência antiga, que
+copiava o DataFrame inteiro a cada filtro (df[mascara].copy()).
+
+A sequência antiga está reproduzida aqui (commit "[user-018] Replace chained
+df[mask].copy() filters..."), sem importar as máscaras conferidas. Só a resolução
+das colunas (EsquemaColunas), a conversão de datas (conferida em
+benchmarks/paridade_datas.py) e a classificação dos valores vêm do código atual.
+
+Para cada planilha sintética (3026-11, 3026-12 e 3026-15 de BEMGE e MINAS CAIXA,
+mais variantes sem nenhuma data de período válida, com a coluna W vazia e com as
+datas de período ou de W só nas linhas NAUD), tipo
+de arquivo (inclusive sem tipo: sequência genérica), filtro de auditado, período,
+data habitacional, filtro do 3026-15, filtros da leitura (ligados ou já aplicados
+pelo streaming) e motor, os dois têm que dar o mesmo DataFrame: valores, tipos,
+colunas, ordem e rótulos das linhas. Também confere _apply_3026_12_filters, usado
+na base do 3026-12.
+
+Uso: python -m benchmarks.paridade_filtros [linhas] (padrão: 2000)
+
+Termina com código 1 se houver divergência.
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_planilha_3026
+from identificacao_planilha import TIPO_3026_11, TIPO_3026_12, TIPO_3026_15
+from processar_contratos import (
+    AUDIT_CODIGO_AUD,
+    AUDIT_CODIGO_NAUD,
+    MOTORES,
+    DatasConvertidas,
+    EsquemaColunas,
+    _aplicar_filtros_contratos,
+    _aplicar_por_valor,
+    _apply_3026_12_filters,
+    _classificar_auditoria,
+    _com_motor,
+    _destino_removido,
+    _ler_planilha_completa,
+    _parse_reference_date,
+)
+
+LINHAS_PADRAO = 2000
+# Dentro das datas sintéticas (até 2 anos antes de 2025-10-01) e antes de todas elas
+REFERENCIAS = ["2025-09-15", "2020-01-01"]
+FILTROS = ["auditado", "nauditado", "todos"]
+TIPOS = [TIPO_3026_11, TIPO_3026_12, TIPO_3026_15, None]
+BANCOS = ["bemge", "minas_caixa"]
+# Colunas S, W, Z, AB, AD, AK e AL (posições) do 3026-15 MINAS CAIXA
+COLUNAS_SEM_HORA = (18, 22, 25, 27, 29, 36, 37)
+
+
+# Sequência antiga ------------------------------------------------------------
+
+def _intervalo(datas: pd.Series, referencia: Optional[str], meses: int) -> pd.Series:
+    fim = _parse_reference_date(referencia)
+    inicio = fim - pd.DateOffset(months=max(meses, 0))
+    return datas.notna() & (datas >= inicio) & (datas <= fim)
+
+
+def _auditoria_antiga(df, filtro, esquema):
+    if filtro not in {"auditado", "nauditado"} or not esquema.auditado:
+        return df
+    codigos = _aplicar_por_valor(df[esquema.auditado], _classificar_auditoria)
+    return df[codigos == (AUDIT_CODIGO_AUD if filtro == "auditado" else AUDIT_CODIGO_NAUD)].copy()
+
+
+def _periodo_antigo(df, referencia, meses, esquema, datas):
+    if not referencia or not esquema.periodo:
+        return df
+    convertidas = datas.obter(df, esquema.periodo)
+    if convertidas.notna().sum() == 0:
+        return df
+    return df[_intervalo(convertidas, referencia, meses)].copy()
+
+
+def _3026_12_antigo(df, esquema):
+    for coluna in (esquema.dest_pagam, esquema.dest_complem):
+        if coluna:
+            df = df[~_aplicar_por_valor(df[coluna], _destino_removido)].copy()
+    if esquema.contratos:
+        df = df[df[esquema.contratos].notna()].copy()
+    return df
+
+
+def _habitacional_antigo(df, referencia, meses, posicao, esquema, datas):
+    if not referencia:
+        return df
+    coluna = esquema.por_posicao(posicao)
+    if coluna is not None and df[coluna].notna().sum() == 0:
+        coluna = None
+    if coluna is None:
+        coluna = esquema.habitacional
+    if coluna is None:
+        coluna = esquema.por_posicao(posicao)
+        if coluna is not None and datas.obter(df, coluna).notna().sum() == 0:
+            coluna = None
+    if coluna is None:
+        return df
+    return df[_intervalo(datas.obter(df, coluna), referencia, meses)].copy()
+
+
+def _coluna_ab_antiga(df, referencia, meses, esquema, datas):
+    coluna = esquema.por_posicao(27)
+    if not referencia or coluna is None:
+        return df
+    return df[_intervalo(datas.obter(df, coluna), referencia, meses)].copy()
+
+
+def sequencia_antiga(
+    df: pd.DataFrame,
+    filtro: str,
+    periodo: bool,
+    referencia: Optional[str],
+    tipo: Optional[str],
+    banco: str,
+    habitacional: bool,
+    filtro_3026_15: bool,
+    filtros_leitura: bool,
+    meses: int = 2,
+) -> pd.DataFrame:
+    """A sequência de _aplicar_filtros_contratos antes do plano de filtros."""
+    esquema = EsquemaColunas.resolver(df)
+    datas = DatasConvertidas()
+    if filtros_leitura:
+        df = _auditoria_antiga(df, filtro, esquema)
+        if periodo:
+            df = _periodo_antigo(df, referencia, meses, esquema, datas)
+    if tipo == TIPO_3026_11 and habitacional and banco in ("bemge", "minas_caixa"):
+        df = _habitacional_antigo(df, referencia, meses, 22 if banco == "bemge" else 24, esquema, datas)
+    if tipo == TIPO_3026_15:
+        if banco == "minas_caixa":
+            df = df.copy()
+            for posicao in COLUNAS_SEM_HORA:
+                coluna = esquema.por_posicao(posicao)
+                if coluna is not None:
+                    df[coluna] = datas.obter(df, coluna).dt.normalize()
+            df = _coluna_ab_antiga(df, referencia if filtro_3026_15 else None, meses, esquema, datas)
+        elif banco == "bemge" and filtro_3026_15 and referencia:
+            df = _coluna_ab_antiga(df, referencia, meses, esquema, datas)
+    if filtros_leitura and tipo == TIPO_3026_12:
+        df = _3026_12_antigo(df, esquema)
+    return df
+
+
+# Comparação ------------------------------------------------------------------
+
+def _planilhas(pasta: str, linhas: int) -> dict:
+    """DataFrames lidos como na leitura completa, por (banco, tipo gerado, variante)."""
+    planilhas = {}
+    for banco, tipo in itertools.product(BANCOS, [TIPO_3026_11, TIPO_3026_12, TIPO_3026_15]):
+        caminho = os.path.join(pasta, f"{banco} {tipo}.xlsx")
+        gerar_planilha_3026(caminho, linhas, banco, tipo)
+        df = _ler_planilha_completa(caminho, False)
+        planilhas[(banco, tipo, "")] = df
+        esquema = EsquemaColunas.resolver(df)
+        sem_periodo = df.copy()
+        sem_periodo[esquema.periodo] = "sem data"
+        planilhas[(banco, tipo, "sem datas de período")] = sem_periodo
+        # Só as linhas NAUD com data: depois do filtro de auditado, o período não
+        # filtra e a data habitacional sai da coluna W (decisões pelas linhas ativas)
+        auditadas = _aplicar_por_valor(df[esquema.auditado], _classificar_auditoria) != AUDIT_CODIGO_NAUD
+        planilhas[(banco, tipo, "período só em NAUD")] = _apagar(df, df.columns.get_loc(esquema.periodo), auditadas)
+        if tipo == TIPO_3026_11:
+            w_vazia = df.copy()
+            w_vazia.isetitem(22, pd.Series([float("nan")] * len(df), index=df.index, dtype=object))
+            planilhas[(banco, tipo, "W vazia")] = w_vazia
+            planilhas[(banco, tipo, "W só em NAUD")] = _apagar(df, 22, auditadas)
+    return planilhas
+
+
+def _apagar(df: pd.DataFrame, posicao: int, linhas: pd.Series) -> pd.DataFrame:
+    """Cópia de df com a coluna na posição vazia (NaN) nas linhas marcadas."""
+    copia = df.copy()
+    coluna = copia.iloc[:, posicao].astype(object)
+    coluna[linhas] = float("nan")
+    copia.isetitem(posicao, coluna)
+    return copia
+
+
+def _diferenca(esperado: pd.DataFrame, obtido: pd.DataFrame) -> str:
+    try:
+        pd.testing.assert_frame_equal(esperado, obtido)
+    except AssertionError as exc:
+        return str(exc).splitlines()[0]
+    return ""
+
+
+def comparar(df: pd.DataFrame, banco: str, motor: str) -> tuple:
+    """(combinações conferidas, divergências) de uma planilha em um motor."""
+    divergencias = []
+    combinacoes = 0
+    for tipo, filtro, periodo, referencia, habitacional, filtro_3026_15, filtros_leitura in itertools.product(
+        TIPOS, FILTROS, (False, True), REFERENCIAS, (False, True), (False, True), (True, False)
+    ):
+        if (habitacional and tipo != TIPO_3026_11) or (filtro_3026_15 and tipo != TIPO_3026_15):
+            # Opções que só valem para o outro tipo: mesma combinação de outra volta
+            continue
+        esperado = sequencia_antiga(
+            df.copy(), filtro, periodo, referencia, tipo, banco, habitacional, filtro_3026_15, filtros_leitura
+        )
+        obtido = _com_motor(df.copy(), motor, lambda df_motor: _aplicar_filtros_contratos(
+            df_motor, filtro, periodo, referencia, 2, tipo, banco,
+            habitacional, referencia, 2, filtro_3026_15, referencia, 2, filtros_leitura=filtros_leitura,
+        ))
+        combinacoes += 1
+        diferenca = _diferenca(esperado, obtido)
+        if diferenca:
+            divergencias.append(
+                f"tipo={tipo} filtro={filtro} periodo={periodo} referencia={referencia} "
+                f"habitacional={habitacional} 3026-15={filtro_3026_15} leitura={filtros_leitura}: {diferenca}"
+            )
+
+    esquema = EsquemaColunas.resolver(df)
+    obtido = _com_motor(df.copy(), motor, _apply_3026_12_filters)
+    diferenca = _diferenca(_3026_12_antigo(df.copy(), esquema), obtido)
+    combinacoes += 1
+    if diferenca:
+        divergencias.append(f"_apply_3026_12_filters: {diferenca}")
+    return combinacoes, divergencias
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Regressão do plano de filtros contra a sequência antiga")
+    parser.add_argument("linhas", type=int, nargs="?", default=LINHAS_PADRAO)
+    args = parser.parse_args()
+
+    divergencias = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for (banco, tipo, variante), df in _planilhas(pasta, args.linhas).items():
+            for motor in MOTORES:
+                combinacoes, encontradas = comparar(df, banco, motor)
+                nome = f"{banco} {tipo}" + (f" ({variante})" if variante else "")
+                divergencias.extend(f"{nome} [{motor}] {divergencia}" for divergencia in encontradas)
+                situacao = "ok" if not encontradas else f"{len(encontradas)} divergência(s)"
+                print(f"{nome:>42} [{motor:>6}]: {combinacoes} combinações  {situacao}")
+
+    if divergencias:
+        print("\nDivergências:")
+        for divergencia in divergencias:
+            print(f"  {divergencia}")
+        sys.exit(1)
+    print("\nPlano de filtros igual à sequência antiga")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Paridade entre os motores dos filtros (pandas e Arrow, ver motor_arrow.py) sobre
+planilhas 3026 sintéticas (benchmarks/dados_sinteticos.py) de BEMGE e MINAS CAIXA,
+em XLSX, CSV e Parquet.
+
+Para cada arquivo, filtro e modo de leitura, os dois motores têm que produzir o
+mesmo DataFrame (valores, tipos, colunas e ordem das linhas), as mesmas abas do
+3026-12 e os mesmos resumos, e cada modo de leitura o mesmo resultado da leitura
+completa. No modo "cache" só a primeira leitura do arquivo lê o XLSX: as demais
+(outro motor, outro filtro) saem do cache de planilhas, o que também valida a
+gravação e a leitura do cache. Também mostra o tempo de cada motor.
+
+Também confere qual leitor do XLSX roda em cada combinação de streaming_reader e
+column_projection (a projeção é um modo da leitura em blocos), inclusive a padrão
+de LEITURA_STREAMING e LEITURA_PROJECAO_COLUNAS.
+
+Cada CSV também é gerado com separador de milhar nos números ("1.234,56"), que tem
+que dar o mesmo resultado do CSV sem ele.
+
+Uso: python -m benchmarks.paridade_motores [linhas] (padrão: 20000)
+
+Termina com código 1 se algum resultado divergir: serve para validar mudanças em
+qualquer um dos motores antes do deploy.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import cache_planilhas
+import processar_contratos
+import processar_lote
+from benchmarks.dados_sinteticos import gerar_planilha_3026
+from processar_contratos import (
+    ABAS_3026_12,
+    MOTOR_ARROW,
+    MOTOR_PANDAS,
+    filtrar_planilha_contratos,
+    gerar_resumos,
+    processar_3026_12_com_abas,
+)
+
+REFERENCIA = "2025-09-15"
+LINHAS_PADRAO = 20000
+FILTROS = ["auditado", "nauditado", "todos"]
+MODOS_LEITURA = {
+    "completa": {},
+    "streaming": {"streaming_reader": True},
+    "projecao": {"streaming_reader": True, "column_projection": True},
+    # Padrão do servidor: a primeira leitura (em streaming) guarda a planilha e as
+    # seguintes, com qualquer motor ou filtro, recebem a do cache
+    "cache": {"streaming_reader": True, "column_projection": True, "use_cache": True},
+}
+
+
+def _normalizar(df: pd.DataFrame) -> pd.DataFrame:
+    """Category vira object: as categorias dependem das linhas lidas, os valores não."""
+    df = df.copy()
+    for posicao in range(df.shape[1]):
+        if isinstance(df.dtypes.iloc[posicao], pd.CategoricalDtype):
+            df.isetitem(posicao, df.iloc[:, posicao].astype(object))
+    return df
+
+
+def _diferenca(esperado: pd.DataFrame, obtido: pd.DataFrame) -> str:
+    try:
+        pd.testing.assert_frame_equal(_normalizar(esperado), _normalizar(obtido))
+    except AssertionError as exc:
+        return str(exc).splitlines()[0]
+    return ""
+
+
+def _diferenca_linhas(esperado: pd.DataFrame, obtido: pd.DataFrame) -> str:
+    """Como _diferenca, sem os rótulos das linhas (não vão para o relatório; cada leitor numera as suas)."""
+    return _diferenca(esperado.reset_index(drop=True), obtido.reset_index(drop=True))
+
+
+def _com_milhar(df: pd.DataFrame) -> pd.DataFrame:
+    """Números decimais como texto no formato brasileiro, com separador de milhar."""
+    df = df.copy()
+    for coluna in df.columns:
+        if df[coluna].dtype == float:
+            df[coluna] = [
+                "" if pd.isna(valor) else f"{valor:,.2f}".translate(str.maketrans(",.", ".,"))
+                for valor in df[coluna]
+            ]
+    return df
+
+
+def _arquivos(pasta: str, linhas: int) -> list:
+    """(nome enviado, conteúdo, banco) de cada planilha, em XLSX, CSV (com e sem milhar) e Parquet."""
+    arquivos = []
+    for banco in ("bemge", "minas_caixa"):
+        for tipo in ("3026-11", "3026-12", "3026-15"):
+            caminho = os.path.join(pasta, f"{banco} {tipo}.xlsx")
+            gerar_planilha_3026(caminho, linhas, banco, tipo)
+            df = pd.read_excel(caminho, engine="openpyxl")
+            parquet = io.BytesIO()
+            df.astype({coluna: str for coluna in df.columns if df[coluna].dtype == object}).where(
+                df.notna(), None
+            ).to_parquet(parquet, index=False)
+            csv = df.to_csv(sep=";", decimal=",", index=False, date_format="%d/%m/%Y %H:%M:%S").encode()
+            csv_milhar = _com_milhar(df).to_csv(
+                sep=";", decimal=",", index=False, date_format="%d/%m/%Y %H:%M:%S"
+            ).encode()
+            arquivos.append((f"{banco} {tipo}.xlsx", caminho, banco))
+            arquivos.append((f"{banco} {tipo}.csv", csv, banco))
+            arquivos.append((f"{banco} {tipo} milhar.csv", csv_milhar, banco))
+            arquivos.append((f"{banco} {tipo}.parquet", parquet.getvalue(), banco))
+    return arquivos
+
+
+def _executar(funcao, motor: str):
+    inicio = time.perf_counter()
+    resultado = funcao(motor)
+    return resultado, time.perf_counter() - inicio
+
+
+def comparar_arquivo(nome: str, contents, banco: str) -> tuple:
+    """(divergências, segundos no motor pandas, segundos no motor Arrow)."""
+    divergencias = []
+    tempos = {MOTOR_PANDAS: 0.0, MOTOR_ARROW: 0.0}
+    modos = MODOS_LEITURA if nome.endswith(".xlsx") else {"completa": {}}
+    # Resultado do motor pandas na leitura completa, por filtro, para os outros modos
+    completa = {}
+
+    for modo, opcoes in modos.items():
+        if "3026-12" in nome:
+            resultados = {}
+            for motor in tempos:
+                resultados[motor], segundos = _executar(lambda m: processar_3026_12_com_abas(
+                    contents, banco, "todos", True, REFERENCIA, 2, filename=nome, motor=m, **opcoes
+                ), motor)
+                tempos[motor] += segundos
+            esperado, obtido = resultados[MOTOR_PANDAS], resultados[MOTOR_ARROW]
+            diferenca = _diferenca(esperado.base, obtido.base)
+            for aba in ABAS_3026_12:
+                if not diferenca and not (esperado.linhas[aba] == obtido.linhas[aba]).all():
+                    diferenca = f"linhas da aba {aba}"
+            if diferenca:
+                divergencias.append(f"{nome} [{modo}]: {diferenca}")
+            completa.setdefault(None, esperado)
+            diferenca = _diferenca_linhas(completa[None].base, esperado.base)
+            for aba in ABAS_3026_12:
+                if not diferenca and not (completa[None].linhas[aba] == esperado.linhas[aba]).all():
+                    diferenca = f"linhas da aba {aba}"
+            if diferenca:
+                divergencias.append(f"{nome} [{modo} x completa]: {diferenca}")
+            continue
+
+        for filtro in FILTROS:
+            resultados = {}
+            for motor in tempos:
+                resultados[motor], segundos = _executar(lambda m: filtrar_planilha_contratos(
+                    contents, filtro, True, REFERENCIA, 2, nome, banco,
+                    True, REFERENCIA, 2, True, REFERENCIA, 2, motor=m, **opcoes
+                ), motor)
+                tempos[motor] += segundos
+            esperado, obtido = resultados[MOTOR_PANDAS], resultados[MOTOR_ARROW]
+            diferenca = _diferenca(esperado, obtido)
+            if not diferenca:
+                resumos = [gerar_resumos([df], 1) for df in (esperado, obtido)]
+                for campo in ("resumo_geral", "contratos_repetidos", "contratos_por_banco"):
+                    diferenca = diferenca or _diferenca(getattr(resumos[0], campo), getattr(resumos[1], campo))
+            if diferenca:
+                divergencias.append(f"{nome} [{modo}, {filtro}]: {diferenca}")
+            diferenca = _diferenca_linhas(completa.setdefault(filtro, esperado), esperado)
+            if diferenca:
+                divergencias.append(f"{nome} [{modo} x completa, {filtro}]: {diferenca}")
+    return divergencias, tempos[MOTOR_PANDAS], tempos[MOTOR_ARROW]
+
+
+def comparar_milhar(nome: str, contents, sem_milhar, banco: str) -> list:
+    """Divergências entre o CSV com separador de milhar e o mesmo CSV sem ele."""
+    divergencias = []
+    for motor in (MOTOR_PANDAS, MOTOR_ARROW):
+        if "3026-12" in nome:
+            resultados = [
+                processar_3026_12_com_abas(conteudo, banco, "todos", filename=nome, motor=motor).base
+                for conteudo in (sem_milhar, contents)
+            ]
+        else:
+            resultados = [
+                filtrar_planilha_contratos(conteudo, "todos", False, None, 2, nome, banco, motor=motor)
+                for conteudo in (sem_milhar, contents)
+            ]
+        diferenca = _diferenca(*resultados)
+        if diferenca:
+            divergencias.append(f"{nome} [{motor}, sem milhar x com milhar]: {diferenca}")
+    return divergencias
+
+
+def conferir_leitores(contents) -> list:
+    """
+    Divergências entre o leitor esperado e o que roda para cada combinação de
+    streaming_reader e column_projection, nas duas funções de leitura.
+    """
+    esperados = {
+        (False, False): "completa",
+        (False, True): "completa",
+        (True, False): "streaming",
+        (True, True): "projecao",
+    }
+    padrao = (processar_lote.LEITURA_STREAMING, processar_lote.LEITURA_PROJECAO_COLUNAS)
+    leitores = {
+        "completa": "_ler_planilha_completa",
+        "streaming": "_ler_planilha_streaming",
+        "projecao": "_ler_planilha_projetada",
+    }
+    chamados = []
+    originais = {nome: getattr(processar_contratos, funcao) for nome, funcao in leitores.items()}
+
+    def _registrar(nome):
+        def leitor(*args, **kwargs):
+            chamados.append(nome)
+            return originais[nome](*args, **kwargs)
+        return leitor
+
+    divergencias = []
+    try:
+        for nome, funcao in leitores.items():
+            setattr(processar_contratos, funcao, _registrar(nome))
+        for (streaming, projecao), esperado in esperados.items():
+            opcoes = {"streaming_reader": streaming, "column_projection": projecao}
+            for funcao, executar in (
+                ("filtrar_planilha_contratos", lambda: filtrar_planilha_contratos(
+                    contents, "auditado", True, REFERENCIA, 2, "x.xlsx", "bemge", tipo_arquivo="3026-11", **opcoes
+                )),
+                ("processar_3026_12_com_abas", lambda: processar_3026_12_com_abas(
+                    contents, "bemge", "todos", filename="x.xlsx", **opcoes
+                )),
+            ):
+                chamados.clear()
+                executar()
+                nome = f"streaming={streaming} projecao={projecao}" + (" (padrão)" if (streaming, projecao) == padrao else "")
+                if chamados[:1] != [esperado]:
+                    divergencias.append(f"{funcao} [{nome}]: leu com {chamados[:1]}, esperado {esperado}")
+    finally:
+        for nome, funcao in leitores.items():
+            setattr(processar_contratos, funcao, originais[nome])
+    configurado = any(variavel in os.environ for variavel in ("LEITURA_STREAMING", "LEITURA_PROJECAO_COLUNAS"))
+    if padrao != (True, True) and not configurado:
+        divergencias.append(f"modos de leitura padrão {padrao}: esperado streaming com projeção")
+    return divergencias
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Paridade entre os motores pandas e Arrow dos filtros")
+    parser.add_argument("linhas", type=int, nargs="?", default=LINHAS_PADRAO)
+    args = parser.parse_args()
+
+    divergencias = []
+    with tempfile.TemporaryDirectory() as pasta:
+        cache_planilhas.CACHE_PLANILHAS_DIR = os.path.join(pasta, "cache")
+        csv_sem_milhar = {}
+        arquivos = _arquivos(pasta, args.linhas)
+        encontradas = conferir_leitores(arquivos[0][1])
+        divergencias.extend(encontradas)
+        print(f"{'leitores do XLSX':>30}: {'ok' if not encontradas else f'{len(encontradas)} divergência(s)'}")
+        for nome, contents, banco in arquivos:
+            encontradas, pandas_s, arrow_s = comparar_arquivo(nome, contents, banco)
+            if nome.endswith(" milhar.csv"):
+                encontradas += comparar_milhar(nome, contents, csv_sem_milhar[nome.replace(" milhar", "")], banco)
+            elif nome.endswith(".csv"):
+                csv_sem_milhar[nome] = contents
+            divergencias.extend(encontradas)
+            situacao = "ok" if not encontradas else f"{len(encontradas)} divergência(s)"
+            print(f"{nome:>30}: pandas {pandas_s:7.2f} s  arrow {arrow_s:7.2f} s  {situacao}")
+
+    if divergencias:
+        print("\nDivergências:")
+        for divergencia in divergencias:
+            print(f"  {divergencia}")
+        sys.exit(1)
+    print("\nMotores equivalentes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Regressão das etapas aninhadas de metricas.etapa (ex.: "total" -> "leitura" ->
+"filtro_*", como no processamento de um arquivo): cada etapa fecha o próprio pico
+de RSS, mesmo quando as etapas abertas têm o mesmo valor parcial, e o pico de uma
+etapa inclui o das etapas dentro dela.
+
+Uso: python -m benchmarks.verificar_metricas
+
+Termina com código 1 se houver divergência.
+"""
+import sys
+
+import numpy as np
+
+import metricas
+
+MIB = 2**20
+ALOCACAO_MIB = 200
+
+
+def _alocar(mib: int) -> None:
+    bloco = np.ones(mib * MIB // 8)
+    bloco[:] = 2
+    del bloco
+
+
+def main() -> None:
+    divergencias = []
+    for repeticao in range(3):
+        try:
+            with metricas.coletar("aninhadas") as coletor:
+                with metricas.etapa("total"):
+                    with metricas.etapa("leitura"):
+                        with metricas.etapa("filtro_status"):
+                            pass
+                        with metricas.etapa("filtro_data"):
+                            _alocar(ALOCACAO_MIB)
+                        with metricas.etapa("filtro_auditado"):
+                            pass
+                    with metricas.etapa("escrita"):
+                        pass
+        except ValueError as erro:
+            divergencias.append(f"repetição {repeticao}: {erro}")
+            continue
+        if metricas._picos_rss_abertos:
+            divergencias.append(f"repetição {repeticao}: {len(metricas._picos_rss_abertos)} pico(s) ficaram abertos")
+
+        picos = {registro.etapa: registro.pico_rss_bytes for registro in coletor.registros}
+        if any(pico is None for pico in picos.values()):
+            # Sem /proc/self/clear_refs não há pico por etapa; só o fechamento é conferido
+            continue
+        for externa, interna in [("leitura", "filtro_data"), ("total", "leitura"), ("total", "escrita")]:
+            if picos[externa] < picos[interna]:
+                divergencias.append(f"repetição {repeticao}: pico de {externa} menor que o de {interna}")
+        if picos["filtro_data"] - picos["filtro_status"] < ALOCACAO_MIB * MIB // 2:
+            divergencias.append(f"repetição {repeticao}: pico de filtro_data não inclui a alocação")
+        for nome, pico in picos.items():
+            print(f"{repeticao} {nome:>16}: pico {pico / MIB:8.1f} MiB")
+
+    if divergencias:
+        print("\nDivergências:")
+        for divergencia in divergencias:
+            print(f"  {divergencia}")
+        sys.exit(1)
+    print("\nEtapas aninhadas sem divergências")
+
+
+if __name__ == "__main__":
+    main()
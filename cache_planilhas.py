@@ -0,0 +1,260 @@
+"""
+Cache em disco das planilhas já lidas, indexado só pelo SHA-256 do conteúdo
+enviado.
+
+Cada planilha é guardada inteira (todas as linhas e colunas) em formato Feather
+(Arrow IPC), com os tipos da leitura. Quando o mesmo arquivo é enviado de novo,
+mesmo com outro filtro, outra data de referência ou outro tipo de relatório, a
+leitura do XLSX é pulada e os filtros rodam sobre a planilha do cache.
+
+Os arquivos têm dados pessoais (CPF, nome): a pasta só é acessível ao usuário do
+servidor, nada é desserializado com pickle e cada arquivo expira
+CACHE_PLANILHAS_TTL_HORAS depois de gravado, mesmo que continue sendo usado.
+O tamanho total é limitado e os arquivos menos usados são removidos primeiro (LRU).
+"""
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+CACHE_PLANILHAS_DIR = os.environ.get("CACHE_PLANILHAS_DIR", "cache_planilhas")
+CACHE_PLANILHAS_MAX_MB = int(os.environ.get("CACHE_PLANILHAS_MAX_MB", "1024"))
+CACHE_PLANILHAS_TTL_HORAS = float(os.environ.get("CACHE_PLANILHAS_TTL_HORAS", "24"))
+
+_EXTENSAO = ".feather"
+_VERSAO = b"3"  # Formato dos arquivos; versões antigas são tratadas como ausentes
+
+
+_BLOCO_HASH = 1024 * 1024
+
+
+def chave_conteudo(contents: Union[bytes, str]) -> str:
+    """SHA-256 do conteúdo; `contents` pode ser o próprio conteúdo ou o caminho do arquivo."""
+    sha = hashlib.sha256()
+    if isinstance(contents, (bytes, bytearray)):
+        sha.update(contents)
+    else:
+        with open(contents, "rb") as arquivo:
+            for bloco in iter(lambda: arquivo.read(_BLOCO_HASH), b""):
+                sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _caminho(chave: str) -> str:
+    return os.path.join(CACHE_PLANILHAS_DIR, chave + _EXTENSAO)
+
+
+def _expirado(info: os.stat_result) -> bool:
+    # mtime é o momento da gravação: o uso só atualiza o atime (ver obter)
+    return time.time() - info.st_mtime > CACHE_PLANILHAS_TTL_HORAS * 3600
+
+
+def _coluna_mista(serie: pd.Series) -> bool:
+    """
+    Colunas object que não são só texto: com tipos misturados (ex.: int e str) não
+    cabem num tipo Arrow só e, só com datas ou números, voltariam como datetime64
+    ou float64 em vez de object.
+    """
+    if serie.dtype != object:
+        return False
+    return not serie.dropna().map(type).isin([str]).all()
+
+
+def _tipo_misto(valor) -> int:
+    """Posição do filho da union (_tipos_mistos) que guarda o valor."""
+    if valor is None:
+        return 0
+    if isinstance(valor, (bool, np.bool_)):
+        return 1
+    if isinstance(valor, (int, np.integer)):
+        return 2
+    if isinstance(valor, (float, np.floating)):
+        return 3
+    if isinstance(valor, str):
+        return 4
+    if isinstance(valor, datetime.datetime):
+        return 5
+    if isinstance(valor, datetime.date):
+        return 6
+    if isinstance(valor, datetime.time):
+        return 7
+    # Tipo sem representação: o DataFrame não é guardado (ver guardar)
+    raise TypeError(f"tipo não suportado no cache: {type(valor).__name__}")
+
+
+def _tipos_mistos():
+    import pyarrow as pa
+
+    return [
+        pa.null(), pa.bool_(), pa.int64(), pa.float64(), pa.string(),
+        pa.timestamp("us"), pa.date32(), pa.time64("us"),
+    ]
+
+
+def _union_mista(serie: pd.Series):
+    """
+    Coluna mista como dense union do Arrow: cada valor vai para o filho do seu tipo
+    Python, de modo que int, float, texto e datas voltam com o tipo original.
+    """
+    import pyarrow as pa
+
+    tipos = _tipos_mistos()
+    codigos = np.empty(len(serie), dtype=np.int8)
+    offsets = np.empty(len(serie), dtype=np.int32)
+    filhos = [[] for _ in tipos]
+    for posicao, valor in enumerate(serie):
+        if isinstance(valor, np.generic):
+            valor = valor.item()
+        codigo = _tipo_misto(valor)
+        codigos[posicao] = codigo
+        offsets[posicao] = len(filhos[codigo])
+        filhos[codigo].append(valor)
+    return pa.UnionArray.from_dense(
+        pa.array(codigos, type=pa.int8()),
+        pa.array(offsets, type=pa.int32()),
+        [pa.array(valores, type=tipo) for valores, tipo in zip(filhos, tipos)],
+    )
+
+
+def _nome_coluna(nome):
+    return nome.item() if isinstance(nome, np.generic) else nome
+
+
+def _para_arrow(df: pd.DataFrame):
+    """
+    Converte o DataFrame para uma tabela Arrow. As colunas recebem nomes posicionais
+    (os nomes originais podem ser repetidos ou não ser texto, e vão em JSON nos
+    metadados) e as colunas mistas viram unions, preservando os tipos originais.
+    """
+    import pyarrow as pa
+
+    arrays = []
+    mistas = []
+    for posicao in range(df.shape[1]):
+        serie = df.iloc[:, posicao]
+        if _coluna_mista(serie):
+            mistas.append(posicao)
+            arrays.append(_union_mista(serie))
+        else:
+            arrays.append(pa.Array.from_pandas(serie))
+
+    nomes = [f"c{posicao}" for posicao in range(df.shape[1])]
+    metadata = {
+        b"versao": _VERSAO,
+        b"colunas": json.dumps([_nome_coluna(nome) for nome in df.columns]).encode(),
+        b"mistas": json.dumps(mistas).encode(),
+    }
+    return pa.Table.from_arrays(arrays, names=nomes, metadata=metadata)
+
+
+def _de_arrow(tabela) -> Optional[pd.DataFrame]:
+    metadata = tabela.schema.metadata or {}
+    if metadata.get(b"versao") != _VERSAO:
+        return None
+    colunas = json.loads(metadata[b"colunas"])
+    mistas = set(json.loads(metadata[b"mistas"]))
+
+    dados = {}
+    for posicao in range(tabela.num_columns):
+        coluna = tabela.column(posicao)
+        if posicao in mistas:
+            serie = pd.Series(coluna.to_pylist(), dtype=object)
+        else:
+            serie = coluna.to_pandas()
+            if serie.dtype == object:
+                # O Arrow devolve None onde o pd.read_excel teria NaN
+                serie = serie.where(serie.notna(), np.nan)
+        dados[posicao] = serie
+
+    df = pd.DataFrame(dados, index=pd.RangeIndex(tabela.num_rows))
+    df.columns = colunas
+    return df
+
+
+def obter(chave: str) -> Optional[pd.DataFrame]:
+    """Retorna o DataFrame guardado para a chave, ou None se não estiver no cache (ou expirou)."""
+    caminho = _caminho(chave)
+    try:
+        from pyarrow import feather
+
+        info = os.stat(caminho)
+        if _expirado(info):
+            os.remove(caminho)
+            return None
+        tabela = feather.read_table(caminho, memory_map=True)
+    except (ImportError, OSError):
+        return None
+
+    try:
+        # Marca o arquivo como usado recentemente (base do LRU) sem mudar a data de gravação
+        os.utime(caminho, (time.time(), info.st_mtime))
+    except OSError:
+        pass
+    return _de_arrow(tabela)
+
+
+def _criar_pasta() -> None:
+    os.makedirs(CACHE_PLANILHAS_DIR, mode=0o700, exist_ok=True)
+    # makedirs não altera uma pasta que já existia
+    os.chmod(CACHE_PLANILHAS_DIR, 0o700)
+
+
+def guardar(chave: str, df: pd.DataFrame) -> None:
+    """
+    Grava o DataFrame no cache e remove os arquivos expirados e os menos usados se o
+    limite for ultrapassado. Falhas de gravação são ignoradas: o cache é só uma otimização.
+    """
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return
+
+    try:
+        _criar_pasta()
+        # Grava em arquivo temporário (criado com permissão 0600) e renomeia, para
+        # que outro processo nunca leia um arquivo pela metade
+        fd, temporario = tempfile.mkstemp(dir=CACHE_PLANILHAS_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            feather.write_feather(_para_arrow(df), temporario)
+            os.replace(temporario, _caminho(chave))
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+    except Exception:
+        return
+
+    _remover_excedente()
+
+
+def _remover_excedente() -> None:
+    limite = CACHE_PLANILHAS_MAX_MB * 1024 * 1024
+    arquivos = []
+    for nome in os.listdir(CACHE_PLANILHAS_DIR):
+        if not nome.endswith(_EXTENSAO):
+            continue
+        caminho = os.path.join(CACHE_PLANILHAS_DIR, nome)
+        try:
+            info = os.stat(caminho)
+            if _expirado(info):
+                os.remove(caminho)
+                continue
+        except OSError:
+            continue
+        arquivos.append((info.st_atime, info.st_size, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
@@ -0,0 +1,164 @@
+"""
+Controle de admissão das requisições de processamento por memória estimada.
+
+O custo de cada requisição é estimado antes de processar, a partir do número de
+células dos arquivos enviados, com os metadados lidos na identificação
+(identificacao_planilha.py):
+- XLSX: dimensão declarada na aba (<dimension ref="A1:BQ500001">) e tamanho do XML
+  da aba, sem abrir a planilha;
+- Parquet: linhas e colunas dos metadados;
+- CSV: tamanho do arquivo.
+
+As requisições só rodam enquanto a soma dos custos cabe em ADMISSAO_MEMORIA_MB;
+as demais esperam em fila (por ordem de chegada). Com a fila cheia
+(ADMISSAO_FILA_MAX), a requisição é recusada com 503 e Retry-After. Uma
+requisição maior que o orçamento inteiro roda sozinha.
+
+A reserva vale enquanto o pool de processos ainda trabalha para a requisição: se
+ela termina antes (ex.: 504 por tempo limite, que não interrompe o processo do
+pool), a memória só é liberada quando as tarefas seguradas na Reserva terminam.
+"""
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+import leitura_colunar
+import metricas
+from identificacao_planilha import Identificacao
+
+# Orçamento de memória das requisições em processamento, por worker (0 = sem controle)
+ADMISSAO_MEMORIA_MB = float(os.environ.get("ADMISSAO_MEMORIA_MB", "1024"))
+# Requisições aguardando na fila antes de começar a recusar
+ADMISSAO_FILA_MAX = int(os.environ.get("ADMISSAO_FILA_MAX", "8"))
+ADMISSAO_RETRY_AFTER_SEGUNDOS = int(os.environ.get("ADMISSAO_RETRY_AFTER_SEGUNDOS", "30"))
+# Memória por célula lida (DataFrame object + cópias dos filtros + escrita), medida
+# com benchmarks/calibrar_admissao.py: ~42 bytes/célula a 100 mil linhas, com folga.
+# Abaixo de EXCEL_WRITER_LIMIAR_LINHAS a escrita em openpyxl custa mais por célula,
+# mas esses arquivos ficam em ~250 MB no total.
+ADMISSAO_BYTES_POR_CELULA = float(os.environ.get("ADMISSAO_BYTES_POR_CELULA", "55"))
+
+BYTES_XML_POR_CELULA = 30  # <c r="AB123" s="1"><v>123</v></c>
+BYTES_CSV_POR_CELULA = 8
+
+
+class FilaCheia(Exception):
+    """A requisição não cabe no orçamento e a fila de espera está cheia."""
+
+
+def estimar_celulas(identificacao: Identificacao) -> int:
+    """Células do arquivo (estimadas) a partir dos metadados lidos na identificação."""
+    celulas = 0
+    if identificacao.linhas is not None and identificacao.colunas:
+        celulas = identificacao.linhas * identificacao.colunas
+    if identificacao.formato == leitura_colunar.FORMATO_XLSX and identificacao.bytes_xml:
+        # A dimensão declarada pode faltar ou estar errada (A1); vale a maior estimativa
+        return max(celulas, identificacao.bytes_xml // BYTES_XML_POR_CELULA)
+    return celulas or identificacao.bytes_arquivo // BYTES_CSV_POR_CELULA
+
+
+def estimar_memoria(identificacoes: List[Identificacao]) -> int:
+    """Memória (bytes) estimada para processar os arquivos de uma requisição."""
+    return int(sum(estimar_celulas(identificacao) for identificacao in identificacoes) * ADMISSAO_BYTES_POR_CELULA)
+
+
+class Reserva:
+    """Tarefas do pool que ainda usam a memória reservada de uma requisição."""
+
+    def __init__(self) -> None:
+        self.pendentes: List[asyncio.Future] = []
+
+    def segurar(self, future: asyncio.Future) -> None:
+        """A reserva só é liberada depois que `future` terminar."""
+        self.pendentes.append(future)
+
+
+class ControleAdmissao:
+    """Reserva de memória com fila por ordem de chegada (um por worker)."""
+
+    def __init__(self, orcamento_bytes: int, fila_max: int):
+        self.orcamento = orcamento_bytes
+        self.fila_max = fila_max
+        self.em_uso = 0
+        self._fila: deque = deque()
+        self._condicao = asyncio.Condition()
+        self._liberacoes: set = set()
+        metricas.definir_gauge("admissao_memoria_orcamento_bytes", orcamento_bytes)
+        self._atualizar_metricas()
+
+    def _cabe(self, custo: int) -> bool:
+        return self.em_uso == 0 or self.em_uso + custo <= self.orcamento
+
+    def _atualizar_metricas(self) -> None:
+        metricas.definir_gauge("admissao_fila_requisicoes", len(self._fila))
+        metricas.definir_gauge("admissao_memoria_reservada_bytes", self.em_uso)
+
+    def recusaria(self, custo: int) -> bool:
+        """True se a requisição teria que esperar e a fila já está cheia."""
+        custo = min(custo, self.orcamento)
+        return (bool(self._fila) or not self._cabe(custo)) and len(self._fila) >= self.fila_max
+
+    def recusar(self) -> FilaCheia:
+        """Conta a recusa nas métricas e devolve a exceção para quem for levantá-la."""
+        metricas.incrementar_contador("admissao_rejeicoes_total")
+        return FilaCheia()
+
+    async def _liberar(self, custo: int) -> None:
+        async with self._condicao:
+            self.em_uso -= custo
+            self._atualizar_metricas()
+            self._condicao.notify_all()
+
+    async def _liberar_depois(self, custo: int, pendentes: List[asyncio.Future]) -> None:
+        await asyncio.wait(pendentes)
+        for future in pendentes:
+            # O resultado já não tem quem receba; só evita o aviso de exceção não lida
+            if not future.cancelled():
+                future.exception()
+        await self._liberar(custo)
+
+    @asynccontextmanager
+    async def admitir(self, custo: int, limitar_fila: bool = True) -> AsyncIterator[Reserva]:
+        """
+        Espera a vez e a memória para rodar o bloco. Com limitar_fila=True e a fila
+        cheia, levanta FilaCheia em vez de esperar. As tarefas seguradas na Reserva
+        devolvida mantêm a memória reservada depois do bloco, até terminarem.
+        """
+        if limitar_fila and self.recusaria(custo):
+            raise self.recusar()
+        custo = min(custo, self.orcamento)
+
+        vez = object()
+        self._fila.append(vez)
+        self._atualizar_metricas()
+        try:
+            async with self._condicao:
+                await self._condicao.wait_for(lambda: self._fila[0] is vez and self._cabe(custo))
+                self._fila.popleft()
+                self.em_uso += custo
+                self._atualizar_metricas()
+                # O próximo da fila pode caber no que sobrou
+                self._condicao.notify_all()
+        except BaseException:
+            if vez in self._fila:
+                self._fila.remove(vez)
+                self._atualizar_metricas()
+                async with self._condicao:
+                    self._condicao.notify_all()
+            raise
+
+        metricas.incrementar_contador("admissao_admitidas_total")
+        reserva = Reserva()
+        try:
+            yield reserva
+        finally:
+            pendentes = [future for future in reserva.pendentes if not future.done()]
+            if pendentes:
+                metricas.incrementar_contador("admissao_reservas_retidas_total")
+                liberacao = asyncio.ensure_future(self._liberar_depois(custo, pendentes))
+                # Mantém a referência até o fim, senão o asyncio pode descartar a tarefa
+                self._liberacoes.add(liberacao)
+                liberacao.add_done_callback(self._liberacoes.discard)
+            else:
+                await self._liberar(custo)
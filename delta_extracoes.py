@@ -0,0 +1,117 @@
+"""
+Comparação de uma extração mensal com a anterior do mesmo banco e tipo de arquivo.
+
+De cada extração processada fica guardado em DELTA_DIR só o contrato e o hash de
+cada linha (Feather), um arquivo por banco, tipo e data da extração. Uma extração
+é comparada com a última guardada com data estritamente anterior: as linhas cujo
+hash já existia estão inalteradas; as demais são NOVO (contrato inédito) ou
+ALTERADO (contrato já existia com outro conteúdo), e os contratos que sumiram são
+REMOVIDO. Reenviar a extração da mesma data refaz a comparação com a anterior em
+vez de comparar o arquivo com ele mesmo.
+
+O resumo só é guardado (guardar) depois que o relatório da requisição foi gravado,
+para que uma requisição com erro não substitua a base da próxima comparação.
+"""
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indice_contratos import texto_contratos
+
+DELTA_DIR = os.environ.get("DELTA_DIR", "delta_extracoes")
+
+SITUACAO_NOVO = "NOVO"
+SITUACAO_ALTERADO = "ALTERADO"
+SITUACAO_REMOVIDO = "REMOVIDO"
+
+
+def _prefixo(banco: str, tipo: str) -> str:
+    return f"{banco.lower()}_{tipo}_"
+
+
+def _caminho(banco: str, tipo: str, data_extracao: str) -> str:
+    return os.path.join(DELTA_DIR, f"{_prefixo(banco, tipo)}{data_extracao}.feather")
+
+
+_DATA_ARQUIVO = re.compile(r"^(\d{4}-\d{2}-\d{2})\.feather$")
+
+
+def hash_linhas(df: pd.DataFrame) -> np.ndarray:
+    """Hash de cada linha sobre todas as colunas (uint64)."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def resumo_extracao(df: pd.DataFrame) -> pd.DataFrame:
+    """O que é guardado de cada extração: contrato (texto) e hash de cada linha."""
+    return pd.DataFrame({"contrato": texto_contratos(df["CONTRATO"]), "hash": hash_linhas(df)})
+
+
+def carregar_anterior(banco: str, tipo: str, data_extracao: str) -> Optional[Tuple[str, pd.DataFrame]]:
+    """
+    (data, resumo) da última extração guardada com data anterior a `data_extracao`
+    (AAAA-MM-DD), ou None se não houver (ou sem pyarrow).
+    """
+    prefixo = _prefixo(banco, tipo)
+    try:
+        nomes = os.listdir(DELTA_DIR)
+    except OSError:
+        return None
+    datas = []
+    for nome in nomes:
+        encontrado = nome.startswith(prefixo) and _DATA_ARQUIVO.match(nome[len(prefixo):])
+        if encontrado and encontrado.group(1) < data_extracao:
+            datas.append(encontrado.group(1))
+    if not datas:
+        return None
+    data = max(datas)
+    try:
+        return data, pd.read_feather(_caminho(banco, tipo, data))
+    except (ImportError, OSError):
+        return None
+
+
+def guardar(banco: str, tipo: str, data_extracao: str, resumo: pd.DataFrame) -> None:
+    """Guarda (ou substitui) o resumo da extração da data. Falhas de gravação são ignoradas."""
+    try:
+        os.makedirs(DELTA_DIR, exist_ok=True)
+        # Grava em arquivo temporário e renomeia, para que outro processo nunca leia
+        # um arquivo pela metade
+        fd, temporario = tempfile.mkstemp(dir=DELTA_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            resumo.reset_index(drop=True).to_feather(temporario)
+            os.replace(temporario, _caminho(banco, tipo, data_extracao))
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+    except Exception:
+        return
+
+
+def comparar(df: pd.DataFrame, atual: pd.DataFrame, anterior: pd.DataFrame) -> pd.DataFrame:
+    """
+    Linhas de `df` novas ou alteradas em relação à extração `anterior`, com a coluna
+    SITUACAO na frente, seguidas dos contratos removidos (só com CONTRATO preenchido).
+    `atual` é o resumo_extracao de `df`.
+    """
+    inalteradas = np.isin(atual["hash"].to_numpy(), anterior["hash"].to_numpy())
+    contratos_anteriores = pd.Index(anterior["contrato"].unique())
+    ja_existia = contratos_anteriores.get_indexer(atual["contrato"]) != -1
+
+    mudancas = df[~inalteradas]
+    situacao = np.where(ja_existia[~inalteradas], SITUACAO_ALTERADO, SITUACAO_NOVO)
+    mudancas = mudancas.drop(columns="SITUACAO", errors="ignore")
+    mudancas.insert(0, "SITUACAO", situacao)
+
+    removidos = contratos_anteriores.difference(pd.Index(atual["contrato"].unique()))
+    removidos = removidos[removidos != ""]
+    df_removidos = pd.DataFrame({"SITUACAO": SITUACAO_REMOVIDO, "CONTRATO": removidos.to_numpy()})
+
+    partes = [parte for parte in (mudancas, df_removidos) if not parte.empty]
+    if not partes:
+        return mudancas
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,279 @@
+"""
+Escrita dos relatórios com backends intercambiáveis.
+
+- openpyxl: df.to_excel via pd.ExcelWriter (comportamento original).
+- xlsxwriter: grava linha a linha em modo constant_memory, com memória constante
+  independente do tamanho da aba. O pd.ExcelWriter não serve para esse modo porque
+  o pandas escreve as células coluna a coluna, e o constant_memory só aceita a
+  linha atual.
+
+Nos dois backends do XLSX, abas acima do limite de linhas do Excel continuam em
+"<aba> (parte 2)", "(parte 3)"... e valores infinitos viram células vazias, como
+NaN e NaT (o XLSX não tem infinito).
+- csv-zip: um CSV por aba (separador ";" e decimal ","), gravado em blocos direto
+  dentro de um zip.
+- parquet: um arquivo Parquet por aba dentro de um zip (requer pyarrow).
+"""
+import importlib.util
+import io
+import os
+import zipfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import progresso
+
+# "auto" usa xlsxwriter a partir de EXCEL_WRITER_LIMIAR_LINHAS linhas (se instalado)
+EXCEL_WRITER_ENGINE = os.environ.get("EXCEL_WRITER_ENGINE", "auto").lower()
+EXCEL_WRITER_LIMIAR_LINHAS = int(os.environ.get("EXCEL_WRITER_LIMIAR_LINHAS", "20000"))
+
+LIMITE_NOME_ABA = 31  # Limite do Excel para nomes de abas
+LIMITE_LINHAS_EXCEL = 1048576  # Limite do Excel de linhas por aba, com o cabeçalho
+BLOCO_LINHAS_ESCRITA = 10000
+
+
+def _registrar_aba(escritor, nome: str, df: pd.DataFrame, linhas: Optional[np.ndarray]) -> None:
+    """Conta a aba gravada e publica o evento de progresso (aba N, linhas)."""
+    escritor.abas_escritas += 1
+    progresso.emitir(
+        progresso.EVENTO_ABA_ESCRITA,
+        aba=nome,
+        numero=escritor.abas_escritas,
+        linhas=len(df) if linhas is None else len(linhas),
+    )
+
+
+def _partes_aba(nome: str, total: int) -> list:
+    """(nome, início, fim) de cada aba necessária para `total` linhas de dados."""
+    por_aba = LIMITE_LINHAS_EXCEL - 1
+    partes = []
+    for numero, inicio in enumerate(range(0, max(total, 1), por_aba), start=1):
+        sufixo = "" if numero == 1 else f" (parte {numero})"
+        partes.append((nome[:LIMITE_NOME_ABA - len(sufixo)] + sufixo, inicio, min(inicio + por_aba, total)))
+    return partes
+
+
+def _infinitos(serie: pd.Series) -> pd.Series:
+    if pd.api.types.is_float_dtype(serie.dtype) or serie.dtype == object:
+        return serie.isin([np.inf, -np.inf])
+    return pd.Series(False, index=serie.index)
+
+
+def _sem_infinitos(df: pd.DataFrame) -> pd.DataFrame:
+    """±inf como NaN, sem mudar o tipo das colunas (o replace converteria as object)."""
+    infinitos = {posicao: _infinitos(df.iloc[:, posicao]) for posicao in range(df.shape[1])}
+    infinitos = {posicao: mascara for posicao, mascara in infinitos.items() if mascara.any()}
+    if not infinitos:
+        return df
+    df = df.copy()
+    for posicao, mascara in infinitos.items():
+        df.isetitem(posicao, df.iloc[:, posicao].where(~mascara, np.nan))
+    return df
+
+
+def _valores_celulas(serie: pd.Series) -> list:
+    """Valores Python da coluna, com vazio (None) no lugar de NaN, NaT e ±inf."""
+    vazios = serie.isna() | _infinitos(serie)
+    return serie.astype(object).where(~vazios, None).tolist()
+
+
+class EscritorOpenpyxl:
+    def __init__(self, output):
+        self._writer = pd.ExcelWriter(output, engine="openpyxl")
+        self.abas_escritas = 0
+
+    def escrever_aba(self, nome: str, df: pd.DataFrame, linhas: Optional[np.ndarray] = None) -> None:
+        if linhas is not None:
+            df = df.take(linhas)
+        for nome_parte, inicio, fim in _partes_aba(nome, len(df)):
+            # Não usa o inf_rep do to_excel, que ainda escreve o sinal de -inf
+            _sem_infinitos(df.iloc[inicio:fim]).to_excel(self._writer, sheet_name=nome_parte, index=False)
+        _registrar_aba(self, nome, df, None)
+
+    def fechar(self) -> None:
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class EscritorXlsxwriter:
+    def __init__(self, output):
+        import xlsxwriter
+
+        self._workbook = xlsxwriter.Workbook(output, {
+            "constant_memory": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        })
+        # Mesmo estilo de cabeçalho do df.to_excel
+        self._formato_cabecalho = self._workbook.add_format(
+            {"bold": True, "border": 1, "align": "center", "valign": "top"}
+        )
+        self._nomes = set()
+        self.abas_escritas = 0
+
+    def _nome_unico(self, nome: str) -> str:
+        base = nome[:LIMITE_NOME_ABA]
+        candidato = base
+        contador = 1
+        while candidato.lower() in self._nomes:
+            sufixo = f" ({contador})"
+            candidato = base[:LIMITE_NOME_ABA - len(sufixo)] + sufixo
+            contador += 1
+        self._nomes.add(candidato.lower())
+        return candidato
+
+    def escrever_aba(self, nome: str, df: pd.DataFrame, linhas: Optional[np.ndarray] = None) -> None:
+        """Escreve o DataFrame (ou só as posições em `linhas`, sem copiar a aba inteira)."""
+        total = len(df) if linhas is None else len(linhas)
+        for nome_parte, inicio_parte, fim_parte in _partes_aba(nome, total):
+            worksheet = self._workbook.add_worksheet(self._nome_unico(nome_parte))
+            worksheet.write_row(0, 0, list(df.columns), self._formato_cabecalho)
+            linha = 1
+            for inicio in range(inicio_parte, fim_parte, BLOCO_LINHAS_ESCRITA):
+                fim = min(inicio + BLOCO_LINHAS_ESCRITA, fim_parte)
+                bloco = df.iloc[inicio:fim] if linhas is None else df.take(linhas[inicio:fim])
+                colunas = [_valores_celulas(bloco.iloc[:, posicao]) for posicao in range(bloco.shape[1])]
+                for valores in zip(*colunas):
+                    worksheet.write_row(linha, 0, valores)
+                    linha += 1
+        _registrar_aba(self, nome, df, linhas)
+
+    def fechar(self) -> None:
+        self._workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class EscritorZip:
+    """Base dos formatos com um arquivo por aba dentro de um zip."""
+    extensao = ""
+    compressao = zipfile.ZIP_DEFLATED
+
+    def __init__(self, output):
+        self._zip = zipfile.ZipFile(output, "w", compression=self.compressao, allowZip64=True)
+        self._nomes = set()
+        self.abas_escritas = 0
+
+    def _nome_unico(self, nome: str) -> str:
+        base = nome.replace("/", "-").replace("\\", "-")
+        candidato = base
+        contador = 1
+        while candidato.lower() in self._nomes:
+            candidato = f"{base} ({contador})"
+            contador += 1
+        self._nomes.add(candidato.lower())
+        return candidato + self.extensao
+
+    def escrever_aba(self, nome: str, df: pd.DataFrame, linhas: Optional[np.ndarray] = None) -> None:
+        with self._zip.open(self._nome_unico(nome), "w", force_zip64=True) as destino:
+            self._gravar(destino, df, linhas)
+        _registrar_aba(self, nome, df, linhas)
+
+    def _gravar(self, destino, df: pd.DataFrame, linhas: Optional[np.ndarray]) -> None:
+        raise NotImplementedError
+
+    def fechar(self) -> None:
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class EscritorCsvZip(EscritorZip):
+    extensao = ".csv"
+
+    def _gravar(self, destino, df: pd.DataFrame, linhas: Optional[np.ndarray]) -> None:
+        texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+        total = len(df) if linhas is None else len(linhas)
+        if total == 0:
+            df.iloc[:0].to_csv(texto, sep=";", decimal=",", index=False)
+        for inicio in range(0, total, BLOCO_LINHAS_ESCRITA):
+            if linhas is None:
+                bloco = df.iloc[inicio:inicio + BLOCO_LINHAS_ESCRITA]
+            else:
+                bloco = df.take(linhas[inicio:inicio + BLOCO_LINHAS_ESCRITA])
+            bloco.to_csv(texto, sep=";", decimal=",", index=False, header=inicio == 0)
+        texto.flush()
+        texto.detach()
+
+
+def _coluna_arrow(serie: pd.Series):
+    import pyarrow as pa
+
+    try:
+        return pa.array(serie, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colunas com tipos misturados (ex.: número e texto) vão como texto
+        return pa.array(serie.astype(str).where(serie.notna(), None), type=pa.string())
+
+
+class EscritorParquet(EscritorZip):
+    extensao = ".parquet"
+    compressao = zipfile.ZIP_STORED  # O Parquet já é comprimido
+
+    def __init__(self, output):
+        # Falha cedo, antes de criar o zip, se o pyarrow não estiver instalado
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("O formato parquet requer o pyarrow")
+        super().__init__(output)
+
+    def _gravar(self, destino, df: pd.DataFrame, linhas: Optional[np.ndarray]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if linhas is not None:
+            df = df.take(linhas)
+        tabela = pa.Table.from_arrays(
+            [_coluna_arrow(df.iloc[:, posicao]) for posicao in range(df.shape[1])],
+            names=[str(coluna) for coluna in df.columns],
+        )
+        pq.write_table(tabela, destino, row_group_size=BLOCO_LINHAS_ESCRITA * 10)
+
+
+FORMATOS_SAIDA = {
+    # formato: (extensão do arquivo, media type)
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv-zip": (".zip", "application/zip"),
+    "parquet": (".zip", "application/zip"),
+}
+
+
+def _xlsxwriter_disponivel() -> bool:
+    return importlib.util.find_spec("xlsxwriter") is not None
+
+
+def criar_escritor(output, total_linhas: int = 0, engine: Optional[str] = None, formato: str = "xlsx"):
+    """
+    Cria o escritor do relatório no `formato` pedido (ver FORMATOS_SAIDA). No XLSX,
+    com engine "auto", usa xlsxwriter para saídas grandes
+    (total_linhas >= EXCEL_WRITER_LIMIAR_LINHAS) e openpyxl nas demais ou quando o
+    xlsxwriter não está instalado.
+    """
+    if formato == "csv-zip":
+        return EscritorCsvZip(output)
+    if formato == "parquet":
+        return EscritorParquet(output)
+
+    engine = (engine or EXCEL_WRITER_ENGINE).lower()
+    if engine == "auto":
+        usar_xlsxwriter = total_linhas >= EXCEL_WRITER_LIMIAR_LINHAS and _xlsxwriter_disponivel()
+        engine = "xlsxwriter" if usar_xlsxwriter else "openpyxl"
+
+    if engine == "xlsxwriter":
+        return EscritorXlsxwriter(output)
+    return EscritorOpenpyxl(output)
@@ -0,0 +1,126 @@
+"""
+Jobs de processamento assíncrono (enviar, consultar status, baixar o resultado).
+
+Cada job tem uma pasta em JOBS_DIR com o status (status.json), os eventos de
+progresso (eventos.jsonl) e, ao final, o relatório gerado. Como o estado fica em
+disco, qualquer worker do gunicorn responde à consulta de status, ao stream de
+progresso e ao download, não só o que executou o job.
+Jobs concluídos ou com erro são removidos JOBS_TTL_SEGUNDOS depois da última
+atualização. Jobs na fila ou em processamento não expiram pelo TTL: só são removidos
+se ficarem JOBS_ABANDONADO_SEGUNDOS sem atualização nem evento de progresso (o
+worker que os executava morreu).
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+JOBS_DIR = os.environ.get("JOBS_DIR", "jobs_processamento")
+JOBS_TTL_SEGUNDOS = int(os.environ.get("JOBS_TTL_SEGUNDOS", "3600"))
+JOBS_ABANDONADO_SEGUNDOS = int(os.environ.get("JOBS_ABANDONADO_SEGUNDOS", "86400"))
+
+STATUS_NA_FILA = "na_fila"
+STATUS_PROCESSANDO = "processando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
+STATUS_FINAIS = (STATUS_CONCLUIDO, STATUS_ERRO)
+
+_ARQUIVO_STATUS = "status.json"
+_ARQUIVO_RESULTADO = "resultado"
+_ARQUIVO_EVENTOS = "eventos.jsonl"
+_ID_VALIDO = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _pasta(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _gravar_status(job_id: str, status: dict) -> None:
+    # Grava em arquivo temporário e renomeia, para que outro worker nunca leia
+    # um status pela metade
+    pasta = _pasta(job_id)
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+            json.dump(status, arquivo, ensure_ascii=False)
+        os.replace(temporario, os.path.join(pasta, _ARQUIVO_STATUS))
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def criar(total_arquivos: int) -> str:
+    """Cria um job na fila e retorna o seu id."""
+    remover_expirados()
+    job_id = uuid.uuid4().hex
+    os.makedirs(_pasta(job_id))
+    agora = time.time()
+    _gravar_status(job_id, {
+        "job_id": job_id,
+        "status": STATUS_NA_FILA,
+        "total_arquivos": total_arquivos,
+        "criado_em": agora,
+        "atualizado_em": agora,
+        "filename": None,
+        "detail": None,
+    })
+    return job_id
+
+
+def obter(job_id: str) -> Optional[dict]:
+    """Status do job, ou None se o id for inválido, desconhecido ou já expirado."""
+    if not _ID_VALIDO.match(job_id or ""):
+        return None
+    try:
+        with open(os.path.join(_pasta(job_id), _ARQUIVO_STATUS), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def atualizar(job_id: str, **campos) -> None:
+    status = obter(job_id)
+    if status is None:
+        return
+    status.update(campos, atualizado_em=time.time())
+    _gravar_status(job_id, status)
+
+
+def caminho_resultado(job_id: str) -> str:
+    """Caminho onde o relatório do job é gravado (e de onde é baixado)."""
+    return os.path.join(_pasta(job_id), _ARQUIVO_RESULTADO)
+
+
+def caminho_eventos(job_id: str) -> str:
+    """Arquivo dos eventos de progresso do job (ver progresso.py)."""
+    return os.path.join(_pasta(job_id), _ARQUIVO_EVENTOS)
+
+
+def _ultima_atividade(pasta: str) -> Optional[float]:
+    # Status, eventos de progresso ou, sem eles (criação interrompida), a própria pasta
+    datas = []
+    for caminho in (os.path.join(pasta, _ARQUIVO_STATUS), os.path.join(pasta, _ARQUIVO_EVENTOS), pasta):
+        try:
+            datas.append(os.stat(caminho).st_mtime)
+        except OSError:
+            continue
+    return max(datas, default=None)
+
+
+def remover_expirados() -> None:
+    if not os.path.isdir(JOBS_DIR):
+        return
+    agora = time.time()
+    for job_id in os.listdir(JOBS_DIR):
+        ultima_atividade = _ultima_atividade(_pasta(job_id))
+        if ultima_atividade is None:
+            continue
+        status = obter(job_id)
+        # Sem status legível (criação interrompida) não há job em andamento
+        em_andamento = status is not None and status.get("status") not in STATUS_FINAIS
+        if ultima_atividade < agora - (JOBS_ABANDONADO_SEGUNDOS if em_andamento else JOBS_TTL_SEGUNDOS):
+            shutil.rmtree(_pasta(job_id), ignore_errors=True)
@@ -0,0 +1,458 @@
+"""
+Identificação das planilhas pelo conteúdo, antes da leitura completa.
+
+Lê só os metadados, o cabeçalho e as primeiras linhas de dados:
+- XLSX: nome da primeira aba, título do documento, dimensão declarada e as
+  primeiras linhas, lidos em streaming do zip. Das strings compartilhadas, só as
+  necessárias; dos estilos, quais formatam datas.
+- CSV: o cabeçalho e as primeiras linhas, como texto.
+- Parquet: o schema, o número de linhas e o primeiro lote das colunas da amostra.
+
+O tipo (3026-11/12/15) vem das colunas que cada um preenche, as mesmas que os
+filtros de processar_contratos.py usam:
+- 3026-15: datas em AB e em pelo menos duas de W, AD e AK (o bloco S..AL);
+- 3026-11: datas em W (data habitacional) e não em AB;
+- 3026-12: códigos DEST ("1x4") em AA ou AB, sem datas em W.
+As colunas só valem num cabeçalho de extração 3026 (CONTRATO e uma das colunas
+de auditado). Se elas não decidirem, vale o tipo citado na aba ou no título do
+documento e, sem eles, no nome do arquivo; sem nenhum, o tipo fica None e o
+arquivo segue pela sequência genérica de filtros, sem os filtros de tipo.
+
+O banco (BEMGE ou MINAS CAIXA) vem da aba ou do título e, sem eles, do nome do
+arquivo: preenche o banco quando ele não é escolhido e recusa a escolha que a
+aba ou o título contradizem (banco_do_arquivo). Os dois bancos usam o mesmo
+cabeçalho, então as colunas não indicam o banco. As dimensões alimentam a
+estimativa de memória do controle de admissão (controle_admissao.py).
+"""
+import datetime
+import io
+import math
+import os
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+import leitura_colunar
+
+TIPO_3026_11 = "3026-11"
+TIPO_3026_12 = "3026-12"
+TIPO_3026_15 = "3026-15"
+# Ordem de prioridade quando o texto cita mais de um tipo (o 3026-12 tem abas próprias)
+TIPOS_ARQUIVO = (TIPO_3026_12, TIPO_3026_11, TIPO_3026_15)
+
+ORIGEM_COLUNAS = "colunas"
+ORIGEM_TEXTO = "texto"  # Nome da aba ou título do documento
+ORIGEM_NOME = "nome"
+
+# Colunas sem as quais o arquivo não é uma extração 3026 (ver ESTRUTURA_DADOS_REAL.md):
+# CONTRATO e uma das colunas de auditado aceitas pelos filtros
+COLUNA_CONTRATO = "CONTRATO"
+COLUNAS_AUDITADO = ("AUDITADO", "AUD")
+
+# Linhas de dados lidas para classificar o tipo pelo conteúdo das colunas
+IDENTIFICACAO_AMOSTRA_LINHAS = int(os.environ.get("IDENTIFICACAO_AMOSTRA_LINHAS", "200"))
+# Fração mínima dos valores preenchidos de uma coluna para ela "ter" datas ou códigos
+IDENTIFICACAO_FRACAO_MINIMA = float(os.environ.get("IDENTIFICACAO_FRACAO_MINIMA", "0.8"))
+
+# Posições (0 = coluna A) que distinguem os tipos
+COLUNA_W, COLUNA_AA, COLUNA_AB, COLUNA_AD, COLUNA_AK = 22, 26, 27, 29, 36
+POSICOES_AMOSTRA = (COLUNA_W, COLUNA_AA, COLUNA_AB, COLUNA_AD, COLUNA_AK)
+
+CLASSE_DATA = "data"
+CLASSE_DEST = "dest"
+CLASSE_OUTRO = "outro"
+
+_PADROES_TIPO = {tipo: re.compile(tipo.replace("-", r"\s*[-_. ]?\s*")) for tipo in TIPOS_ARQUIVO}
+_PADROES_BANCO = {
+    "minas_caixa": re.compile(r"MINAS[\s_.-]*CAIXA"),
+    "bemge": re.compile(r"BEMGE"),
+}
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_RELACAO = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_NS_PACOTE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_NS_TITULO = "{http://purl.org/dc/elements/1.1/}title"
+_REFERENCIA = re.compile(r"([A-Z]+)(\d+)")
+_DATA_TEXTO = re.compile(
+    r"(\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2})([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?"
+)
+_CODIGO_DEST = re.compile(r"\d+[xX]\d+")
+
+Planilha = Union[bytes, str]
+# Classes dos valores preenchidos da amostra, por posição
+Amostra = Dict[int, List[str]]
+
+
+class BancoNaoConfere(ValueError):
+    """O banco escolhido contradiz o do arquivo, ou não foi escolhido nem identificado."""
+
+
+@dataclass
+class Identificacao:
+    formato: str
+    tipo: Optional[str] = None
+    banco: Optional[str] = None
+    origem_tipo: Optional[str] = None
+    origem_banco: Optional[str] = None
+    aba: Optional[str] = None
+    titulo: Optional[str] = None
+    cabecalho: List[str] = field(default_factory=list)
+    linhas: Optional[int] = None  # Linhas de dados (sem o cabeçalho), se conhecidas
+    colunas: Optional[int] = None
+    bytes_arquivo: int = 0
+    bytes_xml: Optional[int] = None  # Tamanho descomprimido da aba (XLSX)
+    amostra: Amostra = field(default_factory=dict, repr=False)
+
+    @property
+    def extracao_3026(self) -> bool:
+        nomes = {coluna.strip().upper() for coluna in self.cabecalho}
+        return COLUNA_CONTRATO in nomes and any(coluna in nomes for coluna in COLUNAS_AUDITADO)
+
+    def como_dict(self) -> dict:
+        return {
+            "tipo": self.tipo,
+            "banco": self.banco,
+            "origem_tipo": self.origem_tipo,
+            "origem_banco": self.origem_banco,
+            "formato": self.formato,
+            "linhas": self.linhas,
+            "colunas": self.colunas,
+        }
+
+
+def tipo_pelo_nome(texto: Optional[str]) -> Optional[str]:
+    """Tipo citado no texto ("3026-12", "3026_12", "3026 12"...), ou None."""
+    texto = (texto or "").upper()
+    for tipo in TIPOS_ARQUIVO:
+        if _PADROES_TIPO[tipo].search(texto):
+            return tipo
+    return None
+
+
+def banco_pelo_nome(texto: Optional[str]) -> Optional[str]:
+    texto = (texto or "").upper()
+    for banco, padrao in _PADROES_BANCO.items():
+        if padrao.search(texto):
+            return banco
+    return None
+
+
+def _classe_texto(texto: str) -> Optional[str]:
+    texto = texto.strip()
+    if not texto:
+        return None
+    if _DATA_TEXTO.fullmatch(texto):
+        return CLASSE_DATA
+    if _CODIGO_DEST.fullmatch(texto):
+        return CLASSE_DEST
+    return CLASSE_OUTRO
+
+
+def _classe_valor(valor) -> Optional[str]:
+    """Classe de um valor já convertido (Parquet); None para vazio."""
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+        return None
+    if isinstance(valor, datetime.date):
+        return CLASSE_DATA
+    if isinstance(valor, str):
+        return _classe_texto(valor)
+    return CLASSE_OUTRO
+
+
+def classificar_colunas(amostra: Amostra) -> Optional[str]:
+    """Tipo pelas classes dos valores das colunas W, AA, AB, AD e AK, ou None se ambíguo."""
+
+    def tem(posicao: int, classe: str) -> bool:
+        valores = amostra.get(posicao) or []
+        if not valores:
+            return False
+        return sum(valor == classe for valor in valores) >= IDENTIFICACAO_FRACAO_MINIMA * len(valores)
+
+    datas_w = tem(COLUNA_W, CLASSE_DATA)
+    datas_ab = tem(COLUNA_AB, CLASSE_DATA)
+    if datas_ab and sum(tem(posicao, CLASSE_DATA) for posicao in (COLUNA_W, COLUNA_AD, COLUNA_AK)) >= 2:
+        return TIPO_3026_15
+    if datas_w and not datas_ab:
+        return TIPO_3026_11
+    if not datas_w and not datas_ab and (tem(COLUNA_AA, CLASSE_DEST) or tem(COLUNA_AB, CLASSE_DEST)):
+        return TIPO_3026_12
+    return None
+
+
+def _numero_coluna(letras: str) -> int:
+    numero = 0
+    for letra in letras:
+        numero = numero * 26 + ord(letra) - ord("A") + 1
+    return numero
+
+
+def _texto(elemento) -> str:
+    """Texto de uma string compartilhada ou inline (com ou sem formatação por trechos)."""
+    return "".join(parte.text or "" for parte in elemento.iter(f"{_NS}t"))
+
+
+def _caminho_primeira_aba(arquivo: zipfile.ZipFile) -> Tuple[Optional[str], str]:
+    with arquivo.open("xl/workbook.xml") as origem:
+        folha = ElementTree.parse(origem).find(f"{_NS}sheets/{_NS}sheet")
+    if folha is None:
+        raise ValueError("Planilha sem abas")
+    caminho = "xl/worksheets/sheet1.xml"
+    try:
+        with arquivo.open("xl/_rels/workbook.xml.rels") as origem:
+            for relacao in ElementTree.parse(origem).iter(f"{_NS_PACOTE}Relationship"):
+                if relacao.get("Id") == folha.get(_NS_RELACAO):
+                    alvo = relacao.get("Target", "")
+                    caminho = alvo.lstrip("/") if alvo.startswith("/") else "xl/" + alvo
+    except KeyError:
+        pass
+    return folha.get("name"), caminho
+
+
+def _titulo_documento(arquivo: zipfile.ZipFile) -> Optional[str]:
+    try:
+        with arquivo.open("docProps/core.xml") as origem:
+            titulo = ElementTree.parse(origem).find(_NS_TITULO)
+    except (KeyError, ElementTree.ParseError):
+        return None
+    return titulo.text if titulo is not None else None
+
+
+Celula = Tuple[Optional[str], Optional[str], str]  # (tipo, estilo, valor)
+
+
+def _linhas_iniciais(origem, quantidade: int) -> Tuple[Optional[str], List[Dict[int, Celula]]]:
+    """
+    (dimensão declarada, [{posição: (tipo, estilo, valor)}]) do cabeçalho e das
+    `quantidade` linhas seguintes; das linhas de dados, só as POSICOES_AMOSTRA.
+    """
+    dimensao = None
+    linhas: List[Dict[int, Celula]] = []
+    celulas: Dict[int, Celula] = {}
+    for evento, elemento in ElementTree.iterparse(origem, events=("start", "end")):
+        if evento == "start":
+            if elemento.tag == f"{_NS}dimension":
+                dimensao = elemento.get("ref")
+            continue
+        if elemento.tag == f"{_NS}c":
+            referencia = _REFERENCIA.match(elemento.get("r") or "")
+            posicao = _numero_coluna(referencia.group(1)) - 1 if referencia else len(celulas)
+            if linhas and posicao not in POSICOES_AMOSTRA:
+                continue
+            tipo = elemento.get("t")
+            if tipo == "inlineStr":
+                valor = _texto(elemento)
+            else:
+                valor = elemento.find(f"{_NS}v")
+                valor = valor.text if valor is not None and valor.text else ""
+            celulas[posicao] = (tipo, elemento.get("s"), valor)
+        elif elemento.tag == f"{_NS}row":
+            linhas.append(celulas)
+            celulas = {}
+            elemento.clear()
+            if len(linhas) > quantidade:
+                break
+        elif elemento.tag == f"{_NS}sheetData":
+            break
+    return dimensao, linhas
+
+
+def _estilos_data(arquivo: zipfile.ZipFile) -> set:
+    """Índices dos estilos de célula (atributo s) cujo formato numérico é de data."""
+    try:
+        with arquivo.open("xl/styles.xml") as origem:
+            raiz = ElementTree.parse(origem).getroot()
+    except (KeyError, ElementTree.ParseError):
+        return set()
+    formatos = dict(BUILTIN_FORMATS)
+    for formato in raiz.iter(f"{_NS}numFmt"):
+        formatos[int(formato.get("numFmtId", -1))] = formato.get("formatCode", "")
+    estilos = set()
+    xfs = raiz.find(f"{_NS}cellXfs")
+    for indice, xf in enumerate(xfs if xfs is not None else []):
+        if is_date_format(formatos.get(int(xf.get("numFmtId", 0)), "")):
+            estilos.add(str(indice))
+    return estilos
+
+
+def _classe_celula(celula: Celula, strings: Dict[int, str], estilos_data: set) -> Optional[str]:
+    tipo, estilo, valor = celula
+    if tipo == "s":
+        return _classe_texto(strings.get(int(valor), "")) if valor.isdigit() else None
+    if tipo in ("inlineStr", "str"):
+        return _classe_texto(valor)
+    if not valor:
+        return None
+    if tipo == "d" or (tipo in (None, "n") and estilo in estilos_data):
+        return CLASSE_DATA
+    return CLASSE_OUTRO
+
+
+def _strings_compartilhadas(arquivo: zipfile.ZipFile, indices: set) -> Dict[int, str]:
+    """Só as strings dos índices pedidos; a leitura para no maior deles."""
+    if not indices:
+        return {}
+    strings = {}
+    ultimo = max(indices)
+    try:
+        origem = arquivo.open("xl/sharedStrings.xml")
+    except KeyError:
+        return {}
+    with origem:
+        indice = 0
+        for _, elemento in ElementTree.iterparse(origem, events=("end",)):
+            if elemento.tag != f"{_NS}si":
+                continue
+            if indice in indices:
+                strings[indice] = _texto(elemento)
+            elemento.clear()
+            indice += 1
+            if indice > ultimo:
+                break
+    return strings
+
+
+def _metadados_xlsx(origem, identificacao: Identificacao) -> None:
+    with zipfile.ZipFile(origem) as arquivo:
+        identificacao.aba, caminho = _caminho_primeira_aba(arquivo)
+        identificacao.titulo = _titulo_documento(arquivo)
+        identificacao.bytes_xml = arquivo.getinfo(caminho).file_size
+        with arquivo.open(caminho) as aba:
+            dimensao, linhas = _linhas_iniciais(aba, IDENTIFICACAO_AMOSTRA_LINHAS)
+        indices = {
+            int(valor)
+            for celulas in linhas
+            for tipo, _, valor in celulas.values()
+            if tipo == "s" and valor.isdigit()
+        }
+        strings = _strings_compartilhadas(arquivo, indices)
+        estilos_data = _estilos_data(arquivo) if len(linhas) > 1 else set()
+
+    celulas = linhas[0] if linhas else {}
+    largura = max(celulas) + 1 if celulas else 0
+    cabecalho = [""] * largura
+    for posicao, (tipo, _, valor) in celulas.items():
+        cabecalho[posicao] = strings.get(int(valor), "") if tipo == "s" and valor.isdigit() else valor
+    while cabecalho and not cabecalho[-1].strip():
+        cabecalho.pop()
+    identificacao.cabecalho = cabecalho
+    identificacao.colunas = len(cabecalho)
+    for celulas in linhas[1:]:
+        for posicao, celula in celulas.items():
+            classe = _classe_celula(celula, strings, estilos_data)
+            if classe:
+                identificacao.amostra.setdefault(posicao, []).append(classe)
+
+    # "A1:BQ500001": a última linha declarada menos o cabeçalho
+    if dimensao and ":" in dimensao:
+        fim = _REFERENCIA.match(dimensao.split(":")[1])
+        if fim:
+            identificacao.linhas = max(int(fim.group(2)) - 1, 0)
+            identificacao.colunas = max(identificacao.colunas, _numero_coluna(fim.group(1)))
+
+
+def _sem_metadados(contents: Planilha, filename: Optional[str]) -> Identificacao:
+    tamanho = len(contents) if isinstance(contents, (bytes, bytearray)) else os.path.getsize(contents)
+    return Identificacao(formato=leitura_colunar.detectar_formato(contents, filename), bytes_arquivo=tamanho)
+
+
+def _amostra_parquet(origem) -> Amostra:
+    import pyarrow.parquet as pq
+
+    arquivo = pq.ParquetFile(origem)
+    nomes = arquivo.schema_arrow.names
+    posicoes = {nomes[posicao]: posicao for posicao in POSICOES_AMOSTRA if posicao < len(nomes)}
+    lote = next(arquivo.iter_batches(batch_size=IDENTIFICACAO_AMOSTRA_LINHAS, columns=list(posicoes)), None)
+    amostra: Amostra = {}
+    if lote is None:
+        return amostra
+    for nome in lote.schema.names:
+        classes = [_classe_valor(valor) for valor in lote.column(nome).to_pylist()]
+        amostra[posicoes[nome]] = [classe for classe in classes if classe]
+    return amostra
+
+
+def _amostra_csv(contents: Planilha) -> Amostra:
+    amostra: Amostra = {}
+    for linha in leitura_colunar.amostra_csv(contents, IDENTIFICACAO_AMOSTRA_LINHAS):
+        for posicao in POSICOES_AMOSTRA:
+            classe = _classe_texto(linha[posicao]) if posicao < len(linha) else None
+            if classe:
+                amostra.setdefault(posicao, []).append(classe)
+    return amostra
+
+
+def ler_metadados(contents: Planilha, filename: Optional[str] = None) -> Identificacao:
+    """Formato, dimensões, cabeçalho e amostra das colunas do arquivo, sem classificar."""
+    origem = io.BytesIO(contents) if isinstance(contents, (bytes, bytearray)) else contents
+    identificacao = _sem_metadados(contents, filename)
+
+    if identificacao.formato == leitura_colunar.FORMATO_XLSX:
+        _metadados_xlsx(origem, identificacao)
+    elif identificacao.formato == leitura_colunar.FORMATO_PARQUET:
+        import pyarrow.parquet as pq
+
+        metadata = pq.read_metadata(origem)
+        identificacao.cabecalho = [str(nome) for nome in metadata.schema.to_arrow_schema().names]
+        identificacao.linhas = metadata.num_rows
+        identificacao.colunas = metadata.num_columns
+        if isinstance(origem, io.BytesIO):
+            origem.seek(0)
+        identificacao.amostra = _amostra_parquet(origem)
+    else:
+        cabecalho = leitura_colunar.cabecalho_csv(contents)
+        identificacao.cabecalho = [str(coluna) for coluna in cabecalho]
+        identificacao.colunas = len(cabecalho)
+        identificacao.amostra = _amostra_csv(contents)
+    return identificacao
+
+
+def identificar(contents: Planilha, filename: Optional[str] = None) -> Identificacao:
+    """
+    Metadados e classificação (tipo e banco) do arquivo: o tipo pelas colunas, pela
+    aba ou título e pelo nome do arquivo, nessa ordem. Se nada decidir (ou os
+    metadados não puderem ser lidos), o tipo fica None: sequência genérica.
+    """
+    try:
+        identificacao = ler_metadados(contents, filename)
+    except Exception:
+        identificacao = _sem_metadados(contents, filename)
+
+    textos = [identificacao.aba, identificacao.titulo]
+    # Fora de um cabeçalho 3026, as posições W, AA, AB... não são as das extrações
+    tipo_colunas = classificar_colunas(identificacao.amostra) if identificacao.extracao_3026 else None
+    for valor, origem in (
+        (tipo_colunas, ORIGEM_COLUNAS),
+        (next(filter(None, map(tipo_pelo_nome, textos)), None), ORIGEM_TEXTO),
+        (tipo_pelo_nome(filename), ORIGEM_NOME),
+    ):
+        if valor:
+            identificacao.tipo, identificacao.origem_tipo = valor, origem
+            break
+    for valor, origem in (
+        (next(filter(None, map(banco_pelo_nome, textos)), None), ORIGEM_TEXTO),
+        (banco_pelo_nome(filename), ORIGEM_NOME),
+    ):
+        if valor:
+            identificacao.banco, identificacao.origem_banco = valor, origem
+            break
+    return identificacao
+
+
+def banco_do_arquivo(identificacao: Identificacao, banco: Optional[str], nome: Optional[str]) -> str:
+    """
+    O banco escolhido, se a aba ou o título do arquivo não citarem outro; sem
+    escolha, o identificado (aba, título ou nome do arquivo). Senão BancoNaoConfere.
+    """
+    if banco:
+        if identificacao.origem_banco == ORIGEM_TEXTO and identificacao.banco != banco:
+            raise BancoNaoConfere(
+                f"{nome or 'O arquivo'} é do banco {identificacao.banco} pela aba ou título, não {banco}"
+            )
+        return banco
+    if identificacao.banco is None:
+        raise BancoNaoConfere(f"Não foi possível identificar o banco de {nome or 'o arquivo'}: informe o banco")
+    return identificacao.banco
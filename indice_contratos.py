@@ -0,0 +1,144 @@
+"""
+Índice persistente dos contratos já processados, para achar repetidos entre
+extrações de meses diferentes sem reenviar os arquivos antigos.
+
+Cada upload processado grava, por contrato, (banco, tipo do arquivo, data da
+extração, status de auditoria) em um banco SQLite. A consulta dos contratos do
+upload atual usa a chave primária (que começa pelo contrato), sem varrer o histórico.
+O SQLite roda em modo WAL, então vários workers do gunicorn podem ler e gravar.
+
+Reenviar uma extração (mesmo banco, tipo e data) substitui o que ela tinha gravado,
+então contratos que saíram da planilha saem também do índice.
+"""
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+INDICE_CONTRATOS_DB = os.environ.get("INDICE_CONTRATOS_DB", "indice_contratos.sqlite3")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ocorrencias (
+    contrato TEXT NOT NULL,
+    banco TEXT NOT NULL,
+    tipo_arquivo TEXT NOT NULL,
+    data_extracao TEXT NOT NULL,
+    auditoria TEXT NOT NULL,
+    PRIMARY KEY (contrato, banco, tipo_arquivo, data_extracao)
+) WITHOUT ROWID
+"""
+
+# Usado para apagar uma extração inteira antes de gravá-la de novo
+_INDICE_EXTRACAO = """
+CREATE INDEX IF NOT EXISTS ocorrencias_extracao ON ocorrencias (banco, tipo_arquivo, data_extracao)
+"""
+
+_CONSULTA_HISTORICO = """
+SELECT
+    o.contrato,
+    COUNT(*),
+    MIN(o.data_extracao),
+    MAX(o.data_extracao),
+    GROUP_CONCAT(DISTINCT o.banco),
+    GROUP_CONCAT(DISTINCT o.tipo_arquivo),
+    (
+        SELECT u.auditoria FROM ocorrencias u
+        WHERE u.contrato = o.contrato AND u.data_extracao < :data
+        ORDER BY u.data_extracao DESC LIMIT 1
+    )
+FROM atuais a
+JOIN ocorrencias o ON o.contrato = a.contrato
+WHERE o.data_extracao < :data
+GROUP BY o.contrato
+ORDER BY o.contrato
+"""
+
+COLUNAS_HISTORICO = [
+    "CONTRATO",
+    "OCORRENCIAS_ANTERIORES",
+    "PRIMEIRA_EXTRACAO",
+    "ULTIMA_EXTRACAO",
+    "BANCOS",
+    "TIPOS_ARQUIVO",
+    "ULTIMA_AUDITORIA",
+]
+
+
+def _conectar() -> sqlite3.Connection:
+    pasta = os.path.dirname(INDICE_CONTRATOS_DB)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    conexao = sqlite3.connect(INDICE_CONTRATOS_DB, timeout=30)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    conexao.execute(_ESQUEMA)
+    conexao.execute(_INDICE_EXTRACAO)
+    return conexao
+
+
+def _texto_contrato(valor) -> str:
+    # 123.0 (lido como float pelo Excel) e "123" são o mesmo contrato
+    if isinstance(valor, (float, np.floating)) and float(valor).is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def texto_contratos(contratos: pd.Series) -> np.ndarray:
+    """Contratos como texto ("" onde vazio). Cada valor distinto é convertido uma única vez."""
+    codigos, unicos = pd.factorize(contratos)
+    textos = np.array([_texto_contrato(valor) for valor in unicos] + [""], dtype=object)
+    return textos[codigos]
+
+
+def ocorrencias_planilha(contratos: pd.Series, auditoria: np.ndarray) -> pd.DataFrame:
+    """
+    Contratos distintos da planilha (como texto) com o status de auditoria da
+    última linha de cada um.
+    """
+    df = pd.DataFrame({"contrato": texto_contratos(contratos), "auditoria": auditoria})
+    df = df[df["contrato"] != ""]
+    return df.drop_duplicates("contrato", keep="last")
+
+
+def consultar_e_registrar(
+    ocorrencias: list,
+    banco: str,
+    data_extracao: str,
+) -> pd.DataFrame:
+    """
+    Busca no índice os contratos das planilhas atuais que já apareceram em extrações
+    anteriores a `data_extracao` e depois grava as planilhas atuais no índice, no
+    lugar do que já houver de cada (banco, tipo, `data_extracao`).
+
+    `ocorrencias` é uma lista de (tipo do arquivo, DataFrame de ocorrencias_planilha);
+    arquivos sem tipo identificado (tipo None) são gravados com o tipo vazio.
+    Retorna um DataFrame com COLUNAS_HISTORICO (vazio se não houver repetidos).
+    """
+    ocorrencias = [(tipo or "", df) for tipo, df in ocorrencias]
+    with closing(_conectar()) as conexao, conexao:
+        conexao.execute("CREATE TEMP TABLE IF NOT EXISTS atuais (contrato TEXT PRIMARY KEY)")
+        conexao.execute("DELETE FROM atuais")
+        for _, df in ocorrencias:
+            conexao.executemany(
+                "INSERT OR IGNORE INTO atuais VALUES (?)",
+                ((contrato,) for contrato in df["contrato"]),
+            )
+        linhas = conexao.execute(_CONSULTA_HISTORICO, {"data": data_extracao}).fetchall()
+
+        for tipo in {tipo for tipo, _ in ocorrencias}:
+            conexao.execute(
+                "DELETE FROM ocorrencias WHERE banco = ? AND tipo_arquivo = ? AND data_extracao = ?",
+                (banco, tipo, data_extracao),
+            )
+        for tipo, df in ocorrencias:
+            conexao.executemany(
+                "INSERT OR REPLACE INTO ocorrencias VALUES (?, ?, ?, ?, ?)",
+                (
+                    (contrato, banco, tipo, data_extracao, auditoria)
+                    for contrato, auditoria in zip(df["contrato"], df["auditoria"])
+                ),
+            )
+    return pd.DataFrame(linhas, columns=COLUNAS_HISTORICO)
+
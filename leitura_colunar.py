@@ -0,0 +1,227 @@
+"""
+Leitura das extrações 3026 exportadas em CSV ou Parquet, sem passar pelo XLSX.
+
+O formato é detectado pelos primeiros bytes do conteúdo (o XLSX é um zip, o
+Parquet começa com "PAR1") e, quando eles não bastam, pela extensão do nome.
+O CSV é lido pelo leitor multi-thread do pyarrow (separador ";", vírgula
+decimal e ponto de milhar, como exporta o sistema de origem) e o Parquet pelo
+pyarrow.parquet.
+
+As colunas ficam na ordem do arquivo, com os mesmos nomes que o pd.read_excel
+daria ao cabeçalho, então os filtros por posição (W, Y, AB, S...) continuam
+valendo. Vazios viram NaN e datas dd/mm/aaaa já saem como datetime64.
+"""
+import csv
+import io
+import itertools
+import os
+import re
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+FORMATO_XLSX = "xlsx"
+FORMATO_CSV = "csv"
+FORMATO_PARQUET = "parquet"
+
+CSV_SEPARADOR = os.environ.get("CSV_SEPARADOR", ";")
+CSV_DECIMAL = os.environ.get("CSV_DECIMAL", ",")
+# Separador de milhar dos números ("1.234,56"); vazio desliga
+CSV_MILHAR = os.environ.get("CSV_MILHAR", ".")
+# Usada quando o arquivo não é UTF-8 válido (exportações do Windows)
+CSV_ENCODING_ALTERNATIVO = os.environ.get("CSV_ENCODING_ALTERNATIVO", "cp1252")
+CSV_FORMATOS_DATA = ["%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S"]
+
+_EXTENSOES = {
+    ".csv": FORMATO_CSV,
+    ".txt": FORMATO_CSV,
+    ".parquet": FORMATO_PARQUET,
+    ".pq": FORMATO_PARQUET,
+    ".xlsx": FORMATO_XLSX,
+    ".xlsm": FORMATO_XLSX,
+}
+
+_BYTES_DETECCAO = 4096
+_ERRO_COLUNA = re.compile(r"In CSV column #(\d+)")
+
+Planilha = Union[bytes, str]
+
+
+def _inicio(contents: Planilha, tamanho: int) -> bytes:
+    if isinstance(contents, (bytes, bytearray)):
+        return bytes(contents[:tamanho])
+    with open(contents, "rb") as arquivo:
+        return arquivo.read(tamanho)
+
+
+def detectar_formato(contents: Planilha, filename: Optional[str] = None) -> str:
+    """FORMATO_XLSX, FORMATO_CSV ou FORMATO_PARQUET."""
+    inicio = _inicio(contents, _BYTES_DETECCAO)
+    if inicio.startswith(b"PK\x03\x04"):
+        return FORMATO_XLSX
+    if inicio.startswith(b"PAR1"):
+        return FORMATO_PARQUET
+
+    extensao = os.path.splitext(filename or "")[1].lower()
+    if extensao in _EXTENSOES:
+        return _EXTENSOES[extensao]
+    # Sem extensão conhecida: texto sem bytes nulos é tratado como CSV. O resto segue
+    # para o openpyxl, que dá o erro de arquivo inválido de sempre
+    return FORMATO_CSV if inicio and b"\x00" not in inicio else FORMATO_XLSX
+
+
+def _origem(contents: Planilha):
+    import pyarrow as pa
+
+    if isinstance(contents, (bytes, bytearray)):
+        return pa.BufferReader(contents)
+    return contents
+
+
+def _objetos_com_nan(df: pd.DataFrame) -> pd.DataFrame:
+    # O Arrow devolve None onde o pd.read_excel teria NaN
+    for posicao in range(df.shape[1]):
+        if df.dtypes.iloc[posicao] == object:
+            df.isetitem(posicao, df.iloc[:, posicao].fillna(np.nan))
+    return df
+
+
+def cabecalho_csv(contents: Planilha, encoding: Optional[str] = None) -> list:
+    """
+    Nomes das colunas como o pd.read_excel daria (duplicadas e vazias tratadas).
+    Sem `encoding`, a primeira linha é lida como UTF-8 e, se não for válida, como
+    CSV_ENCODING_ALTERNATIVO.
+    """
+    bloco = _inicio(contents, 1024 * 1024)
+    if encoding is None:
+        try:
+            bloco.split(b"\n", 1)[0].decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            encoding = CSV_ENCODING_ALTERNATIVO
+    texto = bloco.decode(encoding, errors="replace").lstrip("\ufeff")
+    header = next(csv.reader(io.StringIO(texto), delimiter=CSV_SEPARADOR), [])
+    if not header:
+        return []
+    return list(TextParser([header], header=0).read().columns)
+
+
+def amostra_csv(contents: Planilha, linhas: int) -> list:
+    """Primeiras `linhas` linhas de dados, como texto, lidas só do início do arquivo."""
+    bloco = _inicio(contents, 1024 * 1024)
+    if len(bloco) == 1024 * 1024:
+        # Descarta a linha cortada no fim do bloco
+        bloco = bloco[: bloco.rfind(b"\n") + 1]
+    texto = bloco.decode("utf-8", errors="replace").lstrip("\ufeff")
+    leitor = csv.reader(io.StringIO(texto), delimiter=CSV_SEPARADOR)
+    next(leitor, None)
+    return list(itertools.islice(leitor, linhas))
+
+
+def _erro_utf8(exc: Exception) -> bool:
+    return "utf8" in str(exc).lower()
+
+
+def _ler_tabela_csv(contents: Planilha, encoding: str, total_colunas: int):
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    nomes = [f"c{posicao}" for posicao in range(total_colunas)]
+    tipos = {}
+    while True:
+        try:
+            return pa_csv.read_csv(
+                _origem(contents),
+                read_options=pa_csv.ReadOptions(
+                    use_threads=True, column_names=nomes, skip_rows=1, encoding=encoding
+                ),
+                parse_options=pa_csv.ParseOptions(delimiter=CSV_SEPARADOR),
+                convert_options=pa_csv.ConvertOptions(
+                    decimal_point=CSV_DECIMAL,
+                    null_values=[""],
+                    strings_can_be_null=True,
+                    timestamp_parsers=[pa_csv.ISO8601] + CSV_FORMATOS_DATA,
+                    column_types=tipos,
+                ),
+            )
+        except pa.ArrowInvalid as exc:
+            # O tipo de cada coluna é inferido no primeiro bloco; se um bloco seguinte
+            # não converter (ex.: número e depois texto), a coluna é relida como texto
+            erro = _ERRO_COLUNA.search(str(exc))
+            if erro is None or _erro_utf8(exc) or nomes[int(erro.group(1))] in tipos:
+                raise
+            tipos[nomes[int(erro.group(1))]] = pa.string()
+
+
+def _numeros_com_milhar(tabela):
+    """
+    O leitor do pyarrow não conhece separador de milhar: colunas com "1.234,56"
+    ficam como texto. Colunas de texto em que todo valor preenchido é um número
+    nesse formato (e algum tem o separador) viram float64, ou int64 sem decimais.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not CSV_MILHAR or CSV_MILHAR == CSV_DECIMAL:
+        return tabela
+    milhar, decimal = re.escape(CSV_MILHAR), re.escape(CSV_DECIMAL)
+    numero = rf"^-?(\d{{1,3}}({milhar}\d{{3}})+|\d+)({decimal}\d+)?$"
+    for posicao, coluna in enumerate(tabela.columns):
+        if not pa.types.is_string(coluna.type) or coluna.null_count == len(coluna):
+            continue
+        texto = pc.utf8_trim_whitespace(coluna)
+        if not pc.all(pc.match_substring_regex(texto, numero)).as_py():
+            continue
+        if not pc.any(pc.match_substring(texto, CSV_MILHAR)).as_py():
+            continue
+        sem_milhar = pc.replace_substring(texto, CSV_MILHAR, "")
+        tipo = pa.float64() if pc.any(pc.match_substring(texto, CSV_DECIMAL)).as_py() else pa.int64()
+        valores = pc.cast(pc.replace_substring(sem_milhar, CSV_DECIMAL, "."), tipo)
+        tabela = tabela.set_column(posicao, tabela.field(posicao).with_type(tipo), valores)
+    return tabela
+
+
+def _para_pandas(tabela, arrow: bool) -> pd.DataFrame:
+    if arrow:
+        return tabela.to_pandas(types_mapper=pd.ArrowDtype)
+    return _objetos_com_nan(tabela.to_pandas(coerce_temporal_nanoseconds=True))
+
+
+def ler_csv(contents: Planilha, arrow: bool = False) -> pd.DataFrame:
+    import pyarrow as pa
+
+    encoding = "utf8"
+    rotulos = cabecalho_csv(contents, "utf-8")
+    if not rotulos:
+        return pd.DataFrame()
+    try:
+        tabela = _ler_tabela_csv(contents, encoding, len(rotulos))
+    except pa.ArrowInvalid as exc:
+        if not _erro_utf8(exc):
+            raise
+        encoding = CSV_ENCODING_ALTERNATIVO
+        rotulos = cabecalho_csv(contents, encoding)
+        tabela = _ler_tabela_csv(contents, encoding, len(rotulos))
+
+    df = _para_pandas(_numeros_com_milhar(tabela), arrow)
+    df.columns = rotulos
+    return df
+
+
+def ler_parquet(contents: Planilha, arrow: bool = False) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+
+    tabela = pq.read_table(_origem(contents), use_threads=True)
+    return _para_pandas(tabela, arrow).reset_index(drop=True)
+
+
+def ler_planilha_colunar(contents: Planilha, formato: str, arrow: bool = False) -> pd.DataFrame:
+    """
+    Lê o CSV ou Parquet completo (requer pyarrow). Com arrow=True as colunas ficam
+    em pd.ArrowDtype, sem conversão, para o motor Arrow dos filtros (motor_arrow.py).
+    """
+    if formato == FORMATO_PARQUET:
+        return ler_parquet(contents, arrow)
+    return ler_csv(contents, arrow)
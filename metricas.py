@@ -0,0 +1,315 @@
+"""
+Instrumentação do processamento: tempo, memória, linhas e bytes de cada etapa
+(leitura, filtros, resumos, escrita) por arquivo.
+
+As etapas são registradas no coletor da requisição (contextvar). Os arquivos são
+processados no pool de processos, onde o coletor da requisição não existe:
+executar_medindo roda a função com um coletor próprio e devolve os registros junto
+com o resultado, e o processo principal os junta ao coletor da requisição.
+
+Os registros de cada requisição alimentam os totais expostos no formato do
+Prometheus (/metrics). Os totais são do processo: com vários workers do gunicorn,
+cada worker expõe os seus.
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import progresso
+
+# Com tracemalloc ligado, cada etapa registra também o pico de memória alocada pelo
+# Python (mais preciso, porém deixa o processamento ~2x mais lento). Sempre registra o
+# pico da memória residente (RSS) do processo durante a etapa, onde o sistema permite
+# zerá-lo (Linux: /proc/self/clear_refs), e o RSS ao final da etapa.
+METRICAS_TRACEMALLOC = os.environ.get("METRICAS_TRACEMALLOC", "false").lower() == "true"
+
+BUCKETS_SEGUNDOS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf)
+
+
+@dataclass
+class RegistroEtapa:
+    etapa: str
+    arquivo: Optional[str] = None
+    segundos: float = 0.0
+    pico_memoria_bytes: Optional[int] = None
+    pico_rss_bytes: Optional[int] = None
+    rss_final_bytes: Optional[int] = None
+    linhas_entrada: Optional[int] = None
+    linhas_saida: Optional[int] = None
+    bytes_entrada: Optional[int] = None
+    bytes_saida: Optional[int] = None
+
+    def como_dict(self) -> dict:
+        return {chave: valor for chave, valor in asdict(self).items() if valor is not None}
+
+
+class Coletor:
+    def __init__(self, arquivo: Optional[str] = None):
+        self.arquivo = arquivo
+        self.registros: List[RegistroEtapa] = []
+        # Picos parciais das etapas abertas (etapas aninhadas zeram o pico do tracemalloc)
+        self._picos_abertos: List[int] = []
+
+
+_coletor_atual: contextvars.ContextVar = contextvars.ContextVar("coletor_metricas", default=None)
+
+
+def _rss_atual() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _pico_rss() -> Optional[int]:
+    # VmHWM: maior RSS do processo desde o início ou desde o último _zerar_pico_rss
+    try:
+        with open("/proc/self/status") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _zerar_pico_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as arquivo:
+            arquivo.write("5")
+        return True
+    except OSError:
+        return False
+
+
+# Picos parciais de RSS das etapas abertas no processo. O pico é do processo inteiro:
+# antes de zerá-lo para uma etapa, o valor atual vai para as etapas já abertas
+# (aninhadas ou de outras requisições rodando ao mesmo tempo)
+_picos_rss_abertos: List[list] = []
+_lock_rss = threading.Lock()
+
+
+def _abrir_pico_rss() -> Optional[list]:
+    with _lock_rss:
+        pico = _pico_rss()
+        if pico is None:
+            return None
+        for parcial in _picos_rss_abertos:
+            parcial[0] = max(parcial[0], pico)
+        if not _zerar_pico_rss():
+            return None
+        parcial = [_rss_atual() or 0]
+        _picos_rss_abertos.append(parcial)
+        return parcial
+
+
+def _fechar_pico_rss(parcial: list) -> Optional[int]:
+    with _lock_rss:
+        # Por identidade: listas de etapas diferentes podem ter o mesmo valor
+        for posicao, aberto in enumerate(_picos_rss_abertos):
+            if aberto is parcial:
+                del _picos_rss_abertos[posicao]
+                break
+        return max(parcial[0], _pico_rss() or 0)
+
+
+@contextmanager
+def coletar(arquivo: Optional[str] = None) -> Iterator[Coletor]:
+    """Ativa um coletor para as etapas executadas dentro do bloco."""
+    if METRICAS_TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    coletor = Coletor(arquivo)
+    token = _coletor_atual.set(coletor)
+    try:
+        yield coletor
+    finally:
+        _coletor_atual.reset(token)
+
+
+def adicionar(registros: List[RegistroEtapa]) -> None:
+    """Junta registros vindos de outro processo ao coletor ativo."""
+    coletor = _coletor_atual.get()
+    if coletor is not None:
+        coletor.registros.extend(registros)
+
+
+@contextmanager
+def etapa(nome: str, **campos) -> Iterator[RegistroEtapa]:
+    """
+    Mede a etapa executada no bloco. Os campos de linhas/bytes podem ser passados
+    aqui ou preenchidos no registro devolvido. Sem coletor ativo, nada é guardado.
+    O início e o fim da etapa também são publicados como eventos de progresso.
+    """
+    coletor = _coletor_atual.get()
+    registro = RegistroEtapa(etapa=nome, arquivo=coletor.arquivo if coletor else None, **campos)
+    medir_memoria = coletor is not None and tracemalloc.is_tracing()
+    if medir_memoria:
+        if coletor._picos_abertos:
+            coletor._picos_abertos[-1] = max(coletor._picos_abertos[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        coletor._picos_abertos.append(0)
+
+    parcial_rss = _abrir_pico_rss() if coletor is not None else None
+
+    progresso.emitir(progresso.EVENTO_ETAPA_INICIADA, etapa=nome, linhas_entrada=registro.linhas_entrada)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro.segundos = time.perf_counter() - inicio
+        registro.rss_final_bytes = _rss_atual()
+        if parcial_rss is not None:
+            registro.pico_rss_bytes = _fechar_pico_rss(parcial_rss)
+        if medir_memoria:
+            pico = max(coletor._picos_abertos.pop(), tracemalloc.get_traced_memory()[1])
+            registro.pico_memoria_bytes = pico
+            if coletor._picos_abertos:
+                coletor._picos_abertos[-1] = max(coletor._picos_abertos[-1], pico)
+        if coletor is not None:
+            coletor.registros.append(registro)
+        progresso.emitir(
+            progresso.EVENTO_ETAPA_CONCLUIDA,
+            etapa=nome,
+            segundos=round(registro.segundos, 3),
+            linhas_entrada=registro.linhas_entrada,
+            linhas_saida=registro.linhas_saida,
+        )
+
+
+def medir_filtro(nome: str, funcao, df, *args, **kwargs):
+    """Executa o filtro `funcao(df, ...)` registrando a etapa e as linhas de entrada e saída."""
+    with etapa(nome, linhas_entrada=len(df)) as registro:
+        resultado = funcao(df, *args, **kwargs)
+        registro.linhas_saida = len(resultado)
+    return resultado
+
+
+def executar_medindo(arquivo: str, funcao, *args, **kwargs) -> Tuple[object, List[RegistroEtapa]]:
+    """
+    Executa `funcao` (no pool de processos) com um coletor próprio e devolve
+    (resultado, registros das etapas).
+    """
+    with coletar(arquivo) as coletor:
+        resultado = funcao(*args, **kwargs)
+    return resultado, coletor.registros
+
+
+def cabecalho_timings(registros: List[RegistroEtapa]) -> str:
+    """Valor do cabeçalho X-Processing-Timings (no estilo do Server-Timing)."""
+    partes = []
+    for registro in registros:
+        campos = [registro.etapa]
+        if registro.arquivo:
+            campos.append(f"arquivo={quote(registro.arquivo)}")
+        campos.append(f"dur={registro.segundos * 1000:.1f}")
+        memoria = next(
+            (
+                valor
+                for valor in (registro.pico_memoria_bytes, registro.pico_rss_bytes, registro.rss_final_bytes)
+                if valor is not None
+            ),
+            None,
+        )
+        if memoria is not None:
+            campos.append(f"mem={memoria}")
+        for nome, valor in (
+            ("in", registro.linhas_entrada),
+            ("out", registro.linhas_saida),
+            ("bytes_in", registro.bytes_entrada),
+            ("bytes_out", registro.bytes_saida),
+        ):
+            if valor is not None:
+                campos.append(f"{nome}={valor}")
+        partes.append(";".join(campos))
+    return ", ".join(partes)
+
+
+_lock = threading.Lock()
+_histogramas: Dict[str, list] = {}  # etapa -> [contagens por bucket, soma, total]
+_contadores: Dict[Tuple[str, str], float] = {}  # (métrica, etapa) -> valor
+_gauges: Dict[Tuple[str, str], float] = {}
+# Métricas do servidor, sem etapa (ex.: fila do controle de admissão)
+_contadores_servidor: Dict[str, float] = {}
+_gauges_servidor: Dict[str, float] = {}
+
+
+def incrementar_contador(metrica: str, valor: float = 1) -> None:
+    with _lock:
+        _contadores_servidor[metrica] = _contadores_servidor.get(metrica, 0) + valor
+
+
+def definir_gauge(metrica: str, valor: float) -> None:
+    with _lock:
+        _gauges_servidor[metrica] = valor
+
+
+def registrar(registros: List[RegistroEtapa]) -> None:
+    """Soma os registros de uma requisição aos totais expostos em /metrics."""
+    with _lock:
+        for registro in registros:
+            histograma = _histogramas.setdefault(registro.etapa, [[0] * len(BUCKETS_SEGUNDOS), 0.0, 0])
+            for posicao, limite in enumerate(BUCKETS_SEGUNDOS):
+                if registro.segundos <= limite:
+                    histograma[0][posicao] += 1
+            histograma[1] += registro.segundos
+            histograma[2] += 1
+
+            for metrica, valor in (
+                ("processamento_linhas_entrada_total", registro.linhas_entrada),
+                ("processamento_linhas_saida_total", registro.linhas_saida),
+                ("processamento_bytes_entrada_total", registro.bytes_entrada),
+                ("processamento_bytes_saida_total", registro.bytes_saida),
+            ):
+                if valor is not None:
+                    chave = (metrica, registro.etapa)
+                    _contadores[chave] = _contadores.get(chave, 0) + valor
+
+            for metrica, valor in (
+                ("processamento_etapa_pico_memoria_bytes", registro.pico_memoria_bytes),
+                ("processamento_etapa_pico_rss_bytes", registro.pico_rss_bytes),
+                ("processamento_etapa_rss_final_bytes", registro.rss_final_bytes),
+            ):
+                if valor is not None:
+                    _gauges[(metrica, registro.etapa)] = valor
+
+
+def _formatar_limite(limite: float) -> str:
+    return "+Inf" if math.isinf(limite) else repr(float(limite))
+
+
+def exportar_prometheus() -> str:
+    """Totais no formato de texto do Prometheus."""
+    linhas = [
+        "# HELP processamento_etapa_segundos Duração de cada etapa do processamento por arquivo.",
+        "# TYPE processamento_etapa_segundos histogram",
+    ]
+    with _lock:
+        for nome_etapa, (contagens, soma, total) in sorted(_histogramas.items()):
+            for limite, contagem in zip(BUCKETS_SEGUNDOS, contagens):
+                linhas.append(
+                    f'processamento_etapa_segundos_bucket{{etapa="{nome_etapa}",le="{_formatar_limite(limite)}"}} {contagem}'
+                )
+            linhas.append(f'processamento_etapa_segundos_sum{{etapa="{nome_etapa}"}} {soma}')
+            linhas.append(f'processamento_etapa_segundos_count{{etapa="{nome_etapa}"}} {total}')
+
+        for tipo, valores in (("counter", _contadores), ("gauge", _gauges)):
+            metricas = sorted({metrica for metrica, _ in valores})
+            for metrica in metricas:
+                linhas.append(f"# TYPE {metrica} {tipo}")
+                for (nome, nome_etapa), valor in sorted(valores.items()):
+                    if nome == metrica:
+                        linhas.append(f'{metrica}{{etapa="{nome_etapa}"}} {valor}')
+
+        for tipo, valores in (("counter", _contadores_servidor), ("gauge", _gauges_servidor)):
+            for metrica, valor in sorted(valores.items()):
+                linhas.append(f"# TYPE {metrica} {tipo}")
+                linhas.append(f"{metrica} {valor}")
+    return "\n".join(linhas) + "\n"
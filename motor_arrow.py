@@ -0,0 +1,144 @@
+"""
+Motor Arrow da sequência de filtros (MOTOR_FILTROS=arrow).
+
+Os filtros de processar_contratos.py são os mesmos nos dois motores: cada um só
+contribui uma máscara ao PlanoFiltros e as linhas que sobram são copiadas no
+final. O que muda é a representação das colunas de texto enquanto os filtros rodam:
+
+- no motor pandas são object (um objeto Python por célula, trabalho sob o GIL);
+- no motor Arrow ficam em pd.ArrowDtype. A classificação por valor (auditado,
+  DEST) e a conversão de datas codificam cada fatia de linhas em dicionário com
+  o pyarrow.compute, que libera o GIL, então as fatias rodam em paralelo. O
+  recorte final (take) também é feito pelo Arrow, e só as linhas que sobraram
+  voltam a ser objetos Python (para_numpy).
+
+Colunas numéricas e de data continuam em numpy. Colunas object com tipos
+misturados (número e texto) ficam como estão e seguem pelo caminho do pandas.
+Arquivos CSV/Parquet já chegam em Arrow (leitura_colunar.py); no XLSX, a
+conversão das colunas de texto tem custo próprio.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+MOTOR_ARROW_THREADS = int(os.environ.get("MOTOR_ARROW_THREADS", str(os.cpu_count() or 1)))
+FATIA_MINIMA_LINHAS = 65536  # Abaixo disso, dividir em fatias custa mais do que rende
+
+
+def _coluna_arrow(serie: pd.Series):
+    import pyarrow as pa
+
+    return pa.chunked_array(serie.array.__arrow_array__())
+
+
+def _fatias(coluna) -> list:
+    """Divide a coluna em fatias contíguas (sem cópia), uma por thread."""
+    total = len(coluna)
+    partes = max(1, min(MOTOR_ARROW_THREADS, total // FATIA_MINIMA_LINHAS))
+    tamanho = -(-total // partes) if total else 0
+    coluna = coluna.combine_chunks() if coluna.num_chunks != 1 else coluna.chunk(0)
+    return [coluna.slice(inicio, tamanho) for inicio in range(0, total, tamanho)] or [coluna]
+
+
+def _mapear_fatias(coluna, funcao: Callable) -> List[np.ndarray]:
+    fatias = _fatias(coluna)
+    if len(fatias) == 1:
+        return [funcao(fatias[0])]
+    with ThreadPoolExecutor(max_workers=len(fatias)) as executor:
+        return list(executor.map(funcao, fatias))
+
+
+def _codificar(fatia):
+    """(códigos com -1 nos vazios, valores distintos) da fatia."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_null(fatia.type):
+        return np.full(len(fatia), -1, dtype=np.int64), pd.Series([], dtype=object)
+    codificada = pc.dictionary_encode(fatia)
+    codigos = codificada.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+    return codigos, codificada.dictionary.to_pandas()
+
+
+def por_valor(serie: pd.Series, funcao: Callable[[pd.Series], np.ndarray]) -> np.ndarray:
+    """
+    Equivalente Arrow do _aplicar_por_valor: `funcao` roda nos valores distintos de
+    cada fatia, como texto ("nan" nos vazios), e o resultado chega às linhas pelos códigos.
+    """
+    def _fatia(fatia) -> np.ndarray:
+        codigos, unicos = _codificar(fatia)
+        textos = pd.Series(list(unicos.astype(str)) + ["nan"], dtype=object)
+        return np.asarray(funcao(textos))[codigos]
+
+    return np.concatenate(_mapear_fatias(_coluna_arrow(serie), _fatia))
+
+
+def datas(serie: pd.Series, converter_unicos: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    Equivalente Arrow do _converter_datas: colunas de data/timestamp são convertidas
+    direto; as demais passam os valores distintos de cada fatia por `converter_unicos`.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    def _fatia(fatia) -> np.ndarray:
+        if pa.types.is_timestamp(fatia.type) or pa.types.is_date(fatia.type):
+            return pc.cast(fatia, pa.timestamp("ns")).to_numpy(zero_copy_only=False)
+        codigos, unicos = _codificar(fatia)
+        convertidos = converter_unicos(pd.Series(np.asarray(unicos, dtype=object)))
+        return np.append(convertidos.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))[codigos]
+
+    valores = np.concatenate(_mapear_fatias(_coluna_arrow(serie), _fatia))
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+
+def para_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    """Passa as colunas object só com texto para pd.ArrowDtype; as demais ficam como estão."""
+    import pyarrow as pa
+
+    colunas = {}
+    for posicao in range(df.shape[1]):
+        serie = df.iloc[:, posicao]
+        if serie.dtype == object:
+            try:
+                array = pa.array(serie, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                array = None
+            if array is not None and (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+                serie = pd.Series(pd.arrays.ArrowExtensionArray(array), index=df.index)
+        colunas[posicao] = serie
+    return _montar(df, colunas)
+
+
+def para_numpy(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Volta as colunas pd.ArrowDtype para os tipos do pandas (vazios de texto como NaN).
+    As colunas são convertidas juntas, em paralelo pelo Arrow.
+    """
+    import pyarrow as pa
+
+    posicoes = [posicao for posicao in range(df.shape[1]) if isinstance(df.dtypes.iloc[posicao], pd.ArrowDtype)]
+    colunas = {posicao: df.iloc[:, posicao] for posicao in range(df.shape[1])}
+    if posicoes:
+        tabela = pa.Table.from_arrays(
+            [_coluna_arrow(colunas[posicao]) for posicao in posicoes],
+            names=[str(posicao) for posicao in posicoes],
+        )
+        convertidas = tabela.to_pandas(coerce_temporal_nanoseconds=True, use_threads=True)
+        for posicao in posicoes:
+            valores = convertidas[str(posicao)]
+            if valores.dtype == object:
+                # O Arrow devolve None onde o pd.read_excel teria NaN
+                valores = valores.where(valores.notna(), np.nan)
+            colunas[posicao] = valores.set_axis(df.index)
+    return _montar(df, colunas)
+
+
+def _montar(df: pd.DataFrame, colunas: dict) -> pd.DataFrame:
+    resultado = pd.DataFrame(colunas, index=df.index)
+    resultado.columns = df.columns
+    resultado.attrs = dict(df.attrs)
+    return resultado
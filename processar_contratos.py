@@ -1,7 +1,22 @@
 import pandas as pd
+import numpy as np
 import os
 import io
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+
+import cache_planilhas
+import delta_extracoes
+import indice_contratos
+import leitura_colunar
+import metricas
+import identificacao_planilha
+import motor_arrow
+import progresso
+from identificacao_planilha import TIPO_3026_11, TIPO_3026_12, TIPO_3026_15
 
 def processar_excel(caminho_arquivo, tipo_filtro):
     try:
@@ -62,7 +77,8 @@ def processar_excel(caminho_arquivo, tipo_filtro):
         return None, str(e)
 
 
-AUDIT_COLUMN_CANDIDATES = ["AUDITADO", "AUD"]
+# As mesmas que identificam uma extração 3026 (identificacao_planilha)
+AUDIT_COLUMN_CANDIDATES = list(identificacao_planilha.COLUNAS_AUDITADO)
 PERIOD_COLUMN_CANDIDATES = [
     "DT.HAB.",
     "DT.HAB",
@@ -85,14 +101,47 @@ DEST_COMPLEM_CANDIDATES = ["DEST.COMPLEM", "DESTINO DE COMPLEMENTO"]
 CONTRATO_COLUMN_CANDIDATES = ["CONTRATO"]
 CONTRATOS_COLUMN_CANDIDATES = ["CONTRATOS"]
 DESTINO_REMOVE = {"0x0", "1x4", "6x4", "8x4"}
+STREAMING_CHUNK_ROWS = 20000  # Linhas por bloco na leitura em streaming
+
+# Motores da sequência de filtros (ver motor_arrow.py)
+MOTOR_PANDAS = "pandas"
+MOTOR_ARROW = "arrow"
+MOTORES = (MOTOR_PANDAS, MOTOR_ARROW)
+# Colunas de baixa cardinalidade convertidas para category logo após a leitura
+CATEGORY_COLUMN_CANDIDATES = (
+    AUDIT_COLUMN_CANDIDATES
+    + DEST_PAGAM_CANDIDATES
+    + DEST_COMPLEM_CANDIDATES
+    + ["BANCO", "MUNICIPIO", "EVENTO", "SITUACAO ANALISE"]
+)
+AUDIT_CODIGO_OUTRO = 0
+AUDIT_CODIGO_AUD = 1
+AUDIT_CODIGO_NAUD = 2
+# Colunas lidas na primeira fase da leitura com projeção (usadas pelos filtros)
+PREDICATE_COLUMN_CANDIDATES = [
+    candidate.strip().upper()
+    for candidate in (
+        AUDIT_COLUMN_CANDIDATES
+        + PERIOD_COLUMN_CANDIDATES
+        + HABITACIONAL_COLUMN_CANDIDATES
+        + DEST_PAGAM_CANDIDATES
+        + DEST_COMPLEM_CANDIDATES
+        + CONTRATOS_COLUMN_CANDIDATES
+        + CONTRATO_COLUMN_CANDIDATES  # Índice de contratos (todas as linhas lidas)
+    )
+]
+PREDICATE_COLUMN_POSITIONS = [22, 24, 27]  # Colunas W, Y e AB
+# Planilha enviada: bytes (uploads pequenos) ou caminho do arquivo gravado em disco
+Planilha = Union[bytes, str]
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")  # Dia zero dos números de série do Excel
+EXCEL_SERIAL_MAX = 2958465  # 31/12/9999
 
 
 def _lookup_columns(df: pd.DataFrame) -> dict:
     return {str(col).strip().upper(): col for col in df.columns if col is not None}
 
 
-def _find_column(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
-    lookup = _lookup_columns(df)
+def _buscar_coluna(lookup: dict, candidates: List[str]) -> Optional[str]:
     for candidate in candidates:
         key = candidate.strip().upper()
         if key in lookup:
@@ -100,6 +149,109 @@ def _find_column(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
     return None
 
 
+@dataclass(frozen=True)
+class EsquemaColunas:
+    """
+    Colunas da planilha resolvidas uma única vez após a leitura e repassadas aos
+    filtros. Os filtros só removem linhas, então o esquema vale para toda a sequência.
+    """
+    auditado: Optional[str]
+    periodo: Optional[str]
+    habitacional: Optional[str]
+    dest_pagam: Optional[str]
+    dest_complem: Optional[str]
+    contratos: Optional[str]
+    # Coluna em cada posição da planilha original (None se não foi lida)
+    posicoes: tuple
+
+    @classmethod
+    def resolver(cls, df: pd.DataFrame) -> "EsquemaColunas":
+        lookup = _lookup_columns(df)
+        # Com projeção de colunas, as posições originais ficam em df.attrs["colunas_planilha"]
+        colunas = df.attrs.get("colunas_planilha", df.columns)
+        return cls(
+            auditado=_buscar_coluna(lookup, AUDIT_COLUMN_CANDIDATES),
+            periodo=_buscar_coluna(lookup, PERIOD_COLUMN_CANDIDATES),
+            habitacional=_buscar_coluna(lookup, HABITACIONAL_COLUMN_CANDIDATES),
+            dest_pagam=_buscar_coluna(lookup, DEST_PAGAM_CANDIDATES),
+            dest_complem=_buscar_coluna(lookup, DEST_COMPLEM_CANDIDATES),
+            contratos=_buscar_coluna(lookup, CONTRATOS_COLUMN_CANDIDATES),
+            posicoes=tuple(col if col in df.columns else None for col in colunas),
+        )
+
+    def por_posicao(self, index: int) -> Optional[str]:
+        """Coluna na posição `index` da planilha original (W=22, Y=24, AB=27...)."""
+        if index < len(self.posicoes):
+            return self.posicoes[index]
+        return None
+
+
+def _esquema(df: pd.DataFrame, esquema: Optional[EsquemaColunas]) -> EsquemaColunas:
+    return esquema if esquema is not None else EsquemaColunas.resolver(df)
+
+
+def _aplicar_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas conhecidas de baixa cardinalidade (auditado, DEST, banco,
+    município, evento, situação) para category, sem alterar os valores.
+    Aplicado uma vez logo após a leitura.
+    """
+    lookup = _lookup_columns(df)
+    for candidate in CATEGORY_COLUMN_CANDIDATES:
+        col = lookup.get(candidate.strip().upper())
+        if col is not None and df[col].dtype == object:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _coluna_constante(valor, linhas: int) -> pd.Categorical:
+    """Coluna com o mesmo valor em todas as linhas, guardada como category (1 byte por linha)."""
+    return pd.Categorical.from_codes(np.zeros(linhas, dtype=np.int8), categories=[valor])
+
+
+def _aplicar_por_valor(serie: pd.Series, funcao: Callable[[pd.Series], np.ndarray]) -> np.ndarray:
+    """
+    Aplica `funcao` aos valores da série como texto (equivalente a serie.astype(str)).
+    Em colunas category, `funcao` roda só nas categorias e o resultado chega às
+    linhas pelos códigos, sem trabalho de texto por linha. Colunas do motor Arrow
+    fazem o mesmo com os valores distintos de cada fatia (ver motor_arrow.py).
+    """
+    if isinstance(serie.dtype, pd.ArrowDtype):
+        return motor_arrow.por_valor(serie, funcao)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # O código -1 (vazio) aponta para o último item, que é o texto "nan"
+        categorias = pd.Series(list(serie.cat.categories.astype(str)) + ["nan"], dtype=object)
+        return np.asarray(funcao(categorias))[serie.cat.codes.to_numpy()]
+    return np.asarray(funcao(serie.astype(str)))
+
+
+def _classificar_auditoria(valores: pd.Series) -> np.ndarray:
+    valores = valores.str.upper().str.strip()
+    return np.select(
+        [valores.isin({"AUD", "AUDI"}).to_numpy(), (valores == "NAUD").to_numpy()],
+        [AUDIT_CODIGO_AUD, AUDIT_CODIGO_NAUD],
+        AUDIT_CODIGO_OUTRO
+    ).astype(np.int8)
+
+
+def _destino_removido(valores: pd.Series) -> np.ndarray:
+    return valores.str.lower().isin(DESTINO_REMOVE).to_numpy()
+
+
+def _codigos_auditoria(df: pd.DataFrame, esquema: Optional[EsquemaColunas] = None) -> np.ndarray:
+    """Normaliza a coluna de auditado uma única vez: 1 = AUD/AUDI, 2 = NAUD, 0 = outros."""
+    audit_col = _esquema(df, esquema).auditado
+    if not audit_col:
+        return np.zeros(len(df), dtype=np.int8)
+    return _aplicar_por_valor(df[audit_col], _classificar_auditoria)
+
+
+def status_auditoria(df: pd.DataFrame) -> np.ndarray:
+    """Status de auditoria de cada linha como texto: "AUD", "NAUD" ou "" (outros)."""
+    rotulos = np.array(["", "AUD", "NAUD"], dtype=object)
+    return rotulos[_codigos_auditoria(df)]
+
+
 def _parse_reference_date(reference_date: Optional[str]) -> pd.Timestamp:
     if reference_date:
         parsed = pd.to_datetime(reference_date, errors="coerce")
@@ -108,372 +260,1151 @@ def _parse_reference_date(reference_date: Optional[str]) -> pd.Timestamp:
     return pd.Timestamp.now().normalize()
 
 
-def _apply_audit_filter(df: pd.DataFrame, filter_type: str) -> pd.DataFrame:
-    if filter_type == "todos":
-        return df
+def _converter_datas_unicas(valores: pd.Series) -> pd.Series:
+    """
+    Converte valores distintos para datetime64: datas do Excel (datetime), textos
+    dd/mm/aaaa ou ISO (com ou sem hora) e números de série do Excel.
+    O que não for data vira NaT.
+    """
+    resultado = pd.Series(pd.NaT, index=valores.index, dtype="datetime64[ns]")
+    tipo = pd.api.types.infer_dtype(valores, skipna=True)
+    if tipo in {"datetime", "datetime64", "date", "empty"}:
+        return pd.to_datetime(valores, errors="coerce")
+
+    if tipo == "string":
+        textos = pd.Series(True, index=valores.index)
+        numeros = ~textos
+    else:
+        textos = valores.map(lambda valor: isinstance(valor, str)).astype(bool)
+        numeros = valores.map(
+            lambda valor: isinstance(valor, (int, float, np.number)) and not isinstance(valor, bool)
+        ).astype(bool)
+    outros = ~(textos | numeros)
+
+    if outros.any():
+        resultado[outros] = pd.to_datetime(valores[outros], errors="coerce")
+
+    if numeros.any():
+        seriais = valores[numeros].astype(float)
+        seriais = seriais[(seriais >= 1) & (seriais <= EXCEL_SERIAL_MAX)]
+        resultado[seriais.index] = EXCEL_EPOCH + pd.to_timedelta(seriais, unit="D")
+
+    if not textos.any():
+        return resultado
+    pendentes = valores[textos].str.strip()
+    pendentes = pendentes[pendentes != ""]
+    # dd/mm/aaaa[ hh:mm[:ss]] é reescrito como aaaa-mm-dd[ ...] para o parser ISO 8601,
+    # que é muito mais rápido que um format com strptime
+    brasileiras = (pendentes.str.slice(2, 3) == "/") & (pendentes.str.slice(5, 6) == "/")
+    iso = pendentes.where(
+        ~brasileiras,
+        pendentes.str.slice(6, 10) + "-" + pendentes.str.slice(3, 5) + "-"
+        + pendentes.str.slice(0, 2) + pendentes.str.slice(10)
+    )
+    convertidas = pd.to_datetime(iso, format="ISO8601", errors="coerce")
+    resultado[convertidas.index] = convertidas
+
+    # Layouts fora do padrão: inferência por valor, com dia antes do mês
+    restantes = pendentes[convertidas.isna()]
+    if not restantes.empty:
+        resultado[restantes.index] = pd.to_datetime(restantes, format="mixed", dayfirst=True, errors="coerce")
+
+    return resultado
+
+
+def _converter_datas(serie: pd.Series) -> pd.Series:
+    """
+    Converte a coluna para datetime64 (NaT onde não houver data).
+    Cada valor distinto é convertido uma única vez e o resultado é distribuído
+    às linhas pelos códigos, já que muitas linhas repetem a mesma data.
+    """
+    if isinstance(serie.dtype, pd.ArrowDtype):
+        return motor_arrow.datas(serie, _converter_datas_unicas)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    if pd.api.types.infer_dtype(serie, skipna=True) in {"datetime", "date", "empty"}:
+        # Só datas do Excel (ou vazio): conversão direta, sem passar pelos valores distintos
+        return pd.to_datetime(serie, errors="coerce")
+
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        unicos = serie.cat.categories
+    else:
+        codigos, unicos = pd.factorize(serie)
+    convertidos = _converter_datas_unicas(pd.Series(np.asarray(unicos, dtype=object)))
+    # O código -1 (vazio) aponta para o NaT acrescentado no final
+    valores = np.append(convertidos.to_numpy(), np.datetime64("NaT", "ns"))[codigos]
+    return pd.Series(valores, index=serie.index, name=serie.name)
 
+
+class DatasConvertidas:
+    """
+    Datas convertidas por coluna durante a sequência de filtros de um arquivo.
+    Cada coluna é convertida uma vez; os filtros seguintes recebem o recorte
+    das linhas que sobraram.
+    """
+
+    def __init__(self):
+        self._colunas = {}
+
+    def obter(self, df: pd.DataFrame, coluna: str) -> pd.Series:
+        serie = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie) and not isinstance(serie.dtype, pd.ArrowDtype):
+            # Coluna já normalizada no próprio DataFrame (ex.: horas removidas)
+            return serie
+
+        convertidas = self._colunas.get(coluna)
+        if convertidas is None or not serie.index.is_unique:
+            convertidas = _converter_datas(serie)
+            self._colunas[coluna] = convertidas
+        elif not convertidas.index.equals(serie.index):
+            convertidas = convertidas.loc[serie.index]
+        return convertidas
+
+
+def _datas(datas: Optional[DatasConvertidas]) -> DatasConvertidas:
+    return datas if datas is not None else DatasConvertidas()
+
+
+class PlanoFiltros:
+    """
+    Plano de filtros de um DataFrame: cada filtro contribui uma máscara, as máscaras
+    são combinadas (AND) e as linhas que sobram são copiadas uma única vez, em
+    aplicar(). As funções de máscara recebem as linhas ainda ativas porque alguns
+    filtros mudam de comportamento conforme o que sobrou (ex.: período sem nenhuma
+    data válida não filtra).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.ativas = np.ones(len(df), dtype=bool)
+        self._colunas_substituidas: Dict[str, pd.Series] = {}
+
+    def filtrar(self, nome: str, mascara: Callable[..., Optional[np.ndarray]], *args, **kwargs) -> None:
+        """Restringe as linhas ativas com `mascara(df, ativas, ...)` (None = não filtra)."""
+        with metricas.etapa(nome, linhas_entrada=int(self.ativas.sum())) as registro:
+            resultado = mascara(self.df, self.ativas, *args, **kwargs)
+            if resultado is not None:
+                self.ativas &= resultado
+            registro.linhas_saida = int(self.ativas.sum())
+
+    def substituir_colunas(self, colunas: Dict[str, pd.Series]) -> None:
+        """Colunas (alinhadas ao DataFrame original) gravadas no resultado no lugar das originais."""
+        self._colunas_substituidas.update(colunas)
+
+    def aplicar(self) -> pd.DataFrame:
+        if self.ativas.all():
+            if not self._colunas_substituidas:
+                return self.df
+            resultado = self.df.copy(deep=False)  # Só as colunas substituídas são alocadas
+            posicoes = None
+        else:
+            posicoes = np.flatnonzero(self.ativas)
+            resultado = self.df.take(posicoes)
+        for coluna, serie in self._colunas_substituidas.items():
+            valores = serie.to_numpy()
+            resultado[coluna] = valores if posicoes is None else valores[posicoes]
+        return resultado
+
+
+def _filtrar(df: pd.DataFrame, mascara: Optional[np.ndarray]) -> pd.DataFrame:
+    return df if mascara is None else df[mascara].copy()
+
+
+def _mascara_intervalo(parsed_dates: pd.Series, reference_date: Optional[str], months_back: int) -> np.ndarray:
+    end_date = _parse_reference_date(reference_date)
+    start_date = end_date - pd.DateOffset(months=max(months_back, 0))
+    return (
+        parsed_dates.notna()
+        & (parsed_dates >= start_date)
+        & (parsed_dates <= end_date)
+    ).to_numpy()
+
+
+def _mascara_auditoria(
+    df: pd.DataFrame,
+    ativas: Optional[np.ndarray],
+    filter_type: str,
+    esquema: Optional[EsquemaColunas] = None
+) -> Optional[np.ndarray]:
     if filter_type not in {"auditado", "nauditado"}:
-        return df
+        return None
 
-    audit_column = _find_column(df, AUDIT_COLUMN_CANDIDATES)
+    audit_column = _esquema(df, esquema).auditado
     if not audit_column:
-        return df
+        return None
 
-    col_values = df[audit_column].astype(str).str.upper().str.strip()
+    codigos = _aplicar_por_valor(df[audit_column], _classificar_auditoria)
 
     if filter_type == "auditado":
-        mask = col_values.isin({"AUD", "AUDI"})
-    else:
-        mask = col_values == "NAUD"
+        return codigos == AUDIT_CODIGO_AUD
+    return codigos == AUDIT_CODIGO_NAUD
 
-    return df[mask].copy()
 
+def _apply_audit_filter(
+    df: pd.DataFrame,
+    filter_type: str,
+    esquema: Optional[EsquemaColunas] = None
+) -> pd.DataFrame:
+    return _filtrar(df, _mascara_auditoria(df, None, filter_type, esquema))
 
-def _apply_period_filter(
+
+def _mascara_periodo(
     df: pd.DataFrame,
+    ativas: Optional[np.ndarray],
     enabled: bool,
     reference_date: Optional[str],
-    months_back: int
-) -> pd.DataFrame:
+    months_back: int,
+    esquema: Optional[EsquemaColunas] = None,
+    datas: Optional[DatasConvertidas] = None
+) -> Optional[np.ndarray]:
     """
-    Aplica filtro de período (DT.MANIFESTAÇÃO).
-    IMPORTANTE: Se não encontrar a coluna ou não houver correspondências, retorna dados originais.
+    Máscara do filtro de período (DT.MANIFESTAÇÃO).
+    IMPORTANTE: Se não encontrar a coluna ou não houver nenhuma data válida nas linhas
+    ativas, não filtra.
     """
     if not enabled or not reference_date:
-        return df
+        return None
 
-    date_column = _find_column(df, PERIOD_COLUMN_CANDIDATES)
+    date_column = _esquema(df, esquema).periodo
     if not date_column:
         # Se não encontrar a coluna, retorna sem filtrar (não zera)
-        return df
+        return None
 
     try:
-        end_date = _parse_reference_date(reference_date)
-        months_back = max(months_back, 0)
-        start_date = end_date - pd.DateOffset(months=months_back)
+        parsed_dates = _datas(datas).obter(df, date_column)
 
-        parsed_dates = pd.to_datetime(df[date_column], errors="coerce")
-        
         # Verifica se há datas válidas antes de filtrar
-        if parsed_dates.notna().sum() == 0:
+        validas = parsed_dates.notna().to_numpy()
+        if not (validas if ativas is None else validas[ativas]).any():
             # Se não houver datas válidas, retorna sem filtrar
-            return df
-        
-        mask = (
-            parsed_dates.notna()
-            & (parsed_dates >= start_date)
-            & (parsed_dates <= end_date)
-        )
-        
+            return None
+
         # Se não houver correspondências, retorna vazio (filtro aplicado corretamente)
-        return df[mask].copy()
+        return _mascara_intervalo(parsed_dates, reference_date, months_back)
     except Exception as e:
         # Em caso de erro, retorna os dados originais (não zera)
-        return df
+        return None
 
 
-def _apply_3026_12_filters(df: pd.DataFrame) -> pd.DataFrame:
+def _apply_period_filter(
+    df: pd.DataFrame,
+    enabled: bool,
+    reference_date: Optional[str],
+    months_back: int,
+    esquema: Optional[EsquemaColunas] = None,
+    datas: Optional[DatasConvertidas] = None
+) -> pd.DataFrame:
     """
-    Aplica filtros específicos do 3026-12.
-    IMPORTANTE: Não remove duplicados - apenas aplica filtros de DEST.PAGAM e DEST.COMPLEM.
+    Aplica filtro de período (DT.MANIFESTAÇÃO).
+    IMPORTANTE: Se não encontrar a coluna ou não houver correspondências, retorna dados originais.
     """
-    # Aplicar filtros de DEST.PAGAM e DEST.COMPLEM (remover valores específicos)
-    dest_pagam = _find_column(df, DEST_PAGAM_CANDIDATES)
-    if dest_pagam:
-        mask_pagam = ~df[dest_pagam].astype(str).str.lower().isin(DESTINO_REMOVE)
-        df = df[mask_pagam].copy()
+    return _filtrar(df, _mascara_periodo(df, None, enabled, reference_date, months_back, esquema, datas))
 
-    dest_complem = _find_column(df, DEST_COMPLEM_CANDIDATES)
-    if dest_complem:
-        mask_complem = ~df[dest_complem].astype(str).str.lower().isin(DESTINO_REMOVE)
-        df = df[mask_complem].copy()
+
+def _mascara_3026_12(
+    df: pd.DataFrame,
+    ativas: Optional[np.ndarray] = None,
+    esquema: Optional[EsquemaColunas] = None
+) -> Optional[np.ndarray]:
+    """
+    Filtros específicos do 3026-12: DEST.PAGAM, DEST.COMPLEM e CONTRATOS vazios.
+    IMPORTANTE: Não remove duplicados.
+    """
+    esquema = _esquema(df, esquema)
+    mascara = None
+
+    # Aplicar filtros de DEST.PAGAM e DEST.COMPLEM (remover valores específicos)
+    for coluna in (esquema.dest_pagam, esquema.dest_complem):
+        if coluna:
+            mantidas = ~_aplicar_por_valor(df[coluna], _destino_removido)
+            mascara = mantidas if mascara is None else mascara & mantidas
 
     # Filtrar por CONTRATOS (remover vazios) - apenas se a coluna existir
-    contratos_col = _find_column(df, CONTRATOS_COLUMN_CANDIDATES)
+    contratos_col = esquema.contratos
     if contratos_col:
         # Apenas remover se realmente estiver vazio, não se for apenas NaN
-        df = df[df[contratos_col].notna()].copy()
+        preenchidas = df[contratos_col].notna().to_numpy()
+        mascara = preenchidas if mascara is None else mascara & preenchidas
 
-    return df
+    return mascara
 
 
-def _apply_habitacional_filter(
+def _apply_3026_12_filters(df: pd.DataFrame, esquema: Optional[EsquemaColunas] = None) -> pd.DataFrame:
+    """
+    Aplica filtros específicos do 3026-12.
+    IMPORTANTE: Não remove duplicados - apenas aplica filtros de DEST.PAGAM e DEST.COMPLEM.
+    """
+    return _filtrar(df, _mascara_3026_12(df, None, esquema))
+
+
+def _mascara_habitacional(
     df: pd.DataFrame,
+    ativas: Optional[np.ndarray],
     reference_date: Optional[str],
     months_back: int,
-    column_index: Optional[int] = None
-) -> pd.DataFrame:
+    column_index: Optional[int] = None,
+    esquema: Optional[EsquemaColunas] = None,
+    datas: Optional[DatasConvertidas] = None
+) -> Optional[np.ndarray]:
     """
-    Aplica filtro de Data Habitacional para 3026-11
+    Máscara do filtro de Data Habitacional para 3026-11
     - BEMGE: coluna W (índice 22)
     - MINAS CAIXA: coluna Y (índice 24)
+    A escolha da coluna considera só as linhas ativas.
     """
     if not reference_date:
-        return df  # Se não tiver data de referência, não filtra
+        return None  # Se não tiver data de referência, não filtra
     
+    esquema = _esquema(df, esquema)
+    datas = _datas(datas)
     habitacional_col = None
+
+    def _tem_valor(valores: pd.Series) -> bool:
+        preenchidas = valores.notna().to_numpy()
+        return bool((preenchidas if ativas is None else preenchidas[ativas]).any())
     
     # Primeiro tenta pelo índice da coluna (mais confiável)
-    if column_index is not None and len(df.columns) > column_index:
-        habitacional_col = df.columns[column_index]
+    if column_index is not None:
+        habitacional_col = esquema.por_posicao(column_index)
         # Verifica se a coluna existe e tem dados
-        if habitacional_col is not None and df[habitacional_col].notna().sum() == 0:
+        if habitacional_col is not None and not _tem_valor(df[habitacional_col]):
             habitacional_col = None
     
     # Se não encontrou pelo índice, tenta pelos nomes
     if habitacional_col is None:
-        habitacional_col = _find_column(df, HABITACIONAL_COLUMN_CANDIDATES)
+        habitacional_col = esquema.habitacional
     
     # Se ainda não encontrou, tenta buscar pela posição da coluna (W=22, Y=24)
     if habitacional_col is None and column_index is not None:
         # Tenta encontrar coluna pela posição exata
         try:
-            if len(df.columns) > column_index:
-                test_col = df.columns[column_index]
+            test_col = esquema.por_posicao(column_index)
+            if test_col is not None:
                 # Testa se consegue converter para data
-                test_dates = pd.to_datetime(df[test_col], errors="coerce")
-                if test_dates.notna().sum() > 0:
+                if _tem_valor(datas.obter(df, test_col)):
                     habitacional_col = test_col
         except Exception:
             pass
     
     if not habitacional_col:
         # Se não encontrar a coluna, retorna sem filtrar (não zera os dados)
-        return df
+        return None
 
     try:
-        end_date = _parse_reference_date(reference_date)
-        months_back = max(months_back, 0)
-        start_date = end_date - pd.DateOffset(months=months_back)
-
-        parsed_dates = pd.to_datetime(df[habitacional_col], errors="coerce")
-        mask = (
-            parsed_dates.notna()
-            & (parsed_dates >= start_date)
-            & (parsed_dates <= end_date)
-        )
-        
-        # Se não houver nenhuma data no intervalo, retorna dataframe vazio
-        # Mas só se realmente não houver correspondências
-        if mask.sum() == 0:
-            # Retorna vazio apenas se realmente não houver correspondências
-            return df[mask].copy()
-        
-        return df[mask].copy()
+        # Se não houver nenhuma data no intervalo, o resultado fica vazio
+        return _mascara_intervalo(datas.obter(df, habitacional_col), reference_date, months_back)
     except Exception as e:
         # Em caso de erro, retorna os dados originais (não zera)
-        return df
+        return None
 
 
-def _apply_minas_caixa_3026_15_filters(
+def _apply_habitacional_filter(
     df: pd.DataFrame,
     reference_date: Optional[str],
-    months_back: int
+    months_back: int,
+    column_index: Optional[int] = None,
+    esquema: Optional[EsquemaColunas] = None,
+    datas: Optional[DatasConvertidas] = None
 ) -> pd.DataFrame:
     """
-    Aplica filtros específicos para 3026-15 MINAS CAIXA:
-    - Remove horas das colunas S, W, Z, AB, AD, AK, AL (mantém apenas data)
-    - Aplica filtro de data na coluna AB (últimos 2 meses) se reference_date fornecido
+    Aplica filtro de Data Habitacional para 3026-11
+    - BEMGE: coluna W (índice 22)
+    - MINAS CAIXA: coluna Y (índice 24)
     """
-    # Remover horas das colunas específicas
-    col_indices = {
-        'S': 18,   # Coluna S é índice 18 (0-indexed)
-        'W': 22,   # Coluna W é índice 22
-        'Z': 25,   # Coluna Z é índice 25
-        'AB': 27,  # Coluna AB é índice 27
-        'AD': 29,  # Coluna AD é índice 29
-        'AK': 36,  # Coluna AK é índice 36
-        'AL': 37   # Coluna AL é índice 37
-    }
-    
-    for col_name, col_idx in col_indices.items():
-        if len(df.columns) > col_idx:
-            col = df.columns[col_idx]
-            # Converter para datetime e remover horas (manter apenas data)
+    return _filtrar(
+        df, _mascara_habitacional(df, None, reference_date, months_back, column_index, esquema, datas)
+    )
+
+
+# Colunas de data do 3026-15 MINAS CAIXA que perdem as horas: S, W, Z, AB, AD, AK, AL
+COLUNAS_SEM_HORA_3026_15 = {
+    'S': 18,   # Coluna S é índice 18 (0-indexed)
+    'W': 22,   # Coluna W é índice 22
+    'Z': 25,   # Coluna Z é índice 25
+    'AB': 27,  # Coluna AB é índice 27
+    'AD': 29,  # Coluna AD é índice 29
+    'AK': 36,  # Coluna AK é índice 36
+    'AL': 37   # Coluna AL é índice 37
+}
+
+
+def _datas_sem_hora_3026_15(
+    df: pd.DataFrame,
+    esquema: EsquemaColunas,
+    datas: DatasConvertidas
+) -> Dict[str, pd.Series]:
+    """Colunas S, W, Z, AB, AD, AK e AL convertidas para data, sem as horas."""
+    normalizadas = {}
+    for col_name, col_idx in COLUNAS_SEM_HORA_3026_15.items():
+        col = esquema.por_posicao(col_idx)
+        if col is not None:
             try:
-                df[col] = pd.to_datetime(df[col], errors="coerce")
-                # Se for datetime com hora, remover a hora
-                df[col] = df[col].dt.normalize()  # Remove horas, mantém data
+                # Remove horas, mantém data
+                normalizadas[col] = datas.obter(df, col).dt.normalize()
             except Exception:
                 # Se não conseguir converter, manter como está
                 pass
-    
-    # Aplicar filtro de data na coluna AB (últimos 2 meses) APENAS se reference_date fornecido
-    if reference_date and len(df.columns) > 27:  # Coluna AB é índice 27
-        ab_col = df.columns[27]
-        end_date = _parse_reference_date(reference_date)
-        months_back = max(months_back, 0)
-        start_date = end_date - pd.DateOffset(months=months_back)
-        
-        # Converter para datetime se ainda não for
-        parsed_dates = pd.to_datetime(df[ab_col], errors="coerce")
-        mask = (
-            parsed_dates.notna()
-            & (parsed_dates >= start_date)
-            & (parsed_dates <= end_date)
-        )
-        df = df[mask].copy()
-    
-    return df
+    return normalizadas
 
 
-def _apply_file_specific_filters(df: pd.DataFrame, filename: str, bank_type: Optional[str] = None) -> pd.DataFrame:
+def _mascara_coluna_ab(
+    df: pd.DataFrame,
+    ativas: Optional[np.ndarray],
+    reference_date: Optional[str],
+    months_back: int,
+    esquema: Optional[EsquemaColunas] = None,
+    datas: Optional[DatasConvertidas] = None,
+    normalizadas: Optional[Dict[str, pd.Series]] = None
+) -> Optional[np.ndarray]:
     """
-    Aplica filtros específicos por tipo de arquivo.
-    IMPORTANTE: NÃO remove duplicados automaticamente - apenas aplica filtros específicos.
+    Filtro de data na coluna AB do 3026-15 (últimos meses) APENAS se reference_date
+    for fornecido. `normalizadas` traz as datas já sem horas (MINAS CAIXA).
     """
-    upper_name = filename.upper()
-    bank_lower = (bank_type or "").lower()
+    ab_col = _esquema(df, esquema).por_posicao(27)  # Coluna AB é índice 27
+    if not reference_date or ab_col is None:
+        return None
+    if normalizadas and ab_col in normalizadas:
+        parsed_dates = normalizadas[ab_col]
+    else:
+        parsed_dates = _datas(datas).obter(df, ab_col)
+    return _mascara_intervalo(parsed_dates, reference_date, months_back)
+
+
+def _apply_minas_caixa_3026_15_filters(
+    df: pd.DataFrame,
+    reference_date: Optional[str],
+    months_back: int,
+    esquema: Optional[EsquemaColunas] = None,
+    datas: Optional[DatasConvertidas] = None
+) -> pd.DataFrame:
+    """
+    Aplica filtros específicos para 3026-15 MINAS CAIXA:
+    - Remove horas das colunas S, W, Z, AB, AD, AK, AL (mantém apenas data)
+    - Aplica filtro de data na coluna AB (últimos 2 meses) se reference_date fornecido
+    """
+    esquema = _esquema(df, esquema)
+    datas = _datas(datas)
+    for col, serie in _datas_sem_hora_3026_15(df, esquema, datas).items():
+        df[col] = serie
+    return _filtrar(df, _mascara_coluna_ab(df, None, reference_date, months_back, esquema, datas))
+
 
+def _mascara_arquivo(
+    df: pd.DataFrame,
+    ativas: Optional[np.ndarray],
+    tipo_arquivo: Optional[str],
+    bank_type: Optional[str] = None,
+    esquema: Optional[EsquemaColunas] = None
+) -> Optional[np.ndarray]:
+    """
+    Filtros específicos por tipo de arquivo (ver identificacao_planilha.TIPOS_ARQUIVO).
+    IMPORTANTE: NÃO remove duplicados automaticamente - apenas aplica filtros específicos.
+    """
     # Aplicar filtros específicos do 3026-12 (DEST.PAGAM, DEST.COMPLEM)
-    if "3026-12" in upper_name:
-        df = _apply_3026_12_filters(df)
+    if tipo_arquivo == TIPO_3026_12:
+        return _mascara_3026_12(df, ativas, esquema)
 
     # Para 3026-15 e BEMGE: remover duplicados pela coluna D APENAS se especificado
     # NOTA: Esta funcionalidade será aplicada apenas quando explicitamente solicitada
     # Por enquanto, não removemos duplicados automaticamente
-    
-    return df
+    return None
 
 
-def filtrar_planilha_contratos(
-    contents: bytes,
+def _abrir_planilha(contents: Planilha):
+    """Origem aceita pelo openpyxl/pandas: caminhos são lidos direto do disco, sem cópia."""
+    if isinstance(contents, (bytes, bytearray)):
+        return io.BytesIO(contents)
+    return contents
+
+
+def _converter_celula(value):
+    """
+    Converte o valor bruto de uma célula como o leitor openpyxl do pandas faz
+    (vazio vira "", números inteiros viram int).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _rotulos_cabecalho(header: list) -> List[str]:
+    """Nomes finais das colunas (duplicadas e vazias tratadas como no pd.read_excel)."""
+    return list(TextParser([header], header=0).read().columns)
+
+
+def _montar_bloco(rotulos: List[str], linhas: list, indices: List[int]) -> pd.DataFrame:
+    if not linhas:
+        return pd.DataFrame(columns=rotulos)
+    bloco = TextParser(linhas, header=None).read()
+    bloco.columns = rotulos
+    bloco.index = pd.Index(indices)
+    return bloco
+
+
+def _iterar_blocos_planilha(
+    contents: Planilha,
+    chunk_rows: int = STREAMING_CHUNK_ROWS,
+    colunas: Optional[List[int]] = None,
+    linhas: Optional[List[int]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê a primeira aba em modo somente leitura (iter_rows) e devolve DataFrames de
+    até `chunk_rows` linhas, com os mesmos tipos que pd.read_excel produziria.
+    Linhas vazias no final da planilha são descartadas, como no pd.read_excel.
+
+    O índice de cada bloco é a posição da linha de dados na planilha (0 = primeira
+    linha após o cabeçalho). `colunas` limita a leitura às posições informadas e
+    `linhas` (posições em ordem crescente) limita às linhas informadas.
+    """
+    workbook = load_workbook(_abrir_planilha(contents), read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = None
+        for row in rows:
+            header = [_converter_celula(value) for value in row]
+            break
+        if header is None:
+            yield pd.DataFrame()
+            return
+        while header and header[-1] == "":
+            header.pop()
+        width = len(header)
+        rotulos = _rotulos_cabecalho(header)
+        if colunas is None:
+            colunas = list(range(width))
+        else:
+            rotulos = [rotulos[i] for i in colunas]
+
+        buffer = []
+        indices = []
+        vazias = []  # Linhas vazias só entram se houver dados depois delas
+        emitiu = False
+        proxima = 0  # Próxima posição de `linhas` a procurar
+        for posicao, row in enumerate(rows):
+            if linhas is not None:
+                if proxima >= len(linhas):
+                    break
+                if posicao != linhas[proxima]:
+                    continue
+                proxima += 1
+            elif all(value is None or value == "" for value in row[:width]):
+                vazias.append(posicao)
+                continue
+
+            if vazias:
+                buffer.extend([""] * len(colunas) for _ in vazias)
+                indices.extend(vazias)
+                vazias = []
+            linha = [_converter_celula(row[i]) if i < len(row) else "" for i in colunas]
+            buffer.append(linha)
+            indices.append(posicao)
+            if len(buffer) >= chunk_rows:
+                progresso.emitir(progresso.EVENTO_LEITURA_PARCIAL, linhas_lidas=posicao + 1)
+                yield _montar_bloco(rotulos, buffer, indices)
+                emitiu = True
+                buffer = []
+                indices = []
+
+        if buffer or not emitiu:
+            yield _montar_bloco(rotulos, buffer, indices)
+    finally:
+        workbook.close()
+
+
+def _guardar_ocorrencias(df: pd.DataFrame, ocorrencias: Optional[list]) -> None:
+    """Acrescenta a `ocorrencias` os contratos das linhas lidas, antes de qualquer filtro."""
+    if ocorrencias is not None and "CONTRATO" in df.columns and len(df):
+        ocorrencias.append(indice_contratos.ocorrencias_planilha(df["CONTRATO"], status_auditoria(df)))
+
+
+def juntar_ocorrencias(ocorrencias: List[pd.DataFrame]) -> pd.DataFrame:
+    """Junta as ocorrências dos blocos lidos: cada contrato fica com o status da última linha."""
+    if not ocorrencias:
+        return pd.DataFrame({"contrato": pd.Series(dtype=object), "auditoria": pd.Series(dtype=object)})
+    df = pd.concat(ocorrencias, ignore_index=True)
+    return df.drop_duplicates("contrato", keep="last").reset_index(drop=True)
+
+
+def com_ocorrencias(funcao: Callable, *args, **kwargs) -> tuple:
+    """
+    Roda `funcao` (filtrar_planilha_contratos ou processar_3026_12_com_abas) e
+    devolve (resultado, contratos lidos antes dos filtros) para o índice de
+    contratos. Função de módulo para poder rodar no pool de processos.
+    """
+    ocorrencias = []
+    resultado = funcao(*args, ocorrencias=ocorrencias, **kwargs)
+    return resultado, juntar_ocorrencias(ocorrencias)
+
+
+def _ler_planilha_streaming(
+    contents: Planilha,
     filter_type: str,
     period_filter_enabled: bool,
     reference_date: Optional[str],
     months_back: int,
-    filename: str,
-    bank_type: Optional[str] = None,
-    habitacional_filter_enabled: bool = False,
-    habitacional_reference_date: Optional[str] = None,
-    habitacional_months_back: int = 2,
-    minas_caixa_3026_15_filter_enabled: bool = False,
-    minas_caixa_3026_15_reference_date: Optional[str] = None,
-    minas_caixa_3026_15_months_back: int = 2
+    aplicar_filtros_3026_12: bool,
+    ocorrencias: Optional[list] = None
 ) -> pd.DataFrame:
     """
-    Filtra planilha de contratos.
-    IMPORTANTE: Não remove duplicados automaticamente - mantém todos os dados originais.
-    Aplica apenas os filtros explicitamente habilitados pelo usuário.
+    Lê a planilha em blocos e aplica os filtros de auditado, período e DEST
+    (3026-12) em cada bloco, de modo que as linhas descartadas nunca formam um
+    DataFrame completo. O resultado é o mesmo da leitura completa seguida dos filtros.
+    Os contratos de cada bloco, antes dos filtros, vão para `ocorrencias`.
     """
-    normalized_filter = (filter_type or "todos").lower()
-    bank_lower = (bank_type or "").lower()
-    filename_upper = filename.upper()
+    filtrar_periodo = period_filter_enabled and reference_date
+    blocos = []
+    # O filtro de período não filtra quando não há nenhuma data válida no arquivo.
+    # Até a primeira data válida aparecer, as linhas ficam guardadas em `sem_data`.
+    sem_data = []
+    encontrou_data = False
+
+    if filtrar_periodo:
+        end_date = _parse_reference_date(reference_date)
+        start_date = end_date - pd.DateOffset(months=max(months_back, 0))
+
+    esquema = None
+    for bloco in _iterar_blocos_planilha(contents):
+        if esquema is None:
+            # Todos os blocos têm as mesmas colunas
+            esquema = EsquemaColunas.resolver(bloco)
+        _guardar_ocorrencias(bloco, ocorrencias)
+        bloco = _apply_audit_filter(bloco, filter_type, esquema)
+
+        date_column = esquema.periodo if filtrar_periodo else None
+        if date_column:
+            parsed_dates = _converter_datas(bloco[date_column])
+            if not encontrou_data and parsed_dates.notna().any():
+                encontrou_data = True
+                sem_data = []
+            if encontrou_data:
+                mask = (
+                    parsed_dates.notna()
+                    & (parsed_dates >= start_date)
+                    & (parsed_dates <= end_date)
+                )
+                bloco = bloco[mask]
+
+        if aplicar_filtros_3026_12:
+            bloco = _apply_3026_12_filters(bloco, esquema)
+
+        if date_column and not encontrou_data:
+            sem_data.append(bloco)
+        else:
+            blocos.append(bloco)
+
+    blocos.extend(sem_data)
+    if len(blocos) == 1:
+        return _aplicar_schema(blocos[0])
+    return _aplicar_schema(pd.concat(blocos, ignore_index=True))
+
+
+def _tamanho_planilha(contents: Planilha) -> int:
+    if isinstance(contents, (bytes, bytearray)):
+        return len(contents)
+    return os.path.getsize(contents)
+
+
+def _medir_leitura(contents: Planilha, ler: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """Executa a leitura `ler()` registrando a etapa "leitura" (bytes lidos e linhas obtidas)."""
+    with metricas.etapa("leitura", bytes_entrada=_tamanho_planilha(contents)) as registro:
+        df = ler()
+        registro.linhas_saida = len(df)
+    return df
 
-    df = pd.read_excel(io.BytesIO(contents), engine="openpyxl")
 
-    # Aplicar filtro de auditado/não auditado (sempre aplicado conforme seleção)
-    df = _apply_audit_filter(df, normalized_filter)
-    
-    # Aplicar filtro de período APENAS se habilitado pelo usuário
-    if period_filter_enabled:
-        df = _apply_period_filter(df, period_filter_enabled, reference_date, months_back)
+def _com_cache(contents: Planilha, ler: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Planilha inteira (lida e com os tipos da leitura) do cache em disco, indexada só
+    pelo conteúdo (ver cache_planilhas.py): reenvios com outros filtros aproveitam a
+    mesma leitura. Sem ela, roda `ler()` (leitura completa, sem filtros) e guarda.
+    """
+    with metricas.etapa("cache_planilhas", bytes_entrada=_tamanho_planilha(contents)) as registro:
+        chave = cache_planilhas.chave_conteudo(contents)
+        df = cache_planilhas.obter(chave)
+        registro.linhas_saida = None if df is None else len(df)
+    if df is not None:
+        return _aplicar_schema(df)
+    df = ler()
+    cache_planilhas.guardar(chave, df)
+    return df
+
+
+def _ler_planilha_completa(contents: Planilha, streaming_reader: bool) -> pd.DataFrame:
+    """Todas as linhas e colunas do XLSX, em blocos (streaming) ou de uma vez."""
+    if streaming_reader:
+        return _medir_leitura(
+            contents, lambda: _ler_planilha_streaming(contents, "todos", False, None, 0, False)
+        )
+    return _medir_leitura(
+        contents, lambda: _aplicar_schema(pd.read_excel(_abrir_planilha(contents), engine="openpyxl"))
+    )
+
+
+def _ler_planilha_colunar(contents: Planilha, formato: str, motor: str = MOTOR_PANDAS) -> pd.DataFrame:
+    """
+    CSV ou Parquet (ver leitura_colunar.py), com as mesmas colunas e tipos da leitura
+    do XLSX. No motor Arrow as colunas já saem em pd.ArrowDtype.
+    """
+    return _aplicar_schema(leitura_colunar.ler_planilha_colunar(contents, formato, arrow=motor == MOTOR_ARROW))
+
+
+def _com_motor(df: pd.DataFrame, motor: str, filtrar: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Executa `filtrar(df)` no motor escolhido. No motor Arrow as colunas de texto ficam
+    em pd.ArrowDtype durante os filtros e só as linhas que sobram voltam ao pandas.
+    """
+    if motor != MOTOR_ARROW:
+        return filtrar(df)
+    return _aplicar_schema(motor_arrow.para_numpy(filtrar(motor_arrow.para_arrow(df))))
+
+
+def _combinar_mascaras(*mascaras: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """AND das máscaras (None = não filtra)."""
+    resultado = None
+    for mascara in mascaras:
+        if mascara is not None:
+            resultado = mascara if resultado is None else resultado & mascara
+    return resultado
+
+
+def _ler_planilha_projetada(
+    contents: Planilha,
+    filtrar: Callable[[pd.DataFrame], pd.DataFrame],
+    candidatas: Callable[[pd.DataFrame], Optional[np.ndarray]],
+    ocorrencias: Optional[list] = None
+) -> pd.DataFrame:
+    """
+    Leitura em blocos (streaming) com projeção de colunas, em uma única passada pela
+    planilha. De cada bloco ficam as colunas usadas pelos filtros (nomes candidatos e posições
+    W/Y/AB) de todas as linhas e a largura completa só das linhas que passam em
+    `candidatas`: filtros que decidem linha a linha (auditado, DEST), parte da
+    sequência de `filtrar`. No fim, `filtrar` roda nas colunas dos filtros da
+    planilha inteira (os que dependem do conjunto, como o período sem nenhuma data
+    válida, veem todas as linhas) e escolhe as linhas completas que ficam.
+    Os tipos das colunas são os da planilha inteira, não só das linhas que sobraram.
+    Os contratos de todas as linhas lidas vão para `ocorrencias`.
+    """
+    predicados = []
+    completas = []
+    amostras = []  # Primeira linha de cada bloco, para os tipos da planilha inteira
+    colunas = None
+    rotulos: List[str] = []
+    for bloco in _iterar_blocos_planilha(contents):
+        if colunas is None:
+            rotulos = list(bloco.columns)
+            lookup = {str(col).strip().upper(): pos for pos, col in enumerate(rotulos)}
+            posicoes = {lookup[nome] for nome in PREDICATE_COLUMN_CANDIDATES if nome in lookup}
+            posicoes.update(pos for pos in PREDICATE_COLUMN_POSITIONS if pos < len(rotulos))
+            colunas = [rotulos[pos] for pos in sorted(posicoes)]
+        if not rotulos:
+            return pd.DataFrame()
+
+        predicado = bloco[colunas]
+        predicado.attrs["colunas_planilha"] = rotulos
+        mascara = candidatas(predicado)
+        predicados.append(predicado)
+        amostras.append(bloco.iloc[:1].copy())
+        completas.append(bloco if mascara is None else bloco[mascara])
+
+    df_pred = _aplicar_schema(pd.concat(predicados))
+    df_pred.attrs["colunas_planilha"] = rotulos
+    _guardar_ocorrencias(df_pred, ocorrencias)
+    linhas = filtrar(df_pred).index
+
+    tipos = pd.concat(amostras).dtypes
+    df = pd.concat([parte for parte in completas if len(parte)] or completas[:1]).loc[linhas]
+    divergentes = {col: tipo for col, tipo in tipos.items() if df[col].dtype != tipo}
+    if divergentes:
+        df = df.astype(divergentes)
+    return _aplicar_schema(df.reset_index(drop=True))
+
+
+def _aplicar_filtros_contratos(
+    df: pd.DataFrame,
+    normalized_filter: str,
+    period_filter_enabled: bool,
+    reference_date: Optional[str],
+    months_back: int,
+    tipo_arquivo: Optional[str],
+    bank_lower: str,
+    habitacional_filter_enabled: bool,
+    habitacional_reference_date: Optional[str],
+    habitacional_months_back: int,
+    minas_caixa_3026_15_filter_enabled: bool,
+    minas_caixa_3026_15_reference_date: Optional[str],
+    minas_caixa_3026_15_months_back: int,
+    filtros_leitura: bool = True
+) -> pd.DataFrame:
+    """
+    Sequência de filtros de filtrar_planilha_contratos.
+    Com filtros_leitura=False, auditado, período e DEST não são aplicados
+    (a leitura em streaming já os aplicou).
+    As colunas são resolvidas uma vez e o mesmo esquema é usado por todos os filtros.
+    Os filtros só contribuem máscaras (PlanoFiltros): as linhas que sobram são
+    copiadas uma única vez, no final.
+    """
+    esquema = EsquemaColunas.resolver(df)
+    datas = DatasConvertidas()
+    plano = PlanoFiltros(df)
+
+    if filtros_leitura:
+        # Aplicar filtro de auditado/não auditado (sempre aplicado conforme seleção)
+        plano.filtrar("filtro_auditado", _mascara_auditoria, normalized_filter, esquema)
+
+        # Aplicar filtro de período APENAS se habilitado pelo usuário
+        if period_filter_enabled:
+            plano.filtrar(
+                "filtro_periodo", _mascara_periodo,
+                period_filter_enabled, reference_date, months_back, esquema, datas
+            )
     
     # Aplicar filtro de Data Habitacional para 3026-11
-    if "3026-11" in filename_upper and habitacional_filter_enabled:
-        if bank_lower == "bemge":
-            # BEMGE: coluna W (índice 22)
-            df = _apply_habitacional_filter(
-                df, 
-                habitacional_reference_date, 
-                habitacional_months_back,
-                column_index=22
-            )
-        elif bank_lower == "minas_caixa":
-            # MINAS CAIXA: coluna Y (índice 24)
-            df = _apply_habitacional_filter(
-                df, 
-                habitacional_reference_date, 
+    if tipo_arquivo == TIPO_3026_11 and habitacional_filter_enabled:
+        # BEMGE: coluna W (índice 22); MINAS CAIXA: coluna Y (índice 24)
+        column_index = {"bemge": 22, "minas_caixa": 24}.get(bank_lower)
+        if column_index is not None:
+            plano.filtrar(
+                "filtro_habitacional",
+                _mascara_habitacional,
+                habitacional_reference_date,
                 habitacional_months_back,
-                column_index=24
+                column_index=column_index,
+                esquema=esquema,
+                datas=datas
             )
     
     # Aplicar filtros específicos para 3026-15
-    if "3026-15" in filename_upper:
+    if tipo_arquivo == TIPO_3026_15:
         if bank_lower == "minas_caixa":
-            # MINAS CAIXA: Remove horas e aplica filtro coluna AB
-            df = _apply_minas_caixa_3026_15_filters(
-                df,
+            # MINAS CAIXA: Remove horas (no resultado final) e aplica filtro coluna AB
+            normalizadas = _datas_sem_hora_3026_15(df, esquema, datas)
+            plano.substituir_colunas(normalizadas)
+            plano.filtrar(
+                "filtro_3026_15",
+                _mascara_coluna_ab,
                 minas_caixa_3026_15_reference_date if minas_caixa_3026_15_filter_enabled else None,
-                minas_caixa_3026_15_months_back if minas_caixa_3026_15_filter_enabled else 0
+                minas_caixa_3026_15_months_back if minas_caixa_3026_15_filter_enabled else 0,
+                esquema,
+                datas,
+                normalizadas
             )
         elif bank_lower == "bemge":
-            # BEMGE: Aplica filtro coluna AB (últimos 2 meses) se habilitado
+            # BEMGE: Aplica filtro coluna AB (últimos 2 meses) se habilitado, sem remover horas
             if minas_caixa_3026_15_filter_enabled and minas_caixa_3026_15_reference_date:
-                # Aplica apenas filtro de data na coluna AB (sem remover horas)
-                if len(df.columns) > 27:  # Coluna AB é índice 27
-                    ab_col = df.columns[27]
-                    end_date = _parse_reference_date(minas_caixa_3026_15_reference_date)
-                    months_back = max(minas_caixa_3026_15_months_back, 0)
-                    start_date = end_date - pd.DateOffset(months=months_back)
-                    
-                    parsed_dates = pd.to_datetime(df[ab_col], errors="coerce")
-                    mask = (
-                        parsed_dates.notna()
-                        & (parsed_dates >= start_date)
-                        & (parsed_dates <= end_date)
-                    )
-                    df = df[mask].copy()
+                plano.filtrar(
+                    "filtro_3026_15",
+                    _mascara_coluna_ab,
+                    minas_caixa_3026_15_reference_date,
+                    minas_caixa_3026_15_months_back,
+                    esquema,
+                    datas
+                )
     
     # Aplicar filtros específicos do arquivo (sem remover duplicados)
-    df = _apply_file_specific_filters(df, filename, bank_lower)
+    if filtros_leitura:
+        plano.filtrar("filtro_arquivo", _mascara_arquivo, tipo_arquivo, bank_lower, esquema)
+
+    return plano.aplicar()
+
+
+def filtrar_planilha_contratos(
+    contents: Planilha,
+    filter_type: str,
+    period_filter_enabled: bool,
+    reference_date: Optional[str],
+    months_back: int,
+    filename: str,
+    bank_type: Optional[str] = None,
+    habitacional_filter_enabled: bool = False,
+    habitacional_reference_date: Optional[str] = None,
+    habitacional_months_back: int = 2,
+    minas_caixa_3026_15_filter_enabled: bool = False,
+    minas_caixa_3026_15_reference_date: Optional[str] = None,
+    minas_caixa_3026_15_months_back: int = 2,
+    streaming_reader: bool = False,
+    column_projection: bool = False,
+    use_cache: bool = False,
+    motor: str = MOTOR_PANDAS,
+    tipo_arquivo: Optional[str] = None,
+    ocorrencias: Optional[list] = None
+) -> pd.DataFrame:
+    """
+    Filtra planilha de contratos.
+    IMPORTANTE: Não remove duplicados automaticamente - mantém todos os dados originais.
+    Aplica apenas os filtros explicitamente habilitados pelo usuário.
+    Com streaming_reader=True a planilha é lida em blocos e os filtros de auditado,
+    período e DEST são aplicados durante a leitura.
+    column_projection=True é um modo da leitura em blocos (só vale com
+    streaming_reader=True): de cada bloco ficam só as colunas usadas pelos filtros
+    e, da largura completa, só as linhas que podem sobrar (_ler_planilha_projetada).
+    Sem streaming_reader a planilha é lida inteira, com ou sem column_projection.
+    Com use_cache=True a planilha XLSX inteira (lida e com os tipos da leitura) fica
+    no cache em disco, indexada só pelo conteúdo: um reenvio do mesmo arquivo, com
+    quaisquer opções, não lê a planilha e só roda os filtros. Na primeira vez ela é
+    lida inteira (em blocos com streaming_reader=True), sem a projeção de colunas.
+    Arquivos CSV e Parquet são lidos inteiros pelo leitor colunar, sem os modos de
+    leitura e sem o cache (que existem para contornar o custo do XLSX).
+    `motor` escolhe a representação das colunas durante os filtros (MOTORES);
+    o resultado é o mesmo nos dois.
+    `tipo_arquivo` (3026-11/12/15) escolhe os filtros específicos; sem ele, o tipo
+    vem do arquivo (identificacao_planilha.identificar) e, se não puder ser
+    identificado, só os filtros gerais são aplicados.
+    Com `ocorrencias` (lista), recebe os contratos de todas as linhas lidas, antes
+    dos filtros, para o índice de contratos (ver com_ocorrencias).
+    """
+    normalized_filter = (filter_type or "todos").lower()
+    bank_lower = (bank_type or "").lower()
+    if tipo_arquivo is None:
+        tipo_arquivo = identificacao_planilha.identificar(contents, filename).tipo
+    filtros = dict(
+        normalized_filter=normalized_filter,
+        period_filter_enabled=period_filter_enabled,
+        reference_date=reference_date,
+        months_back=months_back,
+        tipo_arquivo=tipo_arquivo,
+        bank_lower=bank_lower,
+        habitacional_filter_enabled=habitacional_filter_enabled,
+        habitacional_reference_date=habitacional_reference_date,
+        habitacional_months_back=habitacional_months_back,
+        minas_caixa_3026_15_filter_enabled=minas_caixa_3026_15_filter_enabled,
+        minas_caixa_3026_15_reference_date=minas_caixa_3026_15_reference_date,
+        minas_caixa_3026_15_months_back=minas_caixa_3026_15_months_back,
+    )
+
+    def _filtrar_no_motor(df: pd.DataFrame, **opcoes) -> pd.DataFrame:
+        return _com_motor(df, motor, lambda df_motor: _aplicar_filtros_contratos(df_motor, **opcoes, **filtros))
+
+    def _candidatas(df: pd.DataFrame) -> Optional[np.ndarray]:
+        # Os filtros da sequência que decidem linha a linha (auditado e DEST)
+        esquema = EsquemaColunas.resolver(df)
+        return _combinar_mascaras(
+            _mascara_auditoria(df, None, normalized_filter, esquema),
+            _mascara_arquivo(df, None, tipo_arquivo, bank_lower, esquema),
+        )
+
+    def _ler_xlsx() -> pd.DataFrame:
+        if streaming_reader and column_projection:
+            # Os filtros rodam dentro da leitura e são medidos dentro dela
+            df = _medir_leitura(contents, lambda: _ler_planilha_projetada(
+                contents, _filtrar_no_motor, _candidatas, ocorrencias
+            ))
+            if tipo_arquivo == TIPO_3026_15 and bank_lower == "minas_caixa":
+                # A remoção de horas das colunas S..AL vale para a largura completa
+                df = metricas.medir_filtro("filtro_3026_15", _apply_minas_caixa_3026_15_filters, df, None, 0)
+            return df
+        if streaming_reader:
+            # Auditado, período e DEST (3026-12) já saem aplicados da leitura
+            df = _medir_leitura(contents, lambda: _ler_planilha_streaming(
+                contents,
+                normalized_filter,
+                period_filter_enabled,
+                reference_date,
+                months_back,
+                tipo_arquivo == TIPO_3026_12,
+                ocorrencias
+            ))
+            return _filtrar_no_motor(df, filtros_leitura=False)
+        df = _ler_planilha_completa(contents, False)
+        _guardar_ocorrencias(df, ocorrencias)
+        return _filtrar_no_motor(df)
+
+    formato = leitura_colunar.detectar_formato(contents, filename)
+    if formato != leitura_colunar.FORMATO_XLSX:
+        df = _medir_leitura(contents, lambda: _ler_planilha_colunar(contents, formato, motor))
+        _guardar_ocorrencias(df, ocorrencias)
+        df = _filtrar_no_motor(df)
+    elif use_cache:
+        # O cache guarda a planilha inteira; os filtros rodam sobre ela a cada envio
+        df = _com_cache(contents, lambda: _ler_planilha_completa(contents, streaming_reader))
+        _guardar_ocorrencias(df, ocorrencias)
+        df = _filtrar_no_motor(df)
+    else:
+        df = _ler_xlsx()
 
     return adicionar_coluna_banco(df, bank_lower)
 
 
+ABAS_3026_12 = ["todos", "aud", "naud", "period_todos", "period_aud", "period_naud"]
+
+
+@dataclass
+class Abas3026_12:
+    """
+    Base filtrada do 3026-12 (já com a coluna BANCO) e as posições das linhas de
+    cada aba. As abas não são copiadas: use aba() só quando precisar do DataFrame.
+    No modo delta, `alteracoes` traz as mudanças desde a extração anterior e
+    `resumo_delta` o resumo desta extração, que o chamador guarda
+    (delta_extracoes.guardar) depois de gravar o relatório.
+    """
+    base: pd.DataFrame
+    linhas: Dict[str, np.ndarray]
+    alteracoes: Optional[pd.DataFrame] = None
+    resumo_delta: Optional[pd.DataFrame] = None
+
+    def aba(self, chave: str) -> pd.DataFrame:
+        return self.base.take(self.linhas[chave])
+
+    def materializar(self) -> dict:
+        return {chave: self.aba(chave) for chave in ABAS_3026_12}
+
+
+def _mascara_periodo_3026_12(
+    df: pd.DataFrame,
+    reference_date: Optional[str],
+    months_back: int,
+    esquema: Optional[EsquemaColunas] = None
+) -> np.ndarray:
+    """
+    Máscara das linhas de "Últimos 2 Meses", com a mesma regra de _apply_period_filter:
+    sem coluna de data ou sem nenhuma data válida, todas as linhas entram.
+    """
+    todas = np.ones(len(df), dtype=bool)
+    date_column = _esquema(df, esquema).periodo
+    if not date_column:
+        return todas
+    try:
+        end_date = _parse_reference_date(reference_date)
+        start_date = end_date - pd.DateOffset(months=max(months_back, 0))
+        parsed_dates = _converter_datas(df[date_column])
+        if parsed_dates.notna().sum() == 0:
+            return todas
+        return (
+            parsed_dates.notna()
+            & (parsed_dates >= start_date)
+            & (parsed_dates <= end_date)
+        ).to_numpy()
+    except Exception:
+        return todas
+
+
+def particionar_3026_12(
+    df: pd.DataFrame,
+    bank_type: str,
+    period_filter_enabled: bool = False,
+    reference_date: Optional[str] = None,
+    months_back: int = 2
+) -> Abas3026_12:
+    """
+    Divide a base do 3026-12 nas seis abas em uma única passada: os códigos de
+    auditoria e as datas são calculados uma vez e cada aba vira um array de posições.
+    """
+    base = df.copy(deep=False)  # Só a nova coluna BANCO é alocada
+    if not base.empty and "BANCO" not in base.columns:
+        base["BANCO"] = _coluna_constante(bank_type.upper() if bank_type else "", len(base))
+
+    esquema = EsquemaColunas.resolver(base)
+    codigos = _codigos_auditoria(base, esquema)
+    mask_aud = codigos == AUDIT_CODIGO_AUD
+    mask_naud = codigos == AUDIT_CODIGO_NAUD
+    if period_filter_enabled and reference_date:
+        mask_period = _mascara_periodo_3026_12(base, reference_date, months_back, esquema)
+    else:
+        mask_period = np.zeros(len(base), dtype=bool)
+
+    linhas = {
+        "todos": np.arange(len(base)),
+        "aud": np.flatnonzero(mask_aud),
+        "naud": np.flatnonzero(mask_naud),
+        "period_todos": np.flatnonzero(mask_period),
+        "period_aud": np.flatnonzero(mask_period & mask_aud),
+        "period_naud": np.flatnonzero(mask_period & mask_naud),
+    }
+    return Abas3026_12(base=base, linhas=linhas)
+
+
 def processar_3026_12_com_abas(
-    contents: bytes,
+    contents: Planilha,
     bank_type: str,
     filter_type: str,
     period_filter_enabled: bool = False,
     reference_date: Optional[str] = None,
-    months_back: int = 2
-) -> dict:
+    months_back: int = 2,
+    streaming_reader: bool = False,
+    column_projection: bool = False,
+    use_cache: bool = False,
+    delta: bool = False,
+    filename: Optional[str] = None,
+    motor: str = MOTOR_PANDAS,
+    data_extracao: Optional[str] = None,
+    ocorrencias: Optional[list] = None
+) -> Abas3026_12:
     """
-    Processa o arquivo 3026-12 e retorna DataFrames organizados por aba.
-    Retorna todas as variantes necessárias (todos, aud, naud e últimos 2 meses).
+    Processa o arquivo 3026-12 e retorna a base com as linhas de cada aba.
+    Contém todas as variantes necessárias (todos, aud, naud e últimos 2 meses).
+    Com delta=True e a `data_extracao` (AAAA-MM-DD), compara a base filtrada com a
+    última extração do mesmo banco com data anterior (ver delta_extracoes.py). Nada
+    é guardado aqui: o resumo volta em `resumo_delta`.
+    `filename` ajuda a reconhecer CSV/Parquet quando o conteúdo não basta.
+    `motor` escolhe a representação das colunas durante os filtros (MOTORES).
+    Modos de leitura, cache e `ocorrencias` seguem filtrar_planilha_contratos.
     """
-    df = pd.read_excel(io.BytesIO(contents), engine="openpyxl")
-    df = _apply_3026_12_filters(df)
-    df_base = df.copy()
+    def _filtrar_no_motor(df: pd.DataFrame) -> pd.DataFrame:
+        return _com_motor(
+            df, motor, lambda df_motor: metricas.medir_filtro("filtro_3026_12", _apply_3026_12_filters, df_motor)
+        )
 
-    audit_col = _find_column(df_base, AUDIT_COLUMN_CANDIDATES)
-    mask_aud = pd.Series(False, index=df_base.index)
-    mask_naud = pd.Series(False, index=df_base.index)
+    def _ler_xlsx() -> pd.DataFrame:
+        if streaming_reader and column_projection:
+            return _medir_leitura(contents, lambda: _ler_planilha_projetada(
+                contents, _filtrar_no_motor, _mascara_3026_12, ocorrencias
+            ))
+        if streaming_reader:
+            # Apenas os filtros de DEST descartam linhas; as abas são recortes da base
+            return _medir_leitura(
+                contents,
+                lambda: _ler_planilha_streaming(contents, "todos", False, None, months_back, True, ocorrencias)
+            )
+        df = _ler_planilha_completa(contents, False)
+        _guardar_ocorrencias(df, ocorrencias)
+        return _filtrar_no_motor(df)
+
+    formato = leitura_colunar.detectar_formato(contents, filename)
+    if formato != leitura_colunar.FORMATO_XLSX:
+        df = _medir_leitura(contents, lambda: _ler_planilha_colunar(contents, formato, motor))
+        _guardar_ocorrencias(df, ocorrencias)
+        df = _filtrar_no_motor(df)
+    elif use_cache:
+        # Mesma entrada do cache de filtrar_planilha_contratos: a planilha inteira
+        df = _com_cache(contents, lambda: _ler_planilha_completa(contents, streaming_reader))
+        _guardar_ocorrencias(df, ocorrencias)
+        df = _filtrar_no_motor(df)
+    else:
+        df = _ler_xlsx()
 
-    if audit_col in df_base.columns:
-        values = df_base[audit_col].astype(str).str.upper().str.strip()
-        mask_aud = values.isin({"AUD", "AUDI"})
-        mask_naud = values == "NAUD"
+    with metricas.etapa("particionar_3026_12", linhas_entrada=len(df)) as registro:
+        abas = particionar_3026_12(df, bank_type, period_filter_enabled, reference_date, months_back)
+        registro.linhas_saida = len(abas.base)
 
-    df_aud = df_base[mask_aud].copy()
-    df_naud = df_base[mask_naud].copy()
+    if delta and data_extracao and "CONTRATO" in df.columns:
+        with metricas.etapa("delta_3026_12", linhas_entrada=len(df)) as registro:
+            abas.resumo_delta = delta_extracoes.resumo_extracao(df)
+            abas.alteracoes = _alteracoes_3026_12(abas.base, abas.resumo_delta, bank_type, data_extracao)
+            registro.linhas_saida = len(abas.alteracoes)
+    return abas
 
-    if period_filter_enabled and reference_date:
-        df_period_base = _apply_period_filter(df_base, True, reference_date, months_back)
-        period_mask = df_period_base.index
-        period_values = (
-            df_period_base[audit_col].astype(str).str.upper().str.strip()
-            if audit_col in df_period_base.columns
-            else pd.Series([], dtype=str)
-        )
-        df_period_aud = df_period_base[df_period_base.index.isin(period_mask) & period_values.isin({"AUD", "AUDI"})].copy()
-        df_period_naud = df_period_base[df_period_base.index.isin(period_mask) & (period_values == "NAUD")].copy()
-    else:
-        df_period_base = pd.DataFrame(columns=df_base.columns)
-        df_period_aud = pd.DataFrame(columns=df_base.columns)
-        df_period_naud = pd.DataFrame(columns=df_base.columns)
-
-    results = {
-        "todos": adicionar_coluna_banco(df_base, bank_type),
-        "aud": adicionar_coluna_banco(df_aud, bank_type),
-        "naud": adicionar_coluna_banco(df_naud, bank_type),
-        "period_todos": adicionar_coluna_banco(df_period_base, bank_type),
-        "period_aud": adicionar_coluna_banco(df_period_aud, bank_type),
-        "period_naud": adicionar_coluna_banco(df_period_naud, bank_type),
-    }
 
-    return results
+def _alteracoes_3026_12(
+    base: pd.DataFrame,
+    atual: pd.DataFrame,
+    bank_type: str,
+    data_extracao: str
+) -> pd.DataFrame:
+    """
+    Linhas novas/alteradas e contratos removidos desde a última extração 3026-12 do
+    banco anterior a `data_extracao`. `atual` é o resumo (hash calculado sem a
+    coluna BANCO) e as linhas do resultado vêm de `base`.
+    """
+    anterior = delta_extracoes.carregar_anterior(bank_type or "", TIPO_3026_12, data_extracao)
+    if anterior is None:
+        return pd.DataFrame({"Mensagem": ["Nenhuma extração anterior para comparar"]})
+    data_anterior, resumo_anterior = anterior
+    alteracoes = delta_extracoes.comparar(base, atual, resumo_anterior)
+    if alteracoes.empty:
+        return pd.DataFrame({"Mensagem": [f"Nenhuma alteração desde a extração de {data_anterior}"]})
+    return alteracoes
 
 
 def concatenar_dataframes(dataframes: List[pd.DataFrame]) -> pd.DataFrame:
@@ -490,40 +1421,42 @@ def adicionar_coluna_banco(df: pd.DataFrame, bank_lower: Optional[str]) -> pd.Da
     if df is None or df.empty:
         return df
 
-    resultado = df.copy()
+    resultado = df.copy(deep=False)  # Só a nova coluna BANCO é alocada
     if "BANCO" not in resultado.columns:
         banco_nome = bank_lower.upper() if bank_lower else None
-        resultado["BANCO"] = banco_nome or ""
+        resultado["BANCO"] = _coluna_constante(banco_nome or "", len(resultado))
     return resultado
 
 
-def gerar_resumo_geral(df: pd.DataFrame, total_arquivos: int) -> pd.DataFrame:
+@dataclass
+class AbasResumo:
+    resumo_geral: pd.DataFrame
+    contratos_repetidos: pd.DataFrame
+    contratos_por_banco: pd.DataFrame
+
+
+def gerar_resumos(partes: List[pd.DataFrame], total_arquivos: int) -> AbasResumo:
     """
-    Gera um resumo com totais gerais, auditados, não auditados e repetidos.
+    Gera as abas de resumo geral, contratos repetidos e contratos por banco em uma
+    passada. Cada parte (base do 3026-12, demais arquivos...) entra uma única vez:
+    só as colunas CONTRATO, BANCO e VALOR são juntadas, e os códigos de auditoria e a
+    contagem por contrato são calculados uma vez para as três abas.
     """
-    total_contratos = len(df)
-    audit_col = _find_column(df, AUDIT_COLUMN_CANDIDATES)
-    total_aud = 0
-    total_naud = 0
-    if audit_col and not df.empty:
-        valores = df[audit_col].astype(str).str.upper().str.strip()
-        total_aud = int(valores.isin({"AUD", "AUDI"}).sum())
-        total_naud = int((valores == "NAUD").sum())
-
-    total_repetidos = int(df[df.duplicated(subset=["CONTRATO"], keep=False)].shape[0]) if "CONTRATO" in df.columns else 0
+    colunas = [coluna for coluna in ("CONTRATO", "BANCO", "VALOR") if any(coluna in parte.columns for parte in partes)]
+    dados = concatenar_dataframes([parte[[coluna for coluna in colunas if coluna in parte.columns]] for parte in partes])
+    codigos = np.concatenate([_codigos_auditoria(parte) for parte in partes]) if partes else np.zeros(0, dtype=np.int8)
+
+    if "CONTRATO" in dados.columns:
+        # Mesma regra do df.duplicated: contratos vazios (NaN) também se repetem entre si
+        codigos_contrato, _ = pd.factorize(dados["CONTRATO"], use_na_sentinel=False)
+        quantidade = np.bincount(codigos_contrato)[codigos_contrato]
+        repetido = quantidade > 1
+    else:
+        repetido = np.zeros(len(dados), dtype=bool)
 
     valor_total = 0
-    if "VALOR" in df.columns:
-        valor_total = pd.to_numeric(df["VALOR"], errors="coerce").sum()
-
-    valores_resumo = [
-        total_arquivos,
-        total_contratos,
-        total_aud,
-        total_naud,
-        total_repetidos,
-        f"R$ {valor_total:,.2f}" if valor_total and not pd.isna(valor_total) else "N/A"
-    ]
+    if "VALOR" in dados.columns:
+        valor_total = pd.to_numeric(dados["VALOR"], errors="coerce").sum()
 
     resumo = pd.DataFrame({
         "Métrica": [
@@ -534,39 +1467,60 @@ def gerar_resumo_geral(df: pd.DataFrame, total_arquivos: int) -> pd.DataFrame:
             "Contratos Repetidos",
             "Valor Total"
         ],
-        "Valor": valores_resumo
+        "Valor": [
+            total_arquivos,
+            len(dados),
+            int((codigos == AUDIT_CODIGO_AUD).sum()),
+            int((codigos == AUDIT_CODIGO_NAUD).sum()),
+            int(repetido.sum()),
+            f"R$ {valor_total:,.2f}" if valor_total and not pd.isna(valor_total) else "N/A"
+        ]
     })
-    return resumo
 
+    if "CONTRATO" not in dados.columns:
+        repetidos = pd.DataFrame({"Mensagem": ["Coluna 'CONTRATO' ausente para identificar repetidos"]})
+    elif not repetido.any():
+        repetidos = pd.DataFrame({"Mensagem": ["Nenhum contrato repetido encontrado"]})
+    else:
+        repetidos = dados[repetido].copy()
+        # Como o groupby().transform("count"): contratos vazios ficam sem quantidade
+        contrato_vazio = repetidos["CONTRATO"].isna().to_numpy()
+        quantidade_repetidos = quantidade[repetido]
+        if contrato_vazio.any():
+            quantidade_repetidos = np.where(contrato_vazio, np.nan, quantidade_repetidos)
+        repetidos["QUANTIDADE"] = quantidade_repetidos
+        colunas_repetidos = ["CONTRATO"] + (["BANCO"] if "BANCO" in repetidos.columns else []) + ["QUANTIDADE"]
+        if "VALOR" in repetidos.columns:
+            colunas_repetidos.append("VALOR")
+        repetidos = repetidos[colunas_repetidos]
+
+    if "BANCO" not in dados.columns:
+        por_banco = pd.DataFrame({"Mensagem": ["Coluna 'BANCO' ausente para agrupar os contratos"]})
+    elif "CONTRATO" not in dados.columns:
+        # Planilhas fora do layout 3026 (sequência genérica): conta as linhas
+        por_banco = dados.groupby("BANCO", observed=True).size().reset_index(name="TOTAL_CONTRATOS")
+    else:
+        por_banco = dados.groupby("BANCO", observed=True).agg(TOTAL_CONTRATOS=("CONTRATO", "count")).reset_index()
 
-def gerar_contratos_repetidos(df: pd.DataFrame) -> pd.DataFrame:
+    return AbasResumo(resumo_geral=resumo, contratos_repetidos=repetidos, contratos_por_banco=por_banco)
+
+
+def gerar_resumo_geral(df: pd.DataFrame, total_arquivos: int) -> pd.DataFrame:
     """
-    Retorna apenas os contratos duplicados com coluna de quantidade e informações relevantes.
+    Gera um resumo com totais gerais, auditados, não auditados e repetidos.
     """
-    if "CONTRATO" not in df.columns:
-        return pd.DataFrame({"Mensagem": ["Coluna 'CONTRATO' ausente para identificar repetidos"]})
-
-    repetidos = df[df.duplicated(subset=["CONTRATO"], keep=False)].copy()
-    if repetidos.empty:
-        return pd.DataFrame({"Mensagem": ["Nenhum contrato repetido encontrado"]})
+    return gerar_resumos([df], total_arquivos).resumo_geral
 
-    repetidos["QUANTIDADE"] = repetidos.groupby("CONTRATO")["CONTRATO"].transform("count")
-    colunas = ["CONTRATO"]
-    if "BANCO" in repetidos.columns:
-        colunas.append("BANCO")
-    colunas.append("QUANTIDADE")
-    if "VALOR" in repetidos.columns:
-        colunas.append("VALOR")
 
-    return repetidos[colunas]
+def gerar_contratos_repetidos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Retorna apenas os contratos duplicados com coluna de quantidade e informações relevantes.
+    """
+    return gerar_resumos([df], 0).contratos_repetidos
 
 
 def gerar_contratos_por_banco(df: pd.DataFrame) -> pd.DataFrame:
     """
     Agrupa os contratos por banco e soma o número de contratos.
     """
-    if "BANCO" not in df.columns:
-        return pd.DataFrame({"Mensagem": ["Coluna 'BANCO' ausente para agrupar os contratos"]})
-
-    agrupado = df.groupby("BANCO").agg(TOTAL_CONTRATOS=("CONTRATO", "count")).reset_index()
-    return agrupado
+    return gerar_resumos([df], 0).contratos_por_banco
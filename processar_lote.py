@@ -0,0 +1,265 @@
+"""
+Processamento em lote das extrações 3026, sem passar pelo servidor.
+
+Recebe diretórios, arquivos ou padrões glob (XLSX, CSV ou Parquet) e as mesmas
+opções do /processar_contratos/. Cada arquivo vira um relatório próprio no
+diretório de saída, como se fosse enviado sozinho ao endpoint. A saída repete os
+subdiretórios das entradas (a partir do diretório comum a todas), então arquivos
+de mesmo nome em pastas diferentes não se sobrescrevem. Os arquivos são
+processados em paralelo (--jobs processos) e, no final, é mostrado o
+throughput de cada um.
+
+Uso:
+    python processar_lote.py extracoes/ --banco bemge --saida relatorios/
+    python processar_lote.py "extracoes/*BEMGE*" --saida relatorios/   # banco pelo arquivo
+    python processar_lote.py "extracoes/*3026-11*" --banco minas_caixa \\
+        --filtro auditado --habitacional --data-habitacional 2025-10-01 --jobs 4
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import identificacao_planilha
+import metricas
+from escrita_excel import FORMATOS_SAIDA
+from identificacao_planilha import TIPO_3026_12
+from processar_contratos import (
+    MOTOR_PANDAS,
+    MOTORES,
+    adicionar_coluna_banco,
+    filtrar_planilha_contratos,
+    processar_3026_12_com_abas,
+)
+from relatorios import escrever_relatorio, escrever_relatorio_3026_12
+
+EXTENSOES_ENTRADA = (".xlsx", ".xlsm", ".csv", ".parquet")
+
+# Mesmos modos de leitura do servidor: em blocos (streaming) e, nela, com projeção de colunas
+LEITURA_STREAMING = os.environ.get("LEITURA_STREAMING", "true").lower() == "true"
+LEITURA_PROJECAO_COLUNAS = os.environ.get("LEITURA_PROJECAO_COLUNAS", "true").lower() == "true"
+
+
+@dataclass
+class ResultadoArquivo:
+    entrada: str
+    saida: Optional[str]
+    segundos: float
+    bytes_entrada: int
+    linhas_lidas: Optional[int]
+    linhas_saida: int
+    erro: Optional[str] = None
+
+
+def listar_entradas(entradas: List[str]) -> List[str]:
+    """Arquivos de entrada, sem repetição, na ordem em que foram informados."""
+    arquivos = []
+    vistos = set()  # O mesmo arquivo por caminhos diferentes (ex.: "a/x.xlsx" e "./a/x.xlsx")
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = sorted(
+                os.path.join(entrada, nome)
+                for nome in os.listdir(entrada)
+                if nome.lower().endswith(EXTENSOES_ENTRADA)
+            )
+        elif os.path.isfile(entrada):
+            candidatos = [entrada]
+        else:
+            candidatos = sorted(glob.glob(entrada))
+        for caminho in candidatos:
+            absoluto = os.path.abspath(caminho)
+            if os.path.isfile(caminho) and not os.path.basename(caminho).startswith("~$") and absoluto not in vistos:
+                vistos.add(absoluto)
+                arquivos.append(caminho)
+    return arquivos
+
+
+def caminhos_saida(arquivos: List[str], saida: str, formato: str) -> Dict[str, str]:
+    """
+    Relatório de cada arquivo: <saida>/<subdiretório relativo>/<nome>_FILTRADO.<ext>.
+    Entradas do mesmo diretório que só diferem na extensão (ex.: .xlsx e .csv)
+    levam a extensão no nome.
+    """
+    pastas = [os.path.dirname(os.path.abspath(arquivo)) for arquivo in arquivos]
+    raiz = os.path.commonpath(pastas) if pastas else ""
+    extensao_saida = FORMATOS_SAIDA[formato][0]
+
+    def _sem_extensao(arquivo: str, pasta: str) -> str:
+        return os.path.join(os.path.relpath(pasta, raiz), os.path.splitext(os.path.basename(arquivo))[0])
+
+    bases = [_sem_extensao(arquivo, pasta) for arquivo, pasta in zip(arquivos, pastas)]
+    repetidas = {base for base in bases if bases.count(base) > 1}
+    caminhos = {}
+    for arquivo, base in zip(arquivos, bases):
+        if base in repetidas:
+            base = f"{base}_{os.path.splitext(arquivo)[1].lstrip('.').lower()}"
+        caminhos[arquivo] = os.path.normpath(os.path.join(saida, f"{base}_FILTRADO{extensao_saida}"))
+    return caminhos
+
+
+def _linhas_lidas(registros: List[metricas.RegistroEtapa]) -> Optional[int]:
+    """
+    Linhas do arquivo segundo as etapas medidas. Na leitura com projeção os filtros
+    rodam dentro da leitura, então o total aparece na entrada do primeiro filtro.
+    """
+    contagens = [registro.linhas_entrada for registro in registros]
+    contagens += [registro.linhas_saida for registro in registros if registro.etapa == "leitura"]
+    contagens = [contagem for contagem in contagens if contagem is not None]
+    return max(contagens) if contagens else None
+
+
+def processar_arquivo(entrada: str, caminho_saida: str, args: argparse.Namespace) -> ResultadoArquivo:
+    """Lê, filtra e grava o relatório de um arquivo em `caminho_saida` (roda no processo do pool)."""
+    nome = os.path.basename(entrada)
+    filter_lower = args.filtro
+    inicio = time.perf_counter()
+
+    def _executar() -> int:
+        # Sem tipo identificado o arquivo segue pela sequência genérica; com o banco
+        # contradito pela aba, termina com erro, sem relatório
+        identificacao = identificacao_planilha.identificar(entrada, nome)
+        tipo_arquivo = identificacao.tipo
+        bank_lower = identificacao_planilha.banco_do_arquivo(identificacao, args.banco, nome)
+        if tipo_arquivo == TIPO_3026_12:
+            abas = processar_3026_12_com_abas(
+                entrada,
+                bank_lower,
+                filter_lower,
+                args.periodo,
+                args.data_referencia,
+                args.meses,
+                streaming_reader=LEITURA_STREAMING,
+                column_projection=LEITURA_PROJECAO_COLUNAS,
+                filename=nome,
+                motor=args.motor,
+            )
+            escrever_relatorio_3026_12(
+                caminho_saida, [nome], [abas], bank_lower, bank_lower == "minas_caixa", formato=args.formato
+            )
+            return len(abas.base)
+
+        df = filtrar_planilha_contratos(
+            entrada,
+            filter_lower,
+            args.periodo,
+            args.data_referencia,
+            args.meses,
+            nome,
+            bank_lower,
+            args.habitacional,
+            args.data_habitacional,
+            args.meses_habitacional,
+            args.filtro_3026_15,
+            args.data_3026_15,
+            args.meses_3026_15,
+            streaming_reader=LEITURA_STREAMING,
+            column_projection=LEITURA_PROJECAO_COLUNAS,
+            motor=args.motor,
+            tipo_arquivo=tipo_arquivo,
+        )
+        if df.empty:
+            raise ValueError("Nenhum dado encontrado após aplicar os filtros")
+        escrever_relatorio(caminho_saida, adicionar_coluna_banco(df, bank_lower), 1, formato=args.formato)
+        return len(df)
+
+    try:
+        linhas_saida, registros = metricas.executar_medindo(nome, _executar)
+    except Exception as exc:
+        if os.path.exists(caminho_saida):
+            os.remove(caminho_saida)
+        return ResultadoArquivo(
+            entrada, None, time.perf_counter() - inicio, os.path.getsize(entrada), None, 0, str(exc)
+        )
+
+    return ResultadoArquivo(
+        entrada=entrada,
+        saida=caminho_saida,
+        segundos=time.perf_counter() - inicio,
+        bytes_entrada=os.path.getsize(entrada),
+        linhas_lidas=_linhas_lidas(registros),
+        linhas_saida=linhas_saida,
+    )
+
+
+def imprimir_resumo(resultados: List[ResultadoArquivo], segundos_total: float) -> None:
+    print()
+    print(f"{'arquivo':<40} {'MB':>8} {'linhas lidas':>13} {'linhas saída':>13} {'s':>8} {'linhas/s':>10} {'MB/s':>7}")
+    for resultado in resultados:
+        nome = os.path.basename(resultado.entrada)[:40]
+        mb = resultado.bytes_entrada / 2**20
+        if resultado.erro:
+            print(f"{nome:<40} {mb:8.1f}  ERRO: {resultado.erro}")
+            continue
+        lidas = resultado.linhas_lidas if resultado.linhas_lidas is not None else resultado.linhas_saida
+        print(
+            f"{nome:<40} {mb:8.1f} {lidas:13d} {resultado.linhas_saida:13d} {resultado.segundos:8.2f}"
+            f" {lidas / max(resultado.segundos, 1e-9):10.0f} {mb / max(resultado.segundos, 1e-9):7.1f}"
+        )
+
+    concluidos = [resultado for resultado in resultados if not resultado.erro]
+    mb_total = sum(resultado.bytes_entrada for resultado in concluidos) / 2**20
+    print(
+        f"\n{len(concluidos)}/{len(resultados)} arquivos em {segundos_total:.1f} s"
+        f" ({mb_total / max(segundos_total, 1e-9):.1f} MB/s no total)"
+    )
+
+
+def _argumentos(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Processa em lote as extrações 3026 (um relatório por arquivo)")
+    parser.add_argument("entradas", nargs="+", help="diretórios, arquivos ou padrões glob")
+    parser.add_argument("--saida", required=True, help="diretório dos relatórios")
+    parser.add_argument(
+        "--banco", choices=["bemge", "minas_caixa"], help="sem ele, o banco vem da aba ou do nome de cada arquivo"
+    )
+    parser.add_argument("--filtro", default="todos", choices=["auditado", "nauditado", "todos"])
+    parser.add_argument("--periodo", action="store_true", help="filtro de período (DT.MANIFESTAÇÃO)")
+    parser.add_argument("--data-referencia")
+    parser.add_argument("--meses", type=int, default=2)
+    parser.add_argument("--habitacional", action="store_true", help="filtro de data habitacional (3026-11)")
+    parser.add_argument("--data-habitacional")
+    parser.add_argument("--meses-habitacional", type=int, default=2)
+    parser.add_argument("--filtro-3026-15", action="store_true", help="filtro da coluna AB (3026-15)")
+    parser.add_argument("--data-3026-15")
+    parser.add_argument("--meses-3026-15", type=int, default=2)
+    parser.add_argument("--formato", default="xlsx", choices=list(FORMATOS_SAIDA))
+    parser.add_argument("--motor", default=os.environ.get("MOTOR_FILTROS", MOTOR_PANDAS), choices=MOTORES)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="arquivos processados ao mesmo tempo")
+    args = parser.parse_args(argv)
+    for campo in ("meses", "meses_habitacional", "meses_3026_15"):
+        setattr(args, campo, max(getattr(args, campo), 0))
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _argumentos(argv)
+    arquivos = listar_entradas(args.entradas)
+    if not arquivos:
+        print("Nenhum arquivo encontrado", file=sys.stderr)
+        return 1
+    saidas = caminhos_saida(arquivos, args.saida, args.formato)
+    for caminho_saida in saidas.values():
+        os.makedirs(os.path.dirname(caminho_saida), exist_ok=True)
+
+    inicio = time.perf_counter()
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(arquivos)))) as executor:
+        futuros = {
+            executor.submit(processar_arquivo, arquivo, saidas[arquivo], args): arquivo for arquivo in arquivos
+        }
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados[futuros[futuro]] = resultado
+            situacao = f"ERRO: {resultado.erro}" if resultado.erro else f"{resultado.linhas_saida} linhas"
+            print(f"[{len(resultados)}/{len(arquivos)}] {os.path.basename(resultado.entrada)}: {situacao}")
+
+    ordenados = [resultados[arquivo] for arquivo in arquivos]
+    imprimir_resumo(ordenados, time.perf_counter() - inicio)
+    return 1 if any(resultado.erro for resultado in ordenados) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Eventos de progresso do processamento: arquivo identificado/iniciado/concluído,
+início e fim de cada etapa com as contagens de linhas (leitura, filtro_auditado,
+filtro_periodo...), linhas lidas até o momento e abas gravadas.
+
+As funções de processamento só chamam emitir(), sem saber quem escuta. O destino
+dos eventos é um arquivo JSON Lines (um por job, ver fila_processamento.py) ativado
+com publicar_em(); sem destino ativo, emitir() não faz nada. Como o destino é só um
+caminho, ele atravessa o pool de processos (executar_publicando), e o stream de
+eventos (/processar_contratos/jobs/{id}/eventos) pode ser servido por qualquer
+worker do gunicorn, não só o que executa o job.
+"""
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+EVENTO_ARQUIVO_IDENTIFICADO = "arquivo_identificado"
+EVENTO_ARQUIVO_INICIADO = "arquivo_iniciado"
+EVENTO_ARQUIVO_CONCLUIDO = "arquivo_concluido"
+EVENTO_ARQUIVO_ERRO = "arquivo_erro"
+EVENTO_ETAPA_INICIADA = "etapa_iniciada"
+EVENTO_ETAPA_CONCLUIDA = "etapa_concluida"
+EVENTO_LEITURA_PARCIAL = "leitura_parcial"
+EVENTO_ABA_ESCRITA = "aba_escrita"
+
+# (caminho do arquivo de eventos, arquivo em processamento)
+_destino_atual: contextvars.ContextVar = contextvars.ContextVar("destino_progresso", default=None)
+
+
+@contextmanager
+def publicar_em(caminho: str, arquivo: Optional[str] = None) -> Iterator[None]:
+    """Envia para `caminho` os eventos emitidos dentro do bloco."""
+    token = _destino_atual.set((caminho, arquivo))
+    try:
+        yield
+    finally:
+        _destino_atual.reset(token)
+
+
+def destino_atual() -> Optional[str]:
+    destino = _destino_atual.get()
+    return destino[0] if destino else None
+
+
+def emitir(evento: str, **campos) -> None:
+    """Grava o evento no destino ativo (com o arquivo em processamento, se houver)."""
+    destino = _destino_atual.get()
+    if destino is None:
+        return
+    caminho, arquivo = destino
+    registro = {"evento": evento, "momento": time.time()}
+    if arquivo is not None:
+        registro["arquivo"] = arquivo
+    registro.update((chave, valor) for chave, valor in campos.items() if valor is not None)
+    linha = (json.dumps(registro, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    # Uma única escrita com O_APPEND: eventos de processos diferentes não se misturam
+    try:
+        fd = os.open(caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, linha)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # Progresso é informativo: nunca interrompe o processamento
+
+
+def executar_publicando(caminho: Optional[str], arquivo: str, funcao, /, *args, **kwargs):
+    """
+    Executa `funcao` (no pool de processos) publicando os eventos em `caminho`,
+    marcados com o nome do arquivo, entre arquivo_iniciado e arquivo_concluido/erro.
+    """
+    if caminho is None:
+        return funcao(*args, **kwargs)
+    with publicar_em(caminho, arquivo):
+        emitir(EVENTO_ARQUIVO_INICIADO)
+        try:
+            resultado = funcao(*args, **kwargs)
+        except Exception as exc:
+            emitir(EVENTO_ARQUIVO_ERRO, detail=str(exc))
+            raise
+        emitir(EVENTO_ARQUIVO_CONCLUIDO)
+    return resultado
+
+
+def ler_eventos(caminho: str, posicao: int = 0) -> Tuple[List[dict], int]:
+    """
+    Eventos gravados a partir do byte `posicao` e a posição para a próxima leitura.
+    Uma linha ainda incompleta fica para a próxima leitura.
+    """
+    try:
+        with open(caminho, "rb") as arquivo:
+            arquivo.seek(posicao)
+            dados = arquivo.read()
+    except OSError:
+        return [], posicao
+    completos = dados[:dados.rfind(b"\n") + 1]
+    eventos = []
+    for linha in completos.splitlines():
+        try:
+            eventos.append(json.loads(linha))
+        except ValueError:
+            continue
+    return eventos, posicao + len(completos)
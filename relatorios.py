@@ -0,0 +1,170 @@
+"""
+Gravação dos relatórios a partir dos arquivos já lidos e filtrados: abas do
+3026-12, "Dados Filtrados" e abas de resumo, no formato escolhido (ver
+escrita_excel.FORMATOS_SAIDA). Usado pelo servidor e pelo processamento em lote.
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+import metricas
+from escrita_excel import criar_escritor
+from identificacao_planilha import TIPO_3026_11, TIPO_3026_12, TIPO_3026_15
+from processar_contratos import (
+    ABAS_3026_12,
+    Abas3026_12,
+    adicionar_coluna_banco,
+    concatenar_dataframes,
+    gerar_resumos,
+)
+
+
+def escrever_relatorio_3026_12(
+    caminho_saida: str,
+    nomes: List[str],
+    resultados: list,
+    bank_lower: str,
+    is_minas_caixa: bool,
+    historico: Optional[pd.DataFrame] = None,
+    formato: str = "xlsx",
+) -> None:
+    """
+    Grava o relatório de uma requisição com 3026-12: as seis abas de cada 3026-12
+    (posições sobre a base), os demais arquivos em "Dados Filtrados" e os resumos.
+    """
+    bases_3026_12 = []
+    linhas_por_aba = {key: [] for key in ABAS_3026_12}
+    deslocamento = 0
+    dataframes_outros = []
+    summary_sources = []
+    alteracoes = []
+
+    for resultado in resultados:
+        if isinstance(resultado, Abas3026_12):
+            abas = resultado
+            bases_3026_12.append(abas.base)
+            for key in ABAS_3026_12:
+                linhas_por_aba[key].append(abas.linhas[key] + deslocamento)
+            deslocamento += len(abas.base)
+            if abas.alteracoes is not None:
+                alteracoes.append(abas.alteracoes)
+            if not abas.base.empty:
+                summary_sources.append(abas.base)
+        else:
+            df_filtrado = resultado
+            if not df_filtrado.empty:
+                dataframes_outros.append(df_filtrado)
+                summary_sources.append(df_filtrado)
+
+    # Um único DataFrame com as bases de todos os 3026-12; as abas são posições nele
+    base_3026_12 = bases_3026_12[0] if len(bases_3026_12) == 1 else concatenar_dataframes(bases_3026_12)
+    linhas_3026_12 = {key: np.concatenate(linhas) for key, linhas in linhas_por_aba.items()}
+
+    total_linhas = sum(len(linhas) for linhas in linhas_3026_12.values())
+    total_linhas += sum(len(df) for df in dataframes_outros)
+    with criar_escritor(caminho_saida, total_linhas, formato=formato) as writer:
+        bank_prefix = "Minas Caixa 3026-12" if is_minas_caixa else "Bemge 3026-12"
+        sheet_config = [
+            ("Todos os Contratos", "todos"),
+            (f"{bank_prefix}-Homol.Auditados", "aud"),
+            (f"{bank_prefix}-Homol.Não Auditado", "naud"),
+            ("Últimos 2 Meses - Auditados", "period_aud"),
+            ("Últimos 2 Meses - Não Auditados", "period_naud"),
+            ("Últimos 2 Meses - Todos os Contratos", "period_todos"),
+        ]
+
+        escreveu_dados = False
+        for sheet_name, key in sheet_config:
+            linhas = linhas_3026_12[key]
+            if len(linhas):
+                writer.escrever_aba(sheet_name, base_3026_12, linhas)
+                escreveu_dados = True
+
+        if alteracoes:
+            writer.escrever_aba("Alterações Última Extração", concatenar_dataframes(alteracoes))
+
+        if dataframes_outros:
+            df_outros_consolidado = concatenar_dataframes(dataframes_outros)
+            if not df_outros_consolidado.empty:
+                df_outros_consolidado = adicionar_coluna_banco(df_outros_consolidado, bank_lower)
+                writer.escrever_aba("Dados Filtrados", df_outros_consolidado)
+                escreveu_dados = True
+
+        if not escreveu_dados:
+            writer.escrever_aba("Dados Filtrados", pd.DataFrame())
+        else:
+            # Os resumos contam cada linha uma vez (as abas do 3026-12 são recortes da base)
+            adicionar_abas_resumo(writer, summary_sources, len(nomes), historico=historico)
+
+
+def escrever_relatorio(
+    caminho_saida: str,
+    df_consolidado: pd.DataFrame,
+    total_files: int,
+    historico: Optional[pd.DataFrame] = None,
+    formato: str = "xlsx",
+) -> None:
+    with criar_escritor(caminho_saida, len(df_consolidado), formato=formato) as writer:
+        writer.escrever_aba("Dados Filtrados", df_consolidado)
+        adicionar_abas_resumo(writer, [df_consolidado], total_files, historico=historico)
+
+
+def nome_relatorio(tipos: List[Optional[str]], bank_lower: str, filter_lower: str) -> str:
+    """Nome do relatório conforme banco e tipo de cada arquivo (ver identificacao_planilha)."""
+    # Nomes padronizados conforme banco
+    filename_parts = []
+    for tipo in tipos:
+        if bank_lower == "minas_caixa":
+            if tipo == TIPO_3026_11:
+                filename_parts.append("Minas Caixa 3026-11-Habil.Não Homol")
+            elif tipo == TIPO_3026_12:
+                if filter_lower == "auditado":
+                    filename_parts.append("Minas Caixa 3026-12-Homol. Auditado")
+                elif filter_lower == "nauditado":
+                    filename_parts.append("Minas Caixa 3026-12-Homol.Não Auditado")
+                else:
+                    filename_parts.append("Minas Caixa 3026-12-Homol")
+            elif tipo == TIPO_3026_15:
+                filename_parts.append("Minas Caixa 3026-15-Homol.Neg.Cob")
+        elif bank_lower == "bemge":
+            if tipo == TIPO_3026_15:
+                filename_parts.append("Bemge 3026-15-Homol.Neg.Cob")
+            elif tipo == TIPO_3026_11:
+                filename_parts.append(f"Bemge 3026-11-{filter_lower.upper()}")
+            elif tipo == TIPO_3026_12:
+                if filter_lower == "auditado":
+                    filename_parts.append("Bemge 3026-12-AUD")
+                elif filter_lower == "nauditado":
+                    filename_parts.append("Bemge 3026-12-NAUD")
+                else:
+                    filename_parts.append("Bemge 3026-12-TODOS")
+    
+    if filename_parts:
+        return filename_parts[0] + ".xlsx"
+    banco_nome = "BEMGE" if bank_lower == "bemge" else "MINAS_CAIXA"
+    filtro_nome = filter_lower.upper()
+    return f"3026_{banco_nome}_{filtro_nome}_FILTRADO.xlsx"
+
+
+def adicionar_abas_resumo(
+    writer,
+    partes: List[pd.DataFrame],
+    total_files: int,
+    historico: Optional[pd.DataFrame] = None
+):
+    """
+    Adiciona abas de resumo, contratos repetidos e por banco ao arquivo Excel,
+    calculadas em uma passada sobre as `partes` (sem concatená-las inteiras).
+    Com o índice de contratos ligado, `historico` vira a aba "Repetidos Históricos".
+    """
+    with metricas.etapa("resumos", linhas_entrada=sum(len(parte) for parte in partes)):
+        abas = gerar_resumos(partes, total_files)
+        writer.escrever_aba("Resumo Geral", abas.resumo_geral)
+        writer.escrever_aba("Contratos Repetidos", abas.contratos_repetidos)
+        writer.escrever_aba("Contratos por Banco", abas.contratos_por_banco)
+
+        if historico is not None:
+            if historico.empty:
+                historico = pd.DataFrame({"Mensagem": ["Nenhum contrato encontrado em extrações anteriores"]})
+            writer.escrever_aba("Repetidos Históricos", historico)
@@ -1,39 +1,351 @@
-from typing import List, Optional
-
-from fastapi import FastAPI, UploadFile, Form, Request, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from fastapi import FastAPI, UploadFile, Form, Request, HTTPException, Depends
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import io
+import asyncio
+import functools
+import json
 import os
+import shutil
+import tempfile
+import time
 import pandas as pd
 
+import controle_admissao
+import delta_extracoes
+import fila_processamento
+import identificacao_planilha
+import indice_contratos
+import metricas
+import progresso
+from escrita_excel import FORMATOS_SAIDA
+from identificacao_planilha import TIPO_3026_12, Identificacao
 from processar_contratos import (
     processar_excel,
     filtrar_planilha_contratos,
     concatenar_dataframes,
     processar_3026_12_com_abas,
     adicionar_coluna_banco,
-    gerar_resumo_geral,
-    gerar_contratos_repetidos,
-    gerar_contratos_por_banco,
+    com_ocorrencias,
+    MOTOR_PANDAS,
 )
+from relatorios import escrever_relatorio, escrever_relatorio_3026_12, nome_relatorio
+
+# Leitura das planilhas em blocos (openpyxl read_only), aplicando os filtros durante a
+# leitura; desligada, a planilha é lida inteira (pd.read_excel) e a projeção não vale
+LEITURA_STREAMING = os.environ.get("LEITURA_STREAMING", "true").lower() == "true"
+# Projeção na leitura em blocos: colunas dos filtros de todas as linhas, largura completa
+# só das que podem sobrar. Desligada (com o streaming ligado), os blocos saem já filtrados
+LEITURA_PROJECAO_COLUNAS = os.environ.get("LEITURA_PROJECAO_COLUNAS", "true").lower() == "true"
+# Motor dos filtros: "pandas" ou "arrow" (colunas de texto em Arrow, em paralelo; ver motor_arrow.py)
+MOTOR_FILTROS = os.environ.get("MOTOR_FILTROS", MOTOR_PANDAS).lower()
+# Cache em disco das planilhas lidas, por SHA-256 do conteúdo (ver cache_planilhas.py)
+CACHE_PLANILHAS_ENABLED = os.environ.get("CACHE_PLANILHAS_ENABLED", "true").lower() == "true"
+# Pool de processos para ler e filtrar os arquivos fora do event loop
+# (0 = usa threads do executor padrão)
+PROCESS_POOL_SIZE = int(os.environ.get("PROCESS_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Tempo máximo (segundos) de processamento de cada arquivo
+TIMEOUT_ARQUIVO_SEGUNDOS = float(os.environ.get("TIMEOUT_ARQUIVO_SEGUNDOS", "300"))
+# Pasta dos relatórios gerados antes do envio (padrão: pasta temporária do sistema)
+SAIDA_TEMP_DIR = os.environ.get("SAIDA_TEMP_DIR") or None
+# Uploads acima deste tamanho são copiados para disco e lidos pelo caminho do arquivo
+UPLOAD_SPOOL_LIMIAR_MB = float(os.environ.get("UPLOAD_SPOOL_LIMIAR_MB", "5"))
+# Tamanho máximo do corpo de cada envio para processamento (0 = sem limite)
+UPLOAD_MAX_MB = float(os.environ.get("UPLOAD_MAX_MB", "512"))
+# Jobs assíncronos executados ao mesmo tempo por worker (os demais aguardam na fila)
+JOBS_MAX_SIMULTANEOS = int(os.environ.get("JOBS_MAX_SIMULTANEOS", "2"))
+# Intervalo (segundos) entre as leituras dos eventos de progresso no stream de cada job
+PROGRESSO_INTERVALO_SEGUNDOS = float(os.environ.get("PROGRESSO_INTERVALO_SEGUNDOS", "0.5"))
+PROGRESSO_KEEPALIVE_SEGUNDOS = 15  # Comentário SSE para o proxy não fechar a conexão ociosa
+# Envia o tempo/memória de cada etapa no cabeçalho X-Processing-Timings da resposta
+METRICAS_HEADER_TIMINGS = os.environ.get("METRICAS_HEADER_TIMINGS", "false").lower() == "true"
+# Índice persistente dos contratos processados e aba "Repetidos Históricos" (ver indice_contratos.py)
+INDICE_CONTRATOS_ENABLED = os.environ.get("INDICE_CONTRATOS_ENABLED", "false").lower() == "true"
+# Compara cada 3026-12 com a extração anterior do banco e adiciona a aba de alterações
+DELTA_3026_12_ENABLED = os.environ.get("DELTA_3026_12_ENABLED", "false").lower() == "true"
+
+XLSX_MEDIA_TYPE = FORMATOS_SAIDA["xlsx"][1]
 
 app = FastAPI()
+_process_pool: Optional[ProcessPoolExecutor] = None
+_semaforo_jobs: Optional[asyncio.Semaphore] = None
+_controle_admissao: Optional[controle_admissao.ControleAdmissao] = None
+_jobs_em_execucao = set()
 
 # Configura pastas
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 
+def _obter_pool() -> Optional[ProcessPoolExecutor]:
+    # Criado sob demanda para que cada worker do gunicorn tenha o seu próprio pool
+    global _process_pool
+    if _process_pool is None and PROCESS_POOL_SIZE > 0:
+        _process_pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_SIZE)
+    return _process_pool
+
+
+def _obter_semaforo_jobs() -> asyncio.Semaphore:
+    global _semaforo_jobs
+    if _semaforo_jobs is None:
+        _semaforo_jobs = asyncio.Semaphore(max(JOBS_MAX_SIMULTANEOS, 1))
+    return _semaforo_jobs
+
+
+def _obter_controle_admissao() -> Optional[controle_admissao.ControleAdmissao]:
+    # Um por worker: o orçamento vale para a memória do worker e do seu pool
+    global _controle_admissao
+    if _controle_admissao is None and controle_admissao.ADMISSAO_MEMORIA_MB > 0:
+        _controle_admissao = controle_admissao.ControleAdmissao(
+            int(controle_admissao.ADMISSAO_MEMORIA_MB * 1024 * 1024), max(controle_admissao.ADMISSAO_FILA_MAX, 0)
+        )
+    return _controle_admissao
+
+
+def _servidor_ocupado() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Servidor ocupado processando outras planilhas. Tente novamente em instantes.",
+        headers={"Retry-After": str(controle_admissao.ADMISSAO_RETRY_AFTER_SEGUNDOS)},
+    )
+
+
+# Reserva de memória da requisição em andamento (ver _admitir e _processar_arquivo)
+_reserva_atual: ContextVar[Optional[controle_admissao.Reserva]] = ContextVar("_reserva_atual", default=None)
+
+
+@asynccontextmanager
+async def _admitir(custo: int, limitar_fila: bool = True) -> AsyncIterator[None]:
+    """
+    Reserva a memória estimada dos arquivos antes de processá-los (ver
+    controle_admissao.py). Com a fila cheia, responde 503 com Retry-After.
+    As tarefas do pool iniciadas no bloco seguram a reserva até terminarem.
+    """
+    controle = _obter_controle_admissao()
+    if controle is None:
+        yield
+        return
+    try:
+        async with controle.admitir(custo, limitar_fila=limitar_fila) as reserva:
+            token = _reserva_atual.set(reserva)
+            try:
+                yield
+            finally:
+                _reserva_atual.reset(token)
+    except controle_admissao.FilaCheia:
+        raise _servidor_ocupado()
+
+
+class _LimiteUpload:
+    """
+    Recusa os envios para processamento antes de ler o corpo: 413 com o
+    Content-Length acima de UPLOAD_MAX_MB e 503 com a fila de admissão já cheia
+    (nenhuma requisição entraria agora). Sem Content-Length (ou com um valor menor
+    que o real), o tamanho é conferido a cada bloco recebido.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/processar_contratos/"):
+            await self.app(scope, receive, send)
+            return
+
+        limite = UPLOAD_MAX_MB * 1024 * 1024
+        detalhe_limite = f"Arquivos acima do limite de {UPLOAD_MAX_MB:g} MB por envio"
+        tamanho = dict(scope["headers"]).get(b"content-length")
+        if limite > 0 and tamanho is not None and tamanho.isdigit() and int(tamanho) > limite:
+            await JSONResponse({"detail": detalhe_limite}, status_code=413)(scope, receive, send)
+            return
+        controle = _obter_controle_admissao()
+        if controle is not None and controle.recusaria(0):
+            controle.recusar()
+            ocupado = _servidor_ocupado()
+            await JSONResponse({"detail": ocupado.detail}, status_code=503, headers=ocupado.headers)(
+                scope, receive, send
+            )
+            return
+
+        recebidos = 0
+
+        async def _receber():
+            nonlocal recebidos
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebidos += len(mensagem.get("body", b""))
+                if limite > 0 and recebidos > limite:
+                    raise HTTPException(status_code=413, detail=detalhe_limite)
+            return mensagem
+
+        await self.app(scope, _receber, send)
+
+
+app.add_middleware(_LimiteUpload)
+
+
+@app.on_event("shutdown")
+def _encerrar_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+async def _processar_arquivo(filename: str, funcao, /, *args, **kwargs):
+    """
+    Executa `funcao` no pool de processos sem bloquear o event loop.
+    Erros viram HTTP 400 e o estouro de TIMEOUT_ARQUIVO_SEGUNDOS vira HTTP 504.
+    O processo do pool não é interrompido pelo 504: a tarefa segura a reserva de
+    memória da requisição (_admitir) até terminar de fato.
+    As etapas medidas no pool são juntadas às métricas da requisição, e os eventos de
+    progresso vão para o destino ativo (o contextvar não atravessa o pool).
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        _obter_pool(),
+        functools.partial(
+            metricas.executar_medindo, filename,
+            progresso.executar_publicando, progresso.destino_atual(), filename, funcao, *args, **kwargs
+        ),
+    )
+    reserva = _reserva_atual.get()
+    if reserva is not None:
+        reserva.segurar(future)
+    try:
+        # shield: no tempo limite a tarefa continua acompanhada até o fim
+        resultado, registros = await asyncio.wait_for(asyncio.shield(future), timeout=TIMEOUT_ARQUIVO_SEGUNDOS)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504, detail=f"Tempo limite excedido ao processar '{filename}'"
+        )
+    except Exception as exc:
+        raise HTTPException(
+            status_code=400, detail=f"Falha ao ler '{filename}': {str(exc)}"
+        )
+    metricas.adicionar(registros)
+    return resultado
+
+
+def _criar_arquivo_saida(sufixo: str = ".xlsx") -> str:
+    # O relatório é gravado em disco em vez de um BytesIO, limitando a memória por requisição
+    fd, caminho = tempfile.mkstemp(suffix=sufixo, dir=SAIDA_TEMP_DIR)
+    os.close(fd)
+    return caminho
+
+
+def _remover_arquivo(caminho: str) -> None:
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def _responder_arquivo(
+    caminho: str,
+    filename: str,
+    media_type: Optional[str] = None,
+    remover: bool = True,
+    etapas: Optional[List[metricas.RegistroEtapa]] = None
+) -> FileResponse:
+    """
+    Envia o arquivo gerado (sendfile quando disponível). Com remover=True o arquivo
+    é apagado ao final do envio; resultados de jobs ficam até expirar.
+    Com METRICAS_HEADER_TIMINGS, as `etapas` vão no cabeçalho X-Processing-Timings.
+    Sem `media_type`, o tipo vem da extensão do `filename` (ver FORMATOS_SAIDA).
+    """
+    if media_type is None:
+        extensao = os.path.splitext(filename)[1].lower()
+        media_type = next(
+            (tipo for ext, tipo in FORMATOS_SAIDA.values() if ext == extensao), XLSX_MEDIA_TYPE
+        )
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if METRICAS_HEADER_TIMINGS and etapas:
+        headers["X-Processing-Timings"] = metricas.cabecalho_timings(etapas)
+    return FileResponse(
+        caminho,
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(_remover_arquivo, caminho) if remover else None,
+    )
+
+
+def _copiar_upload_para_disco(arquivo) -> str:
+    """Copia o upload em blocos para um arquivo temporário, sem carregá-lo na memória."""
+    fd, caminho = tempfile.mkstemp(prefix="upload_", suffix=".xlsx", dir=SAIDA_TEMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            arquivo.seek(0)
+            shutil.copyfileobj(arquivo, destino, 1024 * 1024)
+    except BaseException:
+        _remover_arquivo(caminho)
+        raise
+    return caminho
+
+
+async def _ler_uploads(files: List[UploadFile]) -> List[Union[bytes, str]]:
+    """
+    Uploads pequenos são lidos para a memória. Os maiores que UPLOAD_SPOOL_LIMIAR_MB
+    (ou de tamanho desconhecido) vão para um arquivo temporário e seguem para o pool
+    só pelo caminho: o processo principal não guarda o conteúdo e cada worker lê o
+    arquivo direto do disco. Remova os temporários com _remover_uploads.
+    """
+    limiar = UPLOAD_SPOOL_LIMIAR_MB * 1024 * 1024
+    conteudos = []
+    try:
+        for upload_file in files:
+            try:
+                if upload_file.size is not None and upload_file.size <= limiar:
+                    conteudos.append(await upload_file.read())
+                else:
+                    conteudos.append(await asyncio.to_thread(_copiar_upload_para_disco, upload_file.file))
+            finally:
+                await upload_file.close()
+    except BaseException:
+        _remover_uploads(conteudos)
+        raise
+    return conteudos
+
+
+def _remover_uploads(conteudos: List[Union[bytes, str]]) -> None:
+    for contents in conteudos:
+        if isinstance(contents, str):
+            _remover_arquivo(contents)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.post("/processar_contratos/")
-async def processar_contratos(
-    bank_type: str = Form(...),
+@dataclass
+class ParametrosProcessamento:
+    """Parâmetros do formulário já validados e normalizados."""
+    bank_lower: Optional[str]  # None até _identificar resolver pelo conteúdo dos arquivos
+    filter_lower: str
+    period_filter: bool
+    reference_date: Optional[str]
+    months_back: int
+    habitacional_filter: bool
+    habitacional_reference_date: Optional[str]
+    habitacional_months_back: int
+    minas_caixa_3026_15_filter: bool
+    minas_caixa_3026_15_reference_date: Optional[str]
+    minas_caixa_3026_15_months_back: int
+    data_extracao: Optional[str]
+    formato_saida: str = "xlsx"
+
+
+def _ler_parametros(
+    bank_type: Optional[str] = Form(None),
     filter_type: str = Form(...),
     file_type: str = Form(...),
     period_filter_enabled: str = Form("false"),
@@ -45,22 +357,23 @@ async def processar_contratos(
     minas_caixa_3026_15_filter_enabled: str = Form("false"),
     minas_caixa_3026_15_reference_date: Optional[str] = Form(None),
     minas_caixa_3026_15_months_back: str = Form("2"),
-    files: List[UploadFile] = Form(...),
-):
-    bank_lower = bank_type.lower()
-    if bank_lower not in {"bemge", "minas_caixa"}:
+    data_extracao: Optional[str] = Form(None),
+    output_format: str = Form("xlsx"),
+) -> ParametrosProcessamento:
+    # Sem bank_type, o banco vem dos arquivos (ver _identificar)
+    bank_lower = (bank_type or "").lower() or None
+    if bank_lower not in {"bemge", "minas_caixa", None}:
         raise HTTPException(status_code=400, detail="bank_type deve ser 'bemge' ou 'minas_caixa'")
 
     filter_lower = filter_type.lower()
     if filter_lower not in {"auditado", "nauditado", "todos"}:
         raise HTTPException(status_code=400, detail="filter_type deve ser 'auditado', 'nauditado' ou 'todos'")
 
-    if not files:
-        raise HTTPException(status_code=400, detail="Pelo menos um arquivo deve ser enviado")
-
-    period_filter_flag = str(period_filter_enabled).lower() == "true"
-    habitacional_filter_flag = str(habitacional_filter_enabled).lower() == "true"
-    minas_caixa_3026_15_filter_flag = str(minas_caixa_3026_15_filter_enabled).lower() == "true"
+    formato_saida = output_format.lower()
+    if formato_saida not in FORMATOS_SAIDA:
+        raise HTTPException(
+            status_code=400, detail=f"output_format deve ser um de: {', '.join(FORMATOS_SAIDA)}"
+        )
 
     try:
         months_back_int = max(int(months_back), 0)
@@ -69,234 +382,442 @@ async def processar_contratos(
     except ValueError:
         raise HTTPException(status_code=400, detail="months_back deve ser um número inteiro válido")
 
-    reference_date_value = (
-        reference_date.strip() if reference_date and reference_date.strip() else None
+    def _data_ou_none(valor: Optional[str]) -> Optional[str]:
+        return valor.strip() if valor and valor.strip() else None
+
+    # Data da extração dos arquivos enviados. O índice de contratos e o delta do 3026-12
+    # gravam por data: sem ela, um reenvio no dia seguinte contaria como outra extração
+    data_extracao_iso = _data_ou_none(data_extracao)
+    if data_extracao_iso is None and (INDICE_CONTRATOS_ENABLED or DELTA_3026_12_ENABLED):
+        raise HTTPException(status_code=400, detail="Informe data_extracao (data da extração, AAAA-MM-DD)")
+    if data_extracao_iso is not None:
+        try:
+            data_extracao_iso = date.fromisoformat(data_extracao_iso).isoformat()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="data_extracao deve estar no formato AAAA-MM-DD")
+
+    return ParametrosProcessamento(
+        bank_lower=bank_lower,
+        filter_lower=filter_lower,
+        period_filter=str(period_filter_enabled).lower() == "true",
+        reference_date=_data_ou_none(reference_date),
+        months_back=months_back_int,
+        habitacional_filter=str(habitacional_filter_enabled).lower() == "true",
+        habitacional_reference_date=_data_ou_none(habitacional_reference_date),
+        habitacional_months_back=habitacional_months_back_int,
+        minas_caixa_3026_15_filter=str(minas_caixa_3026_15_filter_enabled).lower() == "true",
+        minas_caixa_3026_15_reference_date=_data_ou_none(minas_caixa_3026_15_reference_date),
+        minas_caixa_3026_15_months_back=minas_caixa_3026_15_months_back_int,
+        data_extracao=data_extracao_iso,
+        formato_saida=formato_saida,
     )
-    habitacional_reference_date_value = (
-        habitacional_reference_date.strip() if habitacional_reference_date and habitacional_reference_date.strip() else None
+
+
+async def _identificar(
+    parametros: ParametrosProcessamento,
+    nomes: List[str],
+    conteudos: List[Union[bytes, str]],
+) -> List[Identificacao]:
+    """
+    Tipo, banco e dimensões de cada arquivo, lidos dos metadados e das primeiras
+    linhas (ver identificacao_planilha.py). Decidem o roteamento, o banco (quando
+    bank_type não vem no formulário) e o custo na admissão. Um arquivo sem tipo
+    identificado segue pela sequência genérica; um cujo banco contradiz o escolhido
+    é rejeitado com 400.
+    """
+    def _identificar_arquivos() -> List[Identificacao]:
+        return [identificacao_planilha.identificar(contents, nome) for nome, contents in zip(nomes, conteudos)]
+
+    identificacoes = await asyncio.to_thread(_identificar_arquivos)
+    bancos = set()
+    for nome, identificacao in zip(nomes, identificacoes):
+        try:
+            bancos.add(identificacao_planilha.banco_do_arquivo(identificacao, parametros.bank_lower, nome))
+        except identificacao_planilha.BancoNaoConfere as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    if len(bancos) > 1:
+        raise HTTPException(
+            status_code=400, detail=f"Arquivos de bancos diferentes ({', '.join(sorted(bancos))}): envie um banco por vez"
+        )
+    parametros.bank_lower = bancos.pop()
+    return identificacoes
+
+
+@app.post("/processar_contratos/")
+async def processar_contratos(
+    parametros: ParametrosProcessamento = Depends(_ler_parametros),
+    files: List[UploadFile] = Form(...),
+):
+    if not files:
+        raise HTTPException(status_code=400, detail="Pelo menos um arquivo deve ser enviado")
+
+    nomes = [upload_file.filename for upload_file in files]
+    conteudos = await _ler_uploads(files)
+    try:
+        identificacoes = await _identificar(parametros, nomes, conteudos)
+        async with _admitir(controle_admissao.estimar_memoria(identificacoes)):
+            caminho_saida = _criar_arquivo_saida()
+            filename, etapas = await _gerar_relatorio(parametros, nomes, conteudos, identificacoes, caminho_saida)
+    finally:
+        _remover_uploads(conteudos)
+    return _responder_arquivo(caminho_saida, filename, etapas=etapas)
+
+
+@app.post("/processar_contratos/jobs/", status_code=202)
+async def criar_job_processamento(
+    parametros: ParametrosProcessamento = Depends(_ler_parametros),
+    files: List[UploadFile] = Form(...),
+):
+    """
+    Versão assíncrona de /processar_contratos/: enfileira o processamento e
+    retorna o id do job na hora. O cliente consulta o status e baixa o resultado.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="Pelo menos um arquivo deve ser enviado")
+
+    nomes = [upload_file.filename for upload_file in files]
+    conteudos = await _ler_uploads(files)
+    try:
+        identificacoes = await _identificar(parametros, nomes, conteudos)
+        custo = controle_admissao.estimar_memoria(identificacoes)
+        controle = _obter_controle_admissao()
+        if controle is not None and controle.recusaria(custo):
+            controle.recusar()
+            raise _servidor_ocupado()
+        job_id = fila_processamento.criar(len(files))
+    except BaseException:
+        _remover_uploads(conteudos)
+        raise
+
+    tarefa = asyncio.create_task(_executar_job(job_id, parametros, nomes, conteudos, identificacoes, custo))
+    # Mantém a referência até o fim, senão o asyncio pode descartar a tarefa
+    _jobs_em_execucao.add(tarefa)
+    tarefa.add_done_callback(_jobs_em_execucao.discard)
+
+    return {
+        "job_id": job_id,
+        "status": fila_processamento.STATUS_NA_FILA,
+        "status_url": f"/processar_contratos/jobs/{job_id}",
+        "download_url": f"/processar_contratos/jobs/{job_id}/download",
+        "events_url": f"/processar_contratos/jobs/{job_id}/eventos",
+    }
+
+
+@app.get("/processar_contratos/jobs/{job_id}")
+async def status_job_processamento(job_id: str):
+    status = fila_processamento.obter(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    return status
+
+
+@app.get("/processar_contratos/jobs/{job_id}/download")
+async def download_job_processamento(job_id: str):
+    status = fila_processamento.obter(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    if status["status"] != fila_processamento.STATUS_CONCLUIDO:
+        raise HTTPException(status_code=409, detail=f"Job ainda não concluído (status: {status['status']})")
+    return _responder_arquivo(
+        fila_processamento.caminho_resultado(job_id),
+        status["filename"],
+        remover=False,
+        etapas=[metricas.RegistroEtapa(**etapa) for etapa in status.get("etapas") or []],
     )
-    minas_caixa_3026_15_reference_date_value = (
-        minas_caixa_3026_15_reference_date.strip() if minas_caixa_3026_15_reference_date and minas_caixa_3026_15_reference_date.strip() else None
+
+
+@app.get("/processar_contratos/jobs/{job_id}/eventos")
+async def eventos_job_processamento(job_id: str, request: Request):
+    """
+    Progresso do job como Server-Sent Events. Cada evento de progresso.py (arquivo
+    iniciado, etapa concluída com as linhas, aba gravada...) vira um evento
+    "progresso", numerado no campo id para retomar com Last-Event-ID, e cada mudança
+    de status vira um evento "status". O stream termina quando o job conclui ou falha.
+    """
+    if fila_processamento.obter(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    try:
+        ultimo_id = int(request.headers.get("last-event-id", "-1"))
+    except ValueError:
+        ultimo_id = -1
+    return StreamingResponse(
+        _stream_eventos(job_id, request, ultimo_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # Verificar se há arquivo 3026-12 para processar com abas separadas (BEMGE e MINAS CAIXA)
-    has_3026_12 = any("3026-12" in f.filename.upper() for f in files)
-    is_bemge = bank_lower == "bemge"
-    is_minas_caixa = bank_lower == "minas_caixa"
-    
-    # Se tiver 3026-12, processar com abas separadas (BEMGE e MINAS CAIXA)
-    if has_3026_12:
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            sheet_accumulators = {
-                "todos": [],
-                "aud": [],
-                "naud": [],
-                "period_todos": [],
-                "period_aud": [],
-                "period_naud": []
-            }
-            dataframes_outros = []
-            summary_sources = []
-            
-            for upload_file in files:
-                try:
-                    contents = await upload_file.read()
-                    filename_upper = upload_file.filename.upper()
-                    
-                    if "3026-12" in filename_upper:
-                        abas = processar_3026_12_com_abas(
-                            contents,
-                            bank_lower,
-                            filter_lower,
-                            period_filter_flag,
-                            reference_date_value,
-                            months_back_int
-                        )
-                        for key in sheet_accumulators:
-                            df_sheet = abas.get(key)
-                            if df_sheet is not None and not df_sheet.empty:
-                                sheet_accumulators[key].append(df_sheet)
-                                if key == "todos":
-                                    summary_sources.append(df_sheet)
-                    else:
-                        df_filtrado = filtrar_planilha_contratos(
-                            contents,
-                            filter_lower,
-                            period_filter_flag,
-                            reference_date_value,
-                            months_back_int,
-                            upload_file.filename,
-                            bank_lower,
-                            habitacional_filter_flag,
-                            habitacional_reference_date_value,
-                            habitacional_months_back_int,
-                            minas_caixa_3026_15_filter_flag,
-                            minas_caixa_3026_15_reference_date_value,
-                            minas_caixa_3026_15_months_back_int,
-                        )
-                        if not df_filtrado.empty:
-                            dataframes_outros.append(df_filtrado)
-                            summary_sources.append(df_filtrado)
-                except Exception as exc:
-                    raise HTTPException(
-                        status_code=400, detail=f"Falha ao ler '{upload_file.filename}': {str(exc)}"
-                    )
-                finally:
-                    await upload_file.close()
-            
-            bank_prefix = "Minas Caixa 3026-12" if is_minas_caixa else "Bemge 3026-12"
-            sheet_config = [
-                ("Todos os Contratos", "todos"),
-                (f"{bank_prefix}-Homol.Auditados", "aud"),
-                (f"{bank_prefix}-Homol.Não Auditado", "naud"),
-                ("Últimos 2 Meses - Auditados", "period_aud"),
-                ("Últimos 2 Meses - Não Auditados", "period_naud"),
-                ("Últimos 2 Meses - Todos os Contratos", "period_todos"),
-            ]
 
-            dfs_written = []
-            for sheet_name, key in sheet_config:
-                if sheet_accumulators.get(key):
-                    df_sheet = concatenar_dataframes(sheet_accumulators[key])
-                    if not df_sheet.empty:
-                        df_sheet = adicionar_coluna_banco(df_sheet, bank_lower)
-                        df_sheet.to_excel(writer, sheet_name=sheet_name, index=False)
-                        dfs_written.append(df_sheet)
-
-            if dataframes_outros:
-                df_outros_consolidado = concatenar_dataframes(dataframes_outros)
-                if not df_outros_consolidado.empty:
-                    df_outros_consolidado = adicionar_coluna_banco(df_outros_consolidado, bank_lower)
-                    df_outros_consolidado.to_excel(writer, sheet_name="Dados Filtrados", index=False)
-                    dfs_written.append(df_outros_consolidado)
-
-            if not dfs_written:
-                pd.DataFrame().to_excel(writer, sheet_name="Dados Filtrados", index=False)
+def _evento_sse(tipo: str, dados: dict, id_evento: Optional[int] = None) -> str:
+    linhas = [] if id_evento is None else [f"id: {id_evento}"]
+    linhas.append(f"event: {tipo}")
+    linhas.append(f"data: {json.dumps(dados, ensure_ascii=False)}")
+    return "\n".join(linhas) + "\n\n"
+
+
+async def _stream_eventos(job_id: str, request: Request, ultimo_id: int):
+    caminho = fila_processamento.caminho_eventos(job_id)
+    posicao = 0
+    numero = 0
+    status_enviado = None
+    ultimo_envio = time.monotonic()
+    while True:
+        # O status é lido antes dos eventos: quando o job termina, todos os
+        # eventos dele já estão no arquivo
+        status = fila_processamento.obter(job_id)
+        eventos, posicao = progresso.ler_eventos(caminho, posicao)
+        for evento in eventos:
+            if numero > ultimo_id:
+                yield _evento_sse("progresso", evento, numero)
+                ultimo_envio = time.monotonic()
+            numero += 1
+        if status is None:
+            return
+        if status["status"] != status_enviado:
+            status_enviado = status["status"]
+            yield _evento_sse("status", {
+                campo: status.get(campo) for campo in ("status", "total_arquivos", "filename", "detail")
+            })
+            ultimo_envio = time.monotonic()
+        if status_enviado in (fila_processamento.STATUS_CONCLUIDO, fila_processamento.STATUS_ERRO):
+            return
+        if await request.is_disconnected():
+            return
+        if time.monotonic() - ultimo_envio >= PROGRESSO_KEEPALIVE_SEGUNDOS:
+            yield ": keepalive\n\n"
+            ultimo_envio = time.monotonic()
+        await asyncio.sleep(PROGRESSO_INTERVALO_SEGUNDOS)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Tempo, memória, linhas e bytes de cada etapa, no formato de texto do Prometheus."""
+    return PlainTextResponse(metricas.exportar_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def _executar_job(
+    job_id: str,
+    parametros: ParametrosProcessamento,
+    nomes: List[str],
+    conteudos: List[Union[bytes, str]],
+    identificacoes: List[Identificacao],
+    custo: int,
+) -> None:
+    try:
+        async with _obter_semaforo_jobs():
+            try:
+                # O job já foi aceito: espera a memória sem limite de fila
+                async with _admitir(custo, limitar_fila=False):
+                    fila_processamento.atualizar(job_id, status=fila_processamento.STATUS_PROCESSANDO)
+                    with progresso.publicar_em(fila_processamento.caminho_eventos(job_id)):
+                        filename, etapas = await _gerar_relatorio(
+                            parametros, nomes, conteudos, identificacoes, fila_processamento.caminho_resultado(job_id)
+                        )
+            except HTTPException as exc:
+                fila_processamento.atualizar(job_id, status=fila_processamento.STATUS_ERRO, detail=exc.detail)
+            except Exception as exc:
+                fila_processamento.atualizar(
+                    job_id, status=fila_processamento.STATUS_ERRO, detail=f"Erro ao processar arquivos: {str(exc)}"
+                )
             else:
-                df_full_dataset = concatenar_dataframes(summary_sources) if summary_sources else pd.DataFrame()
-                if df_full_dataset.empty:
-                    df_full_dataset = concatenar_dataframes(dfs_written)
-                _adicionar_abas_resumo(
-                    writer,
-                    concatenar_dataframes(dfs_written),
-                    len(files),
-                    df_full=df_full_dataset if not df_full_dataset.empty else None
+                fila_processamento.atualizar(
+                    job_id,
+                    status=fila_processamento.STATUS_CONCLUIDO,
+                    filename=filename,
+                    etapas=[registro.como_dict() for registro in etapas],
                 )
-        
-        output.seek(0)
-        
-        banco_nome = "BEMGE" if bank_lower == "bemge" else "MINAS_CAIXA"
-        filtro_nome = filter_lower.upper()
-        filename = f"3026_{banco_nome}_{filtro_nome}_FILTRADO.xlsx"
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
-    
-    # Processamento normal (sem abas separadas)
-    dataframes = []
-    for upload_file in files:
+    finally:
+        _remover_uploads(conteudos)
+
+
+async def _gerar_relatorio(
+    parametros: ParametrosProcessamento,
+    nomes: List[str],
+    conteudos: List[Union[bytes, str]],
+    identificacoes: List[Identificacao],
+    caminho_saida: str,
+) -> Tuple[str, List[metricas.RegistroEtapa]]:
+    """
+    Gera o relatório medindo cada etapa. Retorna o nome do arquivo para download
+    (com a extensão do formato de saída) e as etapas medidas, que também entram nos
+    totais de /metrics.
+    """
+    with metricas.coletar() as coletor:
         try:
-            contents = await upload_file.read()
-            df_filtrado = filtrar_planilha_contratos(
-                contents,
-                filter_lower,
-                period_filter_flag,
-                reference_date_value,
-                months_back_int,
-                upload_file.filename,
-                bank_lower,
-                habitacional_filter_flag,
-                habitacional_reference_date_value,
-                habitacional_months_back_int,
-                minas_caixa_3026_15_filter_flag,
-                minas_caixa_3026_15_reference_date_value,
-                minas_caixa_3026_15_months_back_int,
-            )
-            dataframes.append(df_filtrado)
-        except Exception as exc:
-            raise HTTPException(
-                status_code=400, detail=f"Falha ao ler '{upload_file.filename}': {str(exc)}"
-            )
+            with metricas.etapa("total", bytes_entrada=sum(_tamanho_upload(c) for c in conteudos)) as registro:
+                filename = await _gerar_relatorio_arquivos(
+                    parametros, nomes, conteudos, identificacoes, caminho_saida
+                )
+                registro.bytes_saida = os.path.getsize(caminho_saida)
         finally:
-            await upload_file.close()
-
-    df_consolidado = concatenar_dataframes(dataframes)
-
-    if df_consolidado.empty:
-        raise HTTPException(status_code=400, detail="Nenhum dado encontrado após aplicar os filtros")
-
-    df_consolidado = adicionar_coluna_banco(df_consolidado, bank_lower)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df_consolidado.to_excel(writer, sheet_name="Dados Filtrados", index=False)
-        _adicionar_abas_resumo(writer, df_consolidado, len(files), df_full=df_consolidado)
-    output.seek(0)
-
-    # Nomes padronizados conforme banco
-    filename_parts = []
-    for f in files:
-        fname_upper = f.filename.upper()
-        if bank_lower == "minas_caixa":
-            if "3026-11" in fname_upper:
-                filename_parts.append("Minas Caixa 3026-11-Habil.Não Homol")
-            elif "3026-12" in fname_upper:
-                if filter_lower == "auditado":
-                    filename_parts.append("Minas Caixa 3026-12-Homol. Auditado")
-                elif filter_lower == "nauditado":
-                    filename_parts.append("Minas Caixa 3026-12-Homol.Não Auditado")
-                else:
-                    filename_parts.append("Minas Caixa 3026-12-Homol")
-            elif "3026-15" in fname_upper:
-                filename_parts.append("Minas Caixa 3026-15-Homol.Neg.Cob")
-        elif bank_lower == "bemge":
-            if "3026-15" in fname_upper:
-                filename_parts.append("Bemge 3026-15-Homol.Neg.Cob")
-            elif "3026-11" in fname_upper:
-                filename_parts.append(f"Bemge 3026-11-{filter_lower.upper()}")
-            elif "3026-12" in fname_upper:
-                if filter_lower == "auditado":
-                    filename_parts.append("Bemge 3026-12-AUD")
-                elif filter_lower == "nauditado":
-                    filename_parts.append("Bemge 3026-12-NAUD")
+            metricas.registrar(coletor.registros)
+    filename = os.path.splitext(filename)[0] + FORMATOS_SAIDA[parametros.formato_saida][0]
+    return filename, coletor.registros
+
+
+def _tamanho_upload(contents: Union[bytes, str]) -> int:
+    return len(contents) if isinstance(contents, bytes) else os.path.getsize(contents)
+
+
+async def _gerar_relatorio_arquivos(
+    parametros: ParametrosProcessamento,
+    nomes: List[str],
+    conteudos: List[Union[bytes, str]],
+    identificacoes: List[Identificacao],
+    caminho_saida: str,
+) -> str:
+    """
+    Lê e filtra os arquivos no pool, grava o relatório em `caminho_saida` e
+    retorna o nome do arquivo para download. Em caso de erro o arquivo é removido.
+    """
+    bank_lower = parametros.bank_lower
+    filter_lower = parametros.filter_lower
+    tipos = [identificacao.tipo for identificacao in identificacoes]
+    for nome, identificacao in zip(nomes, identificacoes):
+        progresso.emitir(progresso.EVENTO_ARQUIVO_IDENTIFICADO, arquivo=nome, **identificacao.como_dict())
+
+    # Verificar se há arquivo 3026-12 para processar com abas separadas (BEMGE e MINAS CAIXA)
+    has_3026_12 = TIPO_3026_12 in tipos
+    is_minas_caixa = bank_lower == "minas_caixa"
+
+    def _no_pool(nome: str, funcao, /, *args, **kwargs):
+        # Com o índice ligado, o pool devolve também os contratos lidos antes dos filtros
+        if INDICE_CONTRATOS_ENABLED:
+            return _processar_arquivo(nome, com_ocorrencias, funcao, *args, **kwargs)
+        return _processar_arquivo(nome, funcao, *args, **kwargs)
+
+    def _separar_lidos(resultados: list) -> tuple:
+        if not INDICE_CONTRATOS_ENABLED:
+            return list(resultados), []
+        return [resultado for resultado, _ in resultados], [lidos for _, lidos in resultados]
+
+    def _filtrar_no_pool(filename: str, contents: Union[bytes, str], tipo_arquivo: Optional[str]):
+        return _no_pool(
+            filename,
+            filtrar_planilha_contratos,
+            contents,
+            filter_lower,
+            parametros.period_filter,
+            parametros.reference_date,
+            parametros.months_back,
+            filename,
+            bank_lower,
+            parametros.habitacional_filter,
+            parametros.habitacional_reference_date,
+            parametros.habitacional_months_back,
+            parametros.minas_caixa_3026_15_filter,
+            parametros.minas_caixa_3026_15_reference_date,
+            parametros.minas_caixa_3026_15_months_back,
+            streaming_reader=LEITURA_STREAMING,
+            column_projection=LEITURA_PROJECAO_COLUNAS,
+            use_cache=CACHE_PLANILHAS_ENABLED,
+            motor=MOTOR_FILTROS,
+            tipo_arquivo=tipo_arquivo,
+        )
+
+    try:
+        # Se tiver 3026-12, processar com abas separadas (BEMGE e MINAS CAIXA)
+        if has_3026_12:
+            # Os arquivos da requisição são lidos e filtrados em paralelo no pool
+            tarefas = []
+            for nome, contents, tipo in zip(nomes, conteudos, tipos):
+                if tipo == TIPO_3026_12:
+                    tarefas.append(_no_pool(
+                        nome,
+                        processar_3026_12_com_abas,
+                        contents,
+                        bank_lower,
+                        filter_lower,
+                        parametros.period_filter,
+                        parametros.reference_date,
+                        parametros.months_back,
+                        streaming_reader=LEITURA_STREAMING,
+                        column_projection=LEITURA_PROJECAO_COLUNAS,
+                        use_cache=CACHE_PLANILHAS_ENABLED,
+                        delta=DELTA_3026_12_ENABLED,
+                        filename=nome,
+                        motor=MOTOR_FILTROS,
+                        data_extracao=parametros.data_extracao,
+                    ))
                 else:
-                    filename_parts.append("Bemge 3026-12-TODOS")
-    
-    if filename_parts:
-        filename = filename_parts[0] + ".xlsx"
-    else:
-        banco_nome = "BEMGE" if bank_lower == "bemge" else "MINAS_CAIXA"
-        filtro_nome = filter_lower.upper()
-        filename = f"3026_{banco_nome}_{filtro_nome}_FILTRADO.xlsx"
+                    tarefas.append(_filtrar_no_pool(nome, contents, tipo))
+            resultados, lidos = _separar_lidos(await asyncio.gather(*tarefas))
+            historico = await _atualizar_indice_contratos(parametros, tipos, lidos)
+
+            # A gravação do relatório roda numa thread para não travar o event loop
+            with metricas.etapa("escrita") as registro:
+                await asyncio.to_thread(
+                    escrever_relatorio_3026_12,
+                    caminho_saida, nomes, resultados, bank_lower, is_minas_caixa, historico,
+                    parametros.formato_saida,
+                )
+                registro.bytes_saida = os.path.getsize(caminho_saida)
 
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+            # Só com o relatório gravado a extração vira base da próxima comparação
+            resumos_delta = [
+                resultado.resumo_delta for tipo, resultado in zip(tipos, resultados)
+                if tipo == TIPO_3026_12 and resultado.resumo_delta is not None
+            ]
+            if resumos_delta:
+                await asyncio.to_thread(
+                    delta_extracoes.guardar,
+                    bank_lower, TIPO_3026_12, parametros.data_extracao,
+                    pd.concat(resumos_delta, ignore_index=True),
+                )
 
+            banco_nome = "BEMGE" if bank_lower == "bemge" else "MINAS_CAIXA"
+            filtro_nome = filter_lower.upper()
+            return f"3026_{banco_nome}_{filtro_nome}_FILTRADO.xlsx"
 
-def _adicionar_abas_resumo(
-    writer: pd.ExcelWriter,
-    df_consolidado: pd.DataFrame,
-    total_files: int,
-    df_full: Optional[pd.DataFrame] = None
-):
+        # Processamento normal (sem abas separadas)
+        tarefas = [
+            _filtrar_no_pool(nome, contents, tipo)
+            for nome, contents, tipo in zip(nomes, conteudos, tipos)
+        ]
+        dataframes, lidos = _separar_lidos(await asyncio.gather(*tarefas))
+        historico = await _atualizar_indice_contratos(parametros, tipos, lidos)
+
+        df_consolidado = concatenar_dataframes(dataframes)
+
+        if df_consolidado.empty:
+            raise HTTPException(status_code=400, detail="Nenhum dado encontrado após aplicar os filtros")
+
+        df_consolidado = adicionar_coluna_banco(df_consolidado, bank_lower)
+        with metricas.etapa("escrita", linhas_entrada=len(df_consolidado)) as registro:
+            await asyncio.to_thread(
+                escrever_relatorio,
+                caminho_saida, df_consolidado, len(nomes), historico, parametros.formato_saida,
+            )
+            registro.bytes_saida = os.path.getsize(caminho_saida)
+    except BaseException:
+        _remover_arquivo(caminho_saida)
+        raise
+
+    return nome_relatorio(tipos, bank_lower, filter_lower)
+
+
+async def _atualizar_indice_contratos(
+    parametros: ParametrosProcessamento,
+    tipos: List[str],
+    lidos: List[pd.DataFrame],
+) -> Optional[pd.DataFrame]:
     """
-    Adiciona abas de resumo, contratos repetidos e por banco ao arquivo Excel.
+    Consulta no índice os contratos que já apareceram em extrações anteriores e grava
+    os arquivos atuais nele. `lidos` traz, por arquivo, os contratos de todas as linhas
+    lidas (processar_contratos.com_ocorrencias), não só os que sobraram dos filtros.
+    Retorna None com o índice desligado.
     """
-    resumo = gerar_resumo_geral(df_consolidado, total_files)
-    resumo.to_excel(writer, sheet_name="Resumo Geral", index=False)
+    if not INDICE_CONTRATOS_ENABLED:
+        return None
 
-    base_df = df_full if df_full is not None else df_consolidado
-    repetidos = gerar_contratos_repetidos(base_df)
-    repetidos.to_excel(writer, sheet_name="Contratos Repetidos", index=False)
+    def _consultar_e_registrar() -> pd.DataFrame:
+        return indice_contratos.consultar_e_registrar(
+            list(zip(tipos, lidos)), parametros.bank_lower.upper(), parametros.data_extracao
+        )
 
-    por_banco = gerar_contratos_por_banco(base_df)
-    por_banco.to_excel(writer, sheet_name="Contratos por Banco", index=False)
+    with metricas.etapa("indice_contratos", linhas_entrada=sum(len(df) for df in lidos)) as registro:
+        historico = await asyncio.to_thread(_consultar_e_registrar)
+        registro.linhas_saida = len(historico)
+    return historico
 
 
 @app.post("/upload/")
@@ -305,9 +826,9 @@ async def upload(file: UploadFile, tipo: str = Form(...)):
     os.makedirs("uploads", exist_ok=True)
     caminho_temp = os.path.join("uploads", file.filename)
 
-    # Salva o arquivo temporariamente
+    # Salva o arquivo temporariamente (cópia em blocos, sem ler tudo para a memória)
     with open(caminho_temp, "wb") as f:
-        f.write(await file.read())
+        await asyncio.to_thread(shutil.copyfileobj, file.file, f, 1024 * 1024)
 
     # Processa o Excel
     resultado, erro = processar_excel(caminho_temp, tipo)
@@ -3,6 +3,7 @@ import MultiFileUpload from './components/MultiFileUpload'
 import BankSelector from './components/BankSelector'
 import FilterSelector from './components/FilterSelector'
 import PeriodFilter from './components/PeriodFilter'
+import ExtractionDate from './components/ExtractionDate'
 import HabitacionalFilter from './components/HabitacionalFilter'
 import ProcessButton from './components/ProcessButton'
 import StatusIndicator from './components/StatusIndicator'
@@ -10,6 +11,82 @@ import HistoryPanel from './components/HistoryPanel'
 import './App.css'
 
 const API_URL = "https://leitorback-2.onrender.com"
+const JOB_POLL_INTERVAL_MS = 2000 // Intervalo entre consultas de status do job
+
+const aguardar = (ms) => new Promise(resolve => setTimeout(resolve, ms))
+
+// Acompanha o progresso do job pelo stream de eventos (SSE) do servidor, chamando
+// onProgress a cada evento. Retorna uma função que fecha o stream.
+function acompanharProgresso(jobId, onProgress) {
+  if (!onProgress || typeof EventSource === 'undefined') {
+    return () => {}
+  }
+  const eventos = new EventSource(`${API_URL}/processar_contratos/jobs/${jobId}/eventos`)
+  eventos.addEventListener('progresso', (mensagem) => {
+    try {
+      onProgress(JSON.parse(mensagem.data))
+    } catch (parseError) {
+      // Evento malformado: ignora, o status do job continua sendo consultado
+    }
+  })
+  eventos.addEventListener('status', (mensagem) => {
+    let status = null
+    try {
+      status = JSON.parse(mensagem.data).status
+    } catch (parseError) {
+      return
+    }
+    if (status === 'concluido' || status === 'erro') {
+      eventos.close() // Senão o EventSource reconecta quando o servidor encerra o stream
+    }
+  })
+  return () => eventos.close()
+}
+
+// Envia os arquivos como job assíncrono, consulta o status até terminar e retorna
+// a resposta do download. Assim a conexão não fica aberta durante o processamento
+// (o proxy do servidor corta requisições longas). Sem a API de jobs, usa o endpoint síncrono.
+// O progresso (arquivo, etapa, linhas, abas gravadas) chega por onProgress.
+async function processarViaJob(formData, signal, onProgress) {
+  const submitResponse = await fetch(`${API_URL}/processar_contratos/jobs/`, {
+    method: "POST",
+    body: formData,
+    signal,
+  })
+  if (submitResponse.status === 404) {
+    return fetch(`${API_URL}/processar_contratos/`, {
+      method: "POST",
+      body: formData,
+      signal,
+    })
+  }
+  if (!submitResponse.ok) {
+    return submitResponse
+  }
+
+  const { job_id: jobId } = await submitResponse.json()
+  const fecharProgresso = acompanharProgresso(jobId, onProgress)
+  try {
+    while (true) {
+      await aguardar(JOB_POLL_INTERVAL_MS)
+      const statusResponse = await fetch(`${API_URL}/processar_contratos/jobs/${jobId}`, { signal })
+      if (!statusResponse.ok) {
+        return statusResponse
+      }
+      const job = await statusResponse.json()
+      if (job.status === 'erro') {
+        const jobError = new Error(job.detail || 'Erro ao processar arquivos')
+        jobError.name = 'JobError' // Erro do processamento: não tenta o fallback
+        throw jobError
+      }
+      if (job.status === 'concluido') {
+        return fetch(`${API_URL}/processar_contratos/jobs/${jobId}/download`, { signal })
+      }
+    }
+  } finally {
+    fecharProgresso()
+  }
+}
 
 function App() {
   const [files, setFiles] = useState([])
@@ -18,10 +95,14 @@ function App() {
   const [fileType, setFileType] = useState('todos') // '3026-11', '3026-12', '3026-15', 'todos'
   const [status, setStatus] = useState('idle') // idle, uploading, processing, success, error
   const [errorMessage, setErrorMessage] = useState('')
+  const [progress, setProgress] = useState(null) // Último evento de progresso e arquivos concluídos
   const [history, setHistory] = useState([])
   const [resultData, setResultData] = useState(null) // Para armazenar os resultados do processamento
   const [downloadUrl, setDownloadUrl] = useState(null) // URL para download da planilha consolidada
   
+  // Data da extração dos arquivos (índice de contratos e delta do 3026-12)
+  const [dataExtracao, setDataExtracao] = useState('')
+
   // Estados para filtro de período (DT.MANIFESTAÇÃO)
   const [periodFilterEnabled, setPeriodFilterEnabled] = useState(false)
   const [referenceDate, setReferenceDate] = useState(new Date().toISOString().split('T')[0]) // Data atual
@@ -86,6 +167,9 @@ function App() {
     formData.append('bank_type', bankType)
     formData.append('filter_type', filterType) // Adiciona o filtro de auditado/não auditado
     formData.append('file_type', fileType) // Adiciona o tipo de arquivo (3026-11, 3026-12, 3026-15)
+    if (dataExtracao) {
+      formData.append('data_extracao', dataExtracao)
+    }
     
     // Adiciona filtro de período (DT.MANIFESTAÇÃO)
     formData.append('period_filter_enabled', periodFilterEnabled ? 'true' : 'false')
@@ -153,16 +237,19 @@ function App() {
       
       // Cria um AbortController para timeout
       const controller = new AbortController()
-      const timeoutId = setTimeout(() => controller.abort(), 300000) // 5 minutos de timeout (múltiplos arquivos)
+      const timeoutId = setTimeout(() => controller.abort(), 1800000) // 30 minutos de timeout (o job continua no servidor)
       
       // Tenta primeiro o novo endpoint, depois o antigo como fallback
       let response
       try {
-        response = await fetch(`${API_URL}/processar_contratos/`, {
-          method: "POST",
-          body: formData,
-          signal: controller.signal,
-          // NÃO definir Content-Type manualmente - o browser faz isso automaticamente
+        // NÃO definir Content-Type manualmente - o browser faz isso automaticamente
+        setProgress(null)
+        response = await processarViaJob(formData, controller.signal, (evento) => {
+          setProgress(anterior => ({
+            evento,
+            totalArquivos: files.length,
+            arquivosConcluidos: (anterior?.arquivosConcluidos || 0) + (evento.evento === 'arquivo_concluido' ? 1 : 0),
+          }))
         })
         
         // Se o endpoint retornar 404, tenta o fallback
@@ -182,7 +269,7 @@ function App() {
         }
       } catch (fetchError) {
         // Se houver erro de conexão, tenta o fallback
-        if (fetchError.name !== 'AbortError' && !fetchError.message.includes('404')) {
+        if (fetchError.name !== 'AbortError' && fetchError.name !== 'JobError' && !fetchError.message.includes('404')) {
           console.warn('Erro ao conectar com /processar_contratos/, tentando /upload/')
           const fallbackFormData = new FormData()
           if (files.length > 0) {
@@ -369,6 +456,12 @@ function App() {
                 disabled={status === 'uploading' || status === 'processing'}
               />
 
+              <ExtractionDate
+                value={dataExtracao}
+                onChange={setDataExtracao}
+                disabled={status === 'uploading' || status === 'processing'}
+              />
+
               <PeriodFilter
                 enabled={periodFilterEnabled}
                 onToggle={setPeriodFilterEnabled}
@@ -445,6 +538,7 @@ function App() {
           <StatusIndicator 
             status={status}
             errorMessage={errorMessage}
+            progress={progress}
           />
 
           {status === 'success' && resultData && (
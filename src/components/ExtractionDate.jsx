@@ -0,0 +1,34 @@
+import React from 'react'
+import { Database } from 'lucide-react'
+import './PeriodFilter.css'
+
+// Data em que o sistema de origem gerou os arquivos. O índice de contratos grava
+// por (banco, tipo, data): reenviar a mesma extração substitui o que ela gravou.
+function ExtractionDate({ value, onChange, disabled }) {
+  return (
+    <div className="period-filter-container">
+      <div className="period-control-group">
+        <label className="period-control-label">
+          <Database size={16} />
+          Data da Extração
+        </label>
+        <input
+          type="date"
+          value={value}
+          onChange={(e) => onChange(e.target.value)}
+          disabled={disabled}
+          className="period-date-input"
+        />
+      </div>
+      <div className="period-info">
+        <span className="period-info-text">
+          {value
+            ? `Arquivos extraídos em ${new Date(value + 'T00:00:00').toLocaleDateString('pt-BR')}`
+            : 'Informe a data em que os arquivos foram extraídos do sistema'}
+        </span>
+      </div>
+    </div>
+  )
+}
+
+export default ExtractionDate
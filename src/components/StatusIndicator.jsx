@@ -2,7 +2,59 @@ import React from 'react'
 import { AlertCircle, CheckCircle2, Info, Loader2 } from 'lucide-react'
 import './StatusIndicator.css'
 
-function StatusIndicator({ status, errorMessage }) {
+const NOMES_ETAPAS = {
+  cache_planilhas: 'cache de planilhas',
+  leitura: 'leitura',
+  filtro_auditado: 'filtro de auditoria',
+  filtro_periodo: 'filtro de período',
+  filtro_habitacional: 'filtro habitacional',
+  filtro_3026_15: 'filtro da coluna AB',
+  filtro_3026_12: 'filtro DEST',
+  filtro_arquivo: 'filtros do arquivo',
+  particionar_3026_12: 'separação das abas',
+  indice_contratos: 'índice de contratos',
+  resumos: 'resumos',
+  escrita: 'gravação do relatório',
+}
+
+const formatarLinhas = (linhas) => Number(linhas).toLocaleString('pt-BR')
+
+// Texto do último evento de progresso do servidor (ver progresso.py no backend)
+function descreverProgresso(evento) {
+  const prefixo = evento.arquivo ? `${evento.arquivo}: ` : ''
+  const etapa = NOMES_ETAPAS[evento.etapa] || evento.etapa
+  switch (evento.evento) {
+    case 'arquivo_identificado':
+      if (evento.linhas != null) {
+        return `${prefixo}${evento.tipo || 'tipo não identificado'}, ${formatarLinhas(evento.linhas)} linhas`
+      }
+      return `${prefixo}${evento.tipo || 'tipo não identificado'}`
+    case 'arquivo_iniciado':
+      return `${prefixo}iniciando leitura`
+    case 'leitura_parcial':
+      return `${prefixo}${formatarLinhas(evento.linhas_lidas)} linhas lidas`
+    case 'etapa_iniciada':
+      return `${prefixo}${etapa}...`
+    case 'etapa_concluida':
+      if (evento.etapa === 'leitura' && evento.linhas_saida != null) {
+        return `${prefixo}${formatarLinhas(evento.linhas_saida)} linhas lidas`
+      }
+      if (evento.linhas_saida != null) {
+        return `${prefixo}${formatarLinhas(evento.linhas_saida)} linhas após ${etapa}`
+      }
+      return `${prefixo}${etapa} concluída`
+    case 'aba_escrita':
+      return `Aba ${evento.numero} gravada: ${evento.aba} (${formatarLinhas(evento.linhas)} linhas)`
+    case 'arquivo_concluido':
+      return `${prefixo}concluído`
+    case 'arquivo_erro':
+      return `${prefixo}erro`
+    default:
+      return null
+  }
+}
+
+function StatusIndicator({ status, errorMessage, progress }) {
   if (status === 'idle') {
     return null
   }
@@ -41,11 +93,19 @@ function StatusIndicator({ status, errorMessage }) {
   const config = getStatusConfig()
   if (!config) return null
 
+  const detalhe = status === 'processing' && progress ? descreverProgresso(progress.evento) : null
+
   return (
     <div className={`status-indicator ${config.type}`}>
       <div className="status-icon">{config.icon}</div>
       <div className="status-content">
         <p className="status-message">{config.message}</p>
+        {detalhe && <p className="status-detail">{detalhe}</p>}
+        {status === 'processing' && progress && progress.totalArquivos > 1 && (
+          <p className="status-detail">
+            Arquivos concluídos: {progress.arquivosConcluidos} de {progress.totalArquivos}
+          </p>
+        )}
       </div>
     </div>
   )